@@ -0,0 +1,145 @@
+"""Drives the app in-process at high concurrency and compares request latency of
+the WSGI app with sync views, the ASGI app with the same sync views, and the ASGI
+app with the async views from superlists.async_urls. WSGI requests run on a thread
+pool; ASGI requests run as concurrent tasks on one event loop. Each setup runs in
+its own process against a fresh database.
+
+    python -m benchmarks.asgi_vs_wsgi --concurrency 64 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from urllib.parse import urlencode
+from benchmarks.common import percentile, request_headers, setup_django, wsgi_environ
+
+SETUPS: dict[str, str] = {"wsgi": "superlists.urls", "asgi-sync": "superlists.urls",
+                          "asgi-async": "superlists.async_urls"}
+
+
+def _plan(list_ids: list[int], count: int, write_ratio: float) -> list[tuple[str, str, bytes]]:
+    generator = random.Random(0)
+    plan: list[tuple[str, str, bytes]] = []
+    for _ in range(count):
+        list_id: int = generator.choice(list_ids)
+        if generator.random() < write_ratio:
+            plan.append(("POST", f"/lists/{list_id}/add_item", urlencode({"item_text": "Load test item"}).encode()))
+        else:
+            plan.append(("GET", f"/lists/{list_id}/", b""))
+    return plan
+
+
+def _run_wsgi(plan: list[tuple[str, str, bytes]], concurrency: int) -> tuple[list[float], int]:
+    from superlists.wsgi import application
+    failures: list[str] = []
+
+    def start_response(status: str, headers: list[tuple[str, str]], exc_info: Any = None) -> None:
+        if int(status.split()[0]) >= 400:
+            failures.append(status)
+
+    def call(request: tuple[str, str, bytes]) -> float:
+        method, path, body = request
+        environ: dict[str, Any] = wsgi_environ(method, path, body)
+        start: float = time.perf_counter()
+        response = application(environ, start_response)
+        b"".join(response)
+        response.close()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(call, plan)), len(failures)
+
+
+def _run_asgi(plan: list[tuple[str, str, bytes]], concurrency: int) -> tuple[list[float], int]:
+    from superlists.asgi import application
+    failures: list[int] = []
+
+    async def call(request: tuple[str, str, bytes]) -> float:
+        method, path, body = request
+        scope: dict[str, Any] = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": [(name.encode(), value.encode()) for name, value in request_headers(method)],
+            "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+        }
+        finished = asyncio.Event()
+        body_sent: list[bool] = []
+
+        async def receive() -> dict[str, Any]:
+            if not body_sent:
+                body_sent.append(True)
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Django listens for a disconnect while the view runs
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and message["status"] >= 400:
+                failures.append(message["status"])
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                finished.set()
+
+        start: float = time.perf_counter()
+        await application(scope, receive, send)
+        await finished.wait()
+        return time.perf_counter() - start
+
+    async def run_all() -> list[float]:
+        limit = asyncio.Semaphore(concurrency)
+
+        async def limited(request: tuple[str, str, bytes]) -> float:
+            async with limit:
+                return await call(request)
+
+        return list(await asyncio.gather(*(limited(request) for request in plan)))
+
+    return asyncio.run(run_all()), len(failures)
+
+
+def run_setup(setup: str, concurrency: int, requests: int, write_ratio: float) -> dict[str, Any]:
+    setup_django(ROOT_URLCONF=SETUPS[setup])
+    from lists.models import Item, List
+
+    list_ids: list[int] = [List.objects.create().id for _ in range(20)]
+    for list_id in list_ids:
+        Item.objects.bulk_add(list_id, [f"Seed item {n}" for n in range(20)])
+    plan = _plan(list_ids, requests, write_ratio)
+
+    start: float = time.perf_counter()
+    latencies, failures = _run_wsgi(plan, concurrency) if setup == "wsgi" else _run_asgi(plan, concurrency)
+    elapsed: float = time.perf_counter() - start
+    return {"setup": setup, "concurrency": concurrency, "requests": requests, "failures": failures,
+            "requests_per_sec": requests / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--setup", choices=list(SETUPS), help="Run one setup and print its result as JSON")
+    args = parser.parse_args()
+
+    if args.setup:
+        print(json.dumps(run_setup(args.setup, args.concurrency, args.requests, args.write_ratio)))
+        return
+
+    for setup in SETUPS:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.asgi_vs_wsgi", "--setup", setup,
+             "--concurrency", str(args.concurrency), "--requests", str(args.requests),
+             "--write-ratio", str(args.write_ratio)],
+            check=True, capture_output=True, text=True).stdout
+        result: dict[str, Any] = json.loads(output)
+        print(f"{setup:>10}: {result['requests_per_sec']:>7.0f} req/s, "
+              f"p50 {result['p50_ms']:>7.1f} ms, p99 {result['p99_ms']:>7.1f} ms, {result['failures']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Compares the items/sec of the bulk add_items endpoint against one add_item POST per item.
+
+    python -m benchmarks.bulk_add_items --items 5000
+"""
+import argparse
+import json
+import time
+from benchmarks.common import setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=5000)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from lists.models import Item, List
+
+    client = Client()
+    texts: list[str] = [f"Checklist line {n}" for n in range(args.items)]
+
+    single_list: List = List.objects.create()
+    with CaptureQueriesContext(connection) as single_queries:
+        start: float = time.perf_counter()
+        for text in texts:
+            client.post(f"/lists/{single_list.id}/add_item", data={"item_text": text})
+        single_seconds: float = time.perf_counter() - start
+
+    bulk_list: List = List.objects.create()
+    with CaptureQueriesContext(connection) as bulk_queries:
+        start = time.perf_counter()
+        client.post(f"/lists/{bulk_list.id}/add_items",
+                    data=json.dumps(texts), content_type="application/json")
+        bulk_seconds: float = time.perf_counter() - start
+
+    assert Item.objects.filter(list=single_list).count() == args.items
+    assert Item.objects.filter(list=bulk_list).count() == args.items
+    print(f"add_item  x{args.items}: {args.items / single_seconds:>10.0f} items/sec, "
+          f"{len(single_queries)} queries, {args.items} requests")
+    print(f"add_items x1:     {args.items / bulk_seconds:>10.0f} items/sec, "
+          f"{len(bulk_queries)} queries, 1 request")
+    print(f"speedup: {single_seconds / bulk_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Measures what PerformanceMiddleware costs per request, by timing the same
+view_list / add_item loop with PERF_INSTRUMENTATION off and on. Log lines go to a
+NullHandler so the terminal doesn't dominate the measurement.
+
+    python -m benchmarks.instrumentation_overhead --requests 3000
+"""
+import argparse
+import logging
+import tempfile
+import time
+from benchmarks.common import setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    setup_django(PERF_STATS_DIR=tempfile.mkdtemp(prefix="superlists-perf-"))
+
+    from django.test import Client, override_settings
+    from lists.models import Item, List
+
+    logging.getLogger("lists.performance").handlers = [logging.NullHandler()]
+
+    def run(enabled: bool) -> float:
+        # A fresh list each round, so later rounds don't render longer lists
+        my_list: List = List.objects.create()
+        Item.objects.bulk_add(my_list.id, [f"Seed item {n}" for n in range(20)])
+        with override_settings(PERF_INSTRUMENTATION=enabled):
+            # A new client loads the middleware chain afresh with the setting applied
+            client = Client()
+            start: float = time.perf_counter()
+            for n in range(args.requests):
+                if n % 10 == 0:
+                    client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "Benchmark item"})
+                else:
+                    client.get(f"/lists/{my_list.id}/")
+            return (time.perf_counter() - start) / args.requests
+
+    run(False)
+    # Alternated, so drift in the machine's speed during the run hits both alike
+    offs: list[float] = []
+    ons: list[float] = []
+    for _ in range(args.rounds):
+        offs.append(run(False))
+        ons.append(run(True))
+    off: float = min(offs)
+    on: float = min(ons)
+    print(f"instrumentation off: {off * 1e6:>8.1f} us/request")
+    print(f"instrumentation on:  {on * 1e6:>8.1f} us/request")
+    print(f"overhead: {(on - off) * 1e6:.1f} us/request ({(on - off) / off:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Finding items by text in a seeded database: Item.objects.search over the FTS5
+index of migration 0009 against the text__icontains scan it replaces, each asked
+for a first page of results. Seeded texts are "Seeded item <n>", so a number is
+a rare word and "seeded" is in every item.
+
+    python -m benchmarks.item_search --items 1000000
+"""
+import argparse
+import time
+from collections.abc import Callable
+from io import StringIO
+from typing import Any
+from benchmarks.common import percentile, setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lists", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    db_path = setup_django()
+
+    from django.core.management import call_command
+    from lists.models import Item, List
+
+    start: float = time.perf_counter()
+    call_command("seed_lists", lists=args.lists, items=args.items, skewed=True, stdout=StringIO())
+    print(f"Seeded {args.items} items, indexing each as it was inserted, in {time.perf_counter() - start:.1f}s "
+          f"({db_path.stat().st_size / 2 ** 20:.0f} MiB)")
+    biggest_list: int = List.objects.order_by("-item_count").values_list("id", flat=True)[0]
+    rare: str = str(args.items // 2)
+    prefix: str = rare[:-1]
+    limit: int = args.page_size
+
+    def icontains(word: str, **filters: Any) -> Callable[[], int]:
+        return lambda: len(Item.objects.filter(text__icontains=word, **filters).order_by("id")[:limit])
+
+    def search(text: str, **filters: Any) -> Callable[[], int]:
+        return lambda: len(Item.objects.search(text, limit=limit, **filters))
+
+    queries: dict[str, tuple[Callable[[], int], Callable[[], int]]] = {
+        f"rare word {rare}": (icontains(f" {rare}"), search(rare)),
+        f"prefix {prefix}*": (icontains(f" {prefix}"), search(f"{prefix}*")),
+        f"{prefix}* in one list": (icontains(f" {prefix}", list_id=biggest_list),
+                                   search(f"{prefix}*", list_id=biggest_list)),
+        # Ranking has to score every match before the first page, where the scan
+        # stops as soon as it has one
+        "common word seeded": (icontains("seeded"), search("seeded")),
+    }
+    for name, (scan, indexed) in queries.items():
+        timings: dict[str, float] = {}
+        for method, query in [("icontains", scan), ("fts5", indexed)]:
+            samples: list[float] = []
+            for _ in range(args.rounds):
+                query_start: float = time.perf_counter()
+                found: int = query()
+                samples.append(time.perf_counter() - query_start)
+            timings[method] = percentile(samples, 0.5) * 1000
+        print(f"{name:>24}: {found:>3} found, icontains {timings['icontains']:>9.2f} ms, "
+              f"fts5 {timings['fts5']:>9.2f} ms ({timings['icontains'] / timings['fts5']:>8.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
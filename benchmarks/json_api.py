@@ -0,0 +1,76 @@
+"""Reading a whole list as a machine client would: scraping the view_list HTML page
+(with its fragment cache cold and warm) against walking the items.json pages and
+streaming ?stream NDJSON. Reports bytes on the wire and server CPU time per item,
+calling the WSGI app from superlists.wsgi in-process.
+
+    python -m benchmarks.json_api --items 10000
+"""
+import argparse
+import json
+import time
+from collections.abc import Callable
+from typing import Any
+from benchmarks.common import setup_django, wsgi_environ
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.core.cache import caches
+    from lists.models import Item, List
+    from superlists.wsgi import application
+
+    my_list: List = List.objects.create()
+    Item.objects.bulk_add(my_list.id, [f"Benchmark item number {n}" for n in range(args.items)])
+
+    def get(path: str, query: str = "") -> bytes:
+        environ: dict[str, Any] = wsgi_environ("GET", path)
+        environ["QUERY_STRING"] = query
+        response = application(environ, lambda status, headers, exc_info=None: None)
+        body: bytes = b"".join(response)
+        response.close()
+        return body
+
+    def html_cold() -> int:
+        caches["lists"].clear()
+        return len(get(f"/lists/{my_list.id}/"))
+
+    def html_warm() -> int:
+        return len(get(f"/lists/{my_list.id}/"))
+
+    def json_pages() -> int:
+        size: int = 0
+        query: str = f"limit={args.page_size}"
+        while True:
+            body: bytes = get(f"/lists/{my_list.id}/items.json", query)
+            size += len(body)
+            next_page: str | None = json.loads(body)["next"]
+            if next_page is None:
+                return size
+            query = f"after={next_page}&limit={args.page_size}"
+
+    def json_stream() -> int:
+        return len(get(f"/lists/{my_list.id}/items.json", "stream"))
+
+    readers: dict[str, Callable[[], int]] = {
+        "html, cache cold": html_cold, "html, cache warm": html_warm,
+        "json pages": json_pages, "ndjson stream": json_stream,
+    }
+    html_warm()
+    for name, reader in readers.items():
+        cpu_seconds: list[float] = []
+        for _ in range(args.rounds):
+            start: float = time.process_time()
+            size: int = reader()
+            cpu_seconds.append(time.process_time() - start)
+        print(f"{name:>16}: {size:>9} bytes ({size / args.items:>5.1f} per item), "
+              f"{min(cpu_seconds) / args.items * 1e6:>6.2f} us CPU per item")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Per-request cost of each list endpoint under the default settings and the lean
+profile in superlists/settings_lean.py, calling the WSGI app from superlists.wsgi
+directly so only the Django stack is measured. Each profile runs in its own process
+against a fresh database.
+
+    python -m benchmarks.lean_profile --requests 3000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any
+from urllib.parse import urlencode
+from benchmarks.common import setup_django, wsgi_environ
+
+PROFILES: dict[str, str] = {"default": "superlists.settings", "lean": "superlists.settings_lean"}
+
+
+def run_profile(profile: str, requests: int, rounds: int) -> dict[str, float]:
+    setup_django(PROFILES[profile])
+    from lists.models import Item, List
+    from superlists.wsgi import application
+
+    my_list: List = List.objects.create()
+    Item.objects.bulk_add(my_list.id, [f"Seed item {n}" for n in range(20)])
+    form: bytes = urlencode({"item_text": "Benchmark item"}).encode()
+    endpoints: dict[str, tuple[str, str, bytes]] = {
+        "home_page": ("GET", "/", b""),
+        "view_list": ("GET", f"/lists/{my_list.id}/", b""),
+        "new_list": ("POST", "/lists/new", form),
+        "add_item": ("POST", f"/lists/{my_list.id}/add_item", form),
+    }
+
+    def start_response(status: str, headers: list[tuple[str, str]], exc_info: Any = None) -> None:
+        if int(status.split()[0]) >= 400:
+            raise RuntimeError(f"{profile} answered {status}")
+
+    def run(method: str, path: str, body: bytes) -> float:
+        start: float = time.perf_counter()
+        for _ in range(requests):
+            response = application(wsgi_environ(method, path, body), start_response)
+            b"".join(response)
+            response.close()
+        return (time.perf_counter() - start) / requests
+
+    return {name: min(run(*request) for _ in range(rounds)) * 1e6 for name, request in endpoints.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--profile", choices=list(PROFILES), help="Run one profile and print its result as JSON")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.requests, args.rounds)))
+        return
+
+    results: dict[str, dict[str, float]] = {}
+    for profile in PROFILES:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.lean_profile", "--profile", profile,
+             "--requests", str(args.requests), "--rounds", str(args.rounds)],
+            check=True, capture_output=True, text=True).stdout
+        results[profile] = json.loads(output)
+    for endpoint, default_us in results["default"].items():
+        lean_us: float = results["lean"][endpoint]
+        print(f"{endpoint:>10}: default {default_us:>7.1f} us, lean {lean_us:>7.1f} us, "
+              f"saves {default_us - lean_us:>6.1f} us ({(default_us - lean_us) / default_us:.0%})")
+
+
+if __name__ == "__main__":
+    main()
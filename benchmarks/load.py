@@ -0,0 +1,288 @@
+"""Load test for the superlists endpoints. Seeds a fresh database with many lists
+of skewed sizes, then drives home_page, new_list, view_list and add_item with a
+configurable mix and concurrency, either calling the WSGI app from superlists.wsgi
+in-process or through a local threaded HTTP server. Reports throughput, latency
+percentiles and queries per request for each endpoint, optionally as JSON, and
+compares two JSON results, flagging regressions beyond a threshold.
+
+    python -m benchmarks.load run --transport http --concurrency 16 --output after.json
+    python -m benchmarks.load compare before.json after.json --threshold 0.1
+"""
+import argparse
+import http.client
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from io import StringIO
+from socketserver import ThreadingMixIn
+from typing import Any
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from benchmarks.common import percentile, request_headers, setup_django, wsgi_environ
+
+ENDPOINTS: tuple[str, ...] = ("home_page", "new_list", "view_list", "add_item")
+DEFAULT_MIX = "view_list=70,add_item=20,new_list=5,home_page=5"
+QUERY_COUNT_HEADER = "X-Benchmark-Queries"
+# Lower is better for these, higher for requests_per_sec
+WORSE_WHEN_HIGHER: tuple[str, ...] = ("p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+
+WSGIApp = Callable[[dict[str, Any], Callable[..., Any]], Iterable[bytes]]
+
+
+@dataclass
+class Request:
+    endpoint: str
+    method: str
+    path: str
+    body: bytes = b""
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    seconds: float
+    status: int
+    queries: int
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Endpoint weights from "endpoint=weight,..." """
+    weights: dict[str, float] = {}
+    for part in mix.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {endpoint!r}, expected one of {ENDPOINTS}")
+        weights[endpoint.strip()] = float(weight)
+    return weights
+
+
+def plan_requests(list_ids: list[int], mix: dict[str, float], count: int, seed: int) -> list[Request]:
+    """A reproducible request sequence. Lists are picked with the same 1/rank skew
+    seed_lists gives their sizes, so the biggest lists are also the busiest"""
+    generator = random.Random(seed)
+    endpoints: list[str] = generator.choices(list(mix), weights=list(mix.values()), k=count)
+    targets: list[int] = generator.choices(
+        list_ids, weights=[1 / rank for rank in range(1, len(list_ids) + 1)], k=count)
+    form: bytes = urlencode({"item_text": "Load test item"}).encode()
+    requests: list[Request] = []
+    for endpoint, list_id in zip(endpoints, targets):
+        if endpoint == "home_page":
+            requests.append(Request(endpoint, "GET", "/"))
+        elif endpoint == "new_list":
+            requests.append(Request(endpoint, "POST", "/lists/new", form))
+        elif endpoint == "view_list":
+            requests.append(Request(endpoint, "GET", f"/lists/{list_id}/"))
+        else:
+            requests.append(Request(endpoint, "POST", f"/lists/{list_id}/add_item", form))
+    return requests
+
+
+def counting_queries(application: WSGIApp) -> WSGIApp:
+    """Wraps the app so each response reports how many queries it ran, on any of
+    the databases, in a header"""
+    from django.db import connections
+
+    def counted(environ: dict[str, Any], start_response: Callable[..., Any]) -> Iterable[bytes]:
+        queries: list[str] = []
+
+        def count(execute: Callable[..., Any], sql: str, params: Any, many: bool, context: Any) -> Any:
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def start(status: str, headers: list[tuple[str, str]], exc_info: Any = None) -> Any:
+            return start_response(status, [*headers, (QUERY_COUNT_HEADER, str(len(queries)))], exc_info)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count))
+            return application(environ, start)
+
+    return counted
+
+
+def in_process_sender(application: WSGIApp) -> Callable[[Request], Sample]:
+    def send(request: Request) -> Sample:
+        response_status: list[int] = []
+        response_queries: list[int] = []
+
+        def start_response(status: str, headers: list[tuple[str, str]], exc_info: Any = None) -> None:
+            response_status.append(int(status.split()[0]))
+            response_queries.append(int(dict(headers).get(QUERY_COUNT_HEADER, 0)))
+
+        start: float = time.perf_counter()
+        response = application(wsgi_environ(request.method, request.path, request.body), start_response)
+        b"".join(response)
+        getattr(response, "close", lambda: None)()
+        return Sample(request.endpoint, time.perf_counter() - start, response_status[0], response_queries[0])
+
+    return send
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def http_sender(port: int) -> Callable[[Request], Sample]:
+    def send(request: Request) -> Sample:
+        start: float = time.perf_counter()
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            connection.request(request.method, request.path, body=request.body or None,
+                               headers=dict(request_headers(request.method)))
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        return Sample(request.endpoint, time.perf_counter() - start, response.status,
+                      int(response.getheader(QUERY_COUNT_HEADER, "0")))
+
+    return send
+
+
+def summarise(samples: list[Sample], elapsed: float) -> dict[str, Any]:
+    """Latency and throughput of samples, served in elapsed seconds"""
+    latencies: list[float] = [sample.seconds for sample in samples]
+    return {
+        "requests": len(samples),
+        "failures": sum(sample.status >= 400 for sample in samples),
+        "requests_per_sec": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "queries_per_request": sum(sample.queries for sample in samples) / len(samples) if samples else 0.0,
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    setup_django()
+    import django
+    from django.core.management import call_command
+    from lists.models import List
+    from superlists.wsgi import application
+
+    call_command("seed_lists", lists=args.lists, items=args.items, skewed=True, snapshots=True, seed=args.seed,
+                 stdout=StringIO())
+    list_ids: list[int] = list(List.objects.order_by("id").values_list("id", flat=True))
+    requests: list[Request] = plan_requests(list_ids, args.mix, args.warmup + args.requests, args.seed)
+
+    app: WSGIApp = counting_queries(application)
+    server: ThreadingWSGIServer | None = None
+    if args.transport == "http":
+        server = make_server("127.0.0.1", 0, app, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        send: Callable[[Request], Sample] = http_sender(server.server_port)
+    else:
+        send = in_process_sender(app)
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(send, requests[:args.warmup]))
+            start: float = time.perf_counter()
+            samples: list[Sample] = list(pool.map(send, requests[args.warmup:]))
+            elapsed: float = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "config": {"transport": args.transport, "concurrency": args.concurrency, "requests": args.requests,
+                   "warmup": args.warmup, "mix": args.mix, "lists": args.lists, "items": args.items,
+                   "seed": args.seed},
+        "environment": {"python": platform.python_version(), "django": django.get_version(),
+                        "platform": platform.platform()},
+        "overall": summarise(samples, elapsed),
+        "endpoints": {endpoint: _summarise_endpoint([sample for sample in samples if sample.endpoint == endpoint],
+                                                    args.concurrency)
+                      for endpoint in args.mix},
+    }
+
+
+def _summarise_endpoint(samples: list[Sample], concurrency: int) -> dict[str, Any]:
+    """An endpoint's figures, its throughput over its own share of the workers'
+    time: its requests kept concurrency workers busy for their summed latency
+    divided by concurrency. The run's elapsed time would only give its share of
+    the mix"""
+    return summarise(samples, sum(sample.seconds for sample in samples) / concurrency)
+
+
+def regressions(before: dict[str, Any], after: dict[str, Any], threshold: float) -> list[str]:
+    """Descriptions of every metric that got worse by more than threshold, as a fraction"""
+    found: list[str] = []
+    for name in ["overall", *sorted(set(before["endpoints"]) & set(after["endpoints"]))]:
+        old: dict[str, float] = before["overall"] if name == "overall" else before["endpoints"][name]
+        new: dict[str, float] = after["overall"] if name == "overall" else after["endpoints"][name]
+        for metric in ("requests_per_sec", *WORSE_WHEN_HIGHER):
+            if not old[metric]:
+                continue
+            change: float = (new[metric] - old[metric]) / old[metric]
+            if (change if metric in WORSE_WHEN_HIGHER else -change) > threshold:
+                found.append(f"{name} {metric}: {old[metric]:.2f} -> {new[metric]:.2f} ({change:+.0%})")
+    return found
+
+
+def print_results(results: dict[str, Any]) -> None:
+    rows: dict[str, dict[str, Any]] = {**results["endpoints"], "overall": results["overall"]}
+    for name, result in rows.items():
+        print(f"{name:>10}: {result['requests']:>6} requests, {result['requests_per_sec']:>7.0f} req/s, "
+              f"p50 {result['p50_ms']:>6.1f} ms, p95 {result['p95_ms']:>6.1f} ms, p99 {result['p99_ms']:>6.1f} ms, "
+              f"{result['queries_per_request']:.1f} queries, {result['failures']} failed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Seed a fresh database and load it")
+    run_parser.add_argument("--transport", choices=["in-process", "http"], default="in-process")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--requests", type=int, default=5000)
+    run_parser.add_argument("--warmup", type=int, default=200, help="Requests sent before measuring")
+    run_parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                            help=f"Endpoint weights, default {DEFAULT_MIX}")
+    run_parser.add_argument("--lists", type=int, default=1000)
+    run_parser.add_argument("--items", type=int, default=100_000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Write the results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two JSON results")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Largest tolerated relative change for the worse, default 0.1")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results: dict[str, Any] = run(args)
+        print_results(results)
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(results, output, indent=2)
+        return
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    if before["config"] != after["config"]:
+        print("Warning: the runs were made with different configurations", file=sys.stderr)
+    found: list[str] = regressions(before, after, args.threshold)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if found:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""add_item throughput as lists are sharded over more SQLite databases. Writer
+processes, forked so they don't share a GIL, each post items to their share of the
+lists through the app for a fixed time, one transaction per item. With one
+shard every writer queues for the same write lock; with more, writers to lists
+on different shards commit side by side, so items/s should grow with the shard
+count until the CPUs or the disk run out. Each shard count runs in its own
+process against fresh databases.
+
+    python -m benchmarks.sharding --processes 8 --seconds 5
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import sys
+import time
+from typing import Any
+from benchmarks.common import percentile, setup_django
+
+SHARD_ALIASES: list[str] = ["default", "lists_1", "lists_2", "lists_3"]
+SHARD_COUNTS: tuple[int, ...] = (1, 2, 4)
+
+
+def write_items(list_ids: list[int], deadline: float, results: "multiprocessing.Queue[dict[str, Any]]") -> None:
+    from django.test import Client
+
+    client = Client()
+    latencies: list[float] = []
+    failed: int = 0
+    while time.perf_counter() < deadline:
+        start: float = time.perf_counter()
+        response = client.post(f"/lists/{list_ids[len(latencies) % len(list_ids)]}/add_item",
+                               data={"item_text": "Benchmark item"})
+        latencies.append(time.perf_counter() - start)
+        failed += response.status_code != 302
+    results.put({"requests": len(latencies), "failed": failed, "latencies": latencies})
+
+
+def run_shards(shards: int, processes: int, seconds: float, lists: int) -> dict[str, Any]:
+    setup_django(LIST_SHARDS=SHARD_ALIASES[:shards])
+
+    from django.db import connections
+    from lists import sharding
+    from lists.models import Item, List
+
+    # New lists go to the shards in turn, so they are spread evenly
+    list_ids: list[int] = [List.objects.create_with_item("First item").id for _ in range(lists)]
+    # Forked writers open their own connections
+    connections.close_all()
+
+    context = multiprocessing.get_context("fork")
+    results: "multiprocessing.Queue[dict[str, Any]]" = context.Queue()
+    start: float = time.perf_counter()
+    writers: list[Any] = [
+        context.Process(target=write_items, args=(list_ids[writer::processes] or list_ids, start + seconds, results))
+        for writer in range(processes)]
+    for writer in writers:
+        writer.start()
+    outcomes: list[dict[str, Any]] = [results.get() for _ in writers]
+    for writer in writers:
+        writer.join()
+    elapsed: float = time.perf_counter() - start
+
+    items: int = sum(Item.objects.using(shard).count() for shard in sharding.shards()) - lists
+    latencies: list[float] = [latency for outcome in outcomes for latency in outcome["latencies"]]
+    return {"shards": shards, "processes": processes, "items_per_sec": items / elapsed,
+            "failures": sum(outcome["failed"] for outcome in outcomes),
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--lists", type=int, default=16)
+    parser.add_argument("--shards", type=int, choices=SHARD_COUNTS,
+                        help="Run one shard count and print its result as JSON")
+    args = parser.parse_args()
+
+    if args.shards:
+        print(json.dumps(run_shards(args.shards, args.processes, args.seconds, args.lists)))
+        return
+
+    for shards in SHARD_COUNTS:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sharding", "--shards", str(shards), "--processes", str(args.processes),
+             "--seconds", str(args.seconds), "--lists", str(args.lists)],
+            check=True, capture_output=True, text=True).stdout
+        result: dict[str, Any] = json.loads(output)
+        print(f"{shards} shard{'s' if shards > 1 else ' '}: {result['items_per_sec']:>8.0f} items/s, "
+              f"p50 {result['p50_ms']:>7.2f} ms, p99 {result['p99_ms']:>7.2f} ms, {result['failures']} failed")
+
+
+if __name__ == "__main__":
+    main()
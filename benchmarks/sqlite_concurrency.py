@@ -0,0 +1,92 @@
+"""Mixed view_list / add_item load from many threads, comparing Django's stock SQLite
+settings with the tuned profile in superlists/settings.py (WAL, busy timeout,
+immediate transactions, persistent connections). Each profile runs in its own
+process against a fresh database.
+
+    python -m benchmarks.sqlite_concurrency --threads 16 --seconds 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from typing import Any
+from benchmarks.common import setup_django
+
+STOCK_DATABASE: dict[str, Any] = {"OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+
+
+def run_profile(profile: str, threads: int, seconds: float, write_ratio: float) -> dict[str, Any]:
+    setup_django(database=STOCK_DATABASE if profile == "stock" else None)
+
+    import random
+    from django.db import OperationalError, connection
+    from django.test import Client
+    from lists.models import Item, List
+
+    list_ids: list[int] = [List.objects.create().id for _ in range(8)]
+    for list_id in list_ids:
+        Item.objects.bulk_add(list_id, [f"Seed item {n}" for n in range(50)])
+    connection.close()
+
+    totals: dict[str, int] = {"requests": 0, "locked": 0, "errors": 0}
+    totals_lock = threading.Lock()
+    deadline: float = time.perf_counter() + seconds
+
+    def worker(seed: int) -> None:
+        client = Client()
+        generator = random.Random(seed)
+        done: dict[str, int] = {"requests": 0, "locked": 0, "errors": 0}
+        while time.perf_counter() < deadline:
+            list_id: int = generator.choice(list_ids)
+            try:
+                if generator.random() < write_ratio:
+                    client.post(f"/lists/{list_id}/add_item", data={"item_text": "Benchmark item"})
+                else:
+                    client.get(f"/lists/{list_id}/")
+                done["requests"] += 1
+            except OperationalError as error:
+                done["locked" if "locked" in str(error) else "errors"] += 1
+        connection.close()
+        with totals_lock:
+            for key, value in done.items():
+                totals[key] += value
+
+    workers: list[threading.Thread] = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    attempts: int = totals["requests"] + totals["locked"] + totals["errors"]
+    return {"profile": profile, "threads": threads, "requests_per_sec": totals["requests"] / seconds,
+            "lock_error_rate": totals["locked"] / attempts if attempts else 0.0, **totals}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--profile", choices=["stock", "tuned"],
+                        help="Run one profile in this process and print its result as JSON")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.threads, args.seconds, args.write_ratio)))
+        return
+
+    for profile in ["stock", "tuned"]:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_concurrency", "--profile", profile,
+             "--threads", str(args.threads), "--seconds", str(args.seconds),
+             "--write-ratio", str(args.write_ratio)],
+            check=True, capture_output=True, text=True).stdout
+        result: dict[str, Any] = json.loads(output)
+        print(f"{profile:>6}: {result['requests_per_sec']:>8.0f} req/s, "
+              f"{result['lock_error_rate']:>6.1%} lock errors, {result['errors']} other errors")
+
+
+if __name__ == "__main__":
+    main()
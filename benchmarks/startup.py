@@ -0,0 +1,179 @@
+"""Cold start of each entry point, manage.py, superlists.wsgi and superlists.asgi,
+under the default settings and the lean profile in superlists/settings_lean.py.
+Every round is a fresh interpreter, timed from its launch: until the entry point
+is imported, and until it has answered its first request for a list page;
+manage.py until "check" has run and exited. Reports the median of each over the
+rounds, and from one more run with -X importtime the packages whose imports took
+longest. With --budget-ms it fails, as a CI step, when any median cold start is
+over budget. The project is byte-compiled first, as a deployment would have it, so
+no round pays for compiling a module that changed.
+
+-X importtime only times import statements, not importlib.import_module, which
+Django loads apps, models, middleware and URLconfs with. What they import is
+listed, but their own code shows up as self time of the module that loaded them,
+such as superlists.wsgi for everything django.setup() loads.
+
+    python -m benchmarks.startup --rounds 5 --budget-ms 1000
+"""
+import argparse
+import asyncio
+import compileall
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from benchmarks.common import BASE_DIR, request_headers, setup_django, wsgi_environ
+
+PROFILES: dict[str, str] = {"default": "superlists.settings", "lean": "superlists.settings_lean"}
+ENTRY_POINTS: tuple[str, ...] = ("manage.py", "wsgi", "asgi")
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+# Each profile as deployed, but against the benchmark's database
+SETTINGS_MODULE = """from {module} import *  # noqa: F401,F403
+from {module} import DATABASES
+
+DATABASES = {{**DATABASES, "default": {{**DATABASES["default"], "NAME": {database!r}}}}}
+DEBUG = False
+ALLOWED_HOSTS = ["localhost"]
+"""
+
+# Run with -c in each round: imports the entry point the way a server would, then
+# prints when that finished and how long the first response took
+PROBE = """import sys, time
+application = __import__(f"superlists.{sys.argv[1]}", fromlist=["application"]).application
+imported = time.time()
+from benchmarks.startup import first_response
+print(imported, first_response(sys.argv[1], application, sys.argv[2]))
+"""
+
+
+def first_response(entry: str, application: Any, path: str) -> float:
+    """Seconds the app took to answer a GET of path, which has to succeed"""
+    start: float = time.perf_counter()
+    status: int = 0
+    if entry == "wsgi":
+        def start_response(line: str, headers: list[tuple[str, str]], exc_info: Any = None) -> None:
+            nonlocal status
+            status = int(line.split()[0])
+
+        response = application(wsgi_environ("GET", path), start_response)
+        b"".join(response)
+        response.close()
+    else:
+        async def call() -> None:
+            nonlocal status
+            scope: dict[str, Any] = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                "headers": [(name.encode(), value.encode()) for name, value in request_headers("GET")],
+                "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+            }
+            finished = asyncio.Event()
+            requested: list[bool] = []
+
+            async def receive() -> dict[str, Any]:
+                if not requested:
+                    requested.append(True)
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message: dict[str, Any]) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    finished.set()
+
+            await application(scope, receive, send)
+            await finished.wait()
+
+        asyncio.run(call())
+    if status != 200:
+        raise RuntimeError(f"GET {path} answered {status}")
+    return time.perf_counter() - start
+
+
+def import_breakdown(importtime: str) -> Counter[str]:
+    """Microseconds of import self time per package, Django's split by subpackage"""
+    packages: Counter[str] = Counter()
+    for self_us, module in IMPORT_TIME.findall(importtime):
+        parts: list[str] = module.split(".")
+        depth: int = 3 if parts[:2] == ["django", "contrib"] else 2 if parts[0] == "django" else 1
+        packages[".".join(parts[:depth])] += int(self_us)
+    return packages
+
+
+def run_round(entry: str, env: dict[str, str], path: str, importtime: bool = False) -> tuple[dict[str, float], str]:
+    """Times one cold start, returning its milliseconds and what it wrote to stderr,
+    the -X importtime report when asked for one"""
+    command: list[str] = ([str(BASE_DIR / "manage.py"), "check"] if entry == "manage.py"
+                          else ["-c", PROBE, entry, path])
+    launched: float = time.time()
+    finished = subprocess.run([sys.executable, *(["-X", "importtime"] if importtime else []), *command],
+                              cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True)
+    if entry == "manage.py":
+        return {"total_ms": (time.time() - launched) * 1000}, finished.stderr
+    imported, seconds = (float(value) for value in finished.stdout.split())
+    import_ms: float = (imported - launched) * 1000
+    return {"import_ms": import_ms, "first_response_ms": seconds * 1000,
+            "total_ms": import_ms + seconds * 1000}, finished.stderr
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--profile", choices=list(PROFILES), action="append",
+                        help="Only measure this profile; may be repeated")
+    parser.add_argument("--entry-point", choices=ENTRY_POINTS, action="append",
+                        help="Only measure this entry point; may be repeated")
+    parser.add_argument("--breakdown", type=int, default=8, help="Packages listed per cold start, 0 for none")
+    parser.add_argument("--budget-ms", type=float, help="Fail when a median cold start takes longer than this")
+    args = parser.parse_args()
+
+    for package in ("benchmarks", "lists", "superlists"):
+        compileall.compile_dir(BASE_DIR / package, quiet=1)
+    work_dir: Path = Path(tempfile.mkdtemp(prefix="superlists-startup-"))
+    database: Path = setup_django(database={"NAME": work_dir / "startup.sqlite3"})
+    from django.db import connections
+    from lists.models import Item, List
+
+    my_list: List = List.objects.create_with_item("Seed item 0")
+    Item.objects.bulk_add(my_list.id, [f"Seed item {n}" for n in range(1, 20)])
+    connections.close_all()
+    path: str = f"/lists/{my_list.id}/"
+
+    over_budget: list[str] = []
+    for profile in args.profile or list(PROFILES):
+        (work_dir / f"startup_{profile}.py").write_text(
+            SETTINGS_MODULE.format(module=PROFILES[profile], database=str(database)))
+        env: dict[str, str] = {**os.environ, "DJANGO_SETTINGS_MODULE": f"startup_{profile}",
+                               "PYTHONPATH": os.pathsep.join([str(work_dir), str(BASE_DIR)])}
+        for entry in args.entry_point or list(ENTRY_POINTS):
+            rounds: list[dict[str, float]] = [run_round(entry, env, path)[0] for _ in range(args.rounds)]
+            medians: dict[str, float] = {key: statistics.median(timings[key] for timings in rounds)
+                                         for key in rounds[0]}
+            phases: str = ""
+            if "import_ms" in medians:
+                phases = (f"import {medians['import_ms']:>6.1f} ms, "
+                          f"first response {medians['first_response_ms']:>6.1f} ms, ")
+            print(f"{profile:>7} {entry:>9}: {phases}cold start {medians['total_ms']:>6.1f} ms")
+            if args.breakdown:
+                importtime: str = run_round(entry, env, path, importtime=True)[1]
+                for package, self_us in import_breakdown(importtime).most_common(args.breakdown):
+                    print(f"{'':>19}{package:<40} {self_us / 1000:>6.1f} ms")
+            if args.budget_ms is not None and medians["total_ms"] > args.budget_ms:
+                over_budget.append(f"{profile} {entry} ({medians['total_ms']:.0f} ms)")
+
+    if over_budget:
+        sys.exit(f"Over the {args.budget_ms:.0f} ms cold start budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""A round trip of every list through export_lists and import_lists: seeds a
+database, exports it to a file and imports that into a second, fresh database.
+Each step runs in its own process, so the peak RSS it reports is that step's
+alone. Memory should stay flat as --items grows, once the database outgrows the
+mmap_size and cache_size of SQLITE_PRAGMAS, which SQLite's pages count towards.
+
+    python -m benchmarks.transfer --items 10000000 --format csv
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from typing import Any
+from benchmarks.common import setup_django
+
+STEPS: tuple[str, ...] = ("seed", "export", "import")
+
+
+def run_step(step: str, database: Path, export: Path, lists: int, items: int, batch_size: int) -> dict[str, Any]:
+    setup_django(database={"NAME": database})
+    from django.core.management import call_command
+    from lists import transfer
+    from lists.models import Item
+
+    start: float = time.perf_counter()
+    if step == "seed":
+        call_command("seed_lists", lists=lists, items=items, skewed=True, stdout=StringIO())
+    elif step == "export":
+        call_command("export_lists", str(export), stdout=StringIO(), stderr=StringIO())
+    else:
+        call_command("import_lists", str(export), batch_size=batch_size, stdout=StringIO())
+    elapsed: float = time.perf_counter() - start
+    return {"rows": Item.objects.count(), "seconds": elapsed, "peak_rss_mib": transfer.peak_rss_mib()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lists", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=10_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows imported per transaction")
+    parser.add_argument("--step", choices=STEPS, help="Run one step and print its result as JSON")
+    parser.add_argument("--database", type=Path)
+    parser.add_argument("--export", type=Path)
+    args = parser.parse_args()
+
+    if args.step:
+        print(json.dumps(run_step(args.step, args.database, args.export, args.lists, args.items, args.batch_size)))
+        return
+
+    work_dir: Path = Path(tempfile.mkdtemp(prefix="superlists-transfer-"))
+    export: Path = work_dir / f"lists.{args.format}"
+    databases: dict[str, Path] = {"seed": work_dir / "source.sqlite3", "export": work_dir / "source.sqlite3",
+                                  "import": work_dir / "target.sqlite3"}
+    for step in STEPS:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.transfer", "--step", step, "--database", str(databases[step]),
+             "--export", str(export), "--lists", str(args.lists), "--items", str(args.items),
+             "--batch-size", str(args.batch_size)],
+            check=True, capture_output=True, text=True).stdout
+        result: dict[str, Any] = json.loads(output)
+        peak_rss: str = f"{result['peak_rss_mib']:>5.0f} MiB" if result["peak_rss_mib"] is not None else "unknown"
+        print(f"{step:>6}: {result['rows']:>9} rows in {result['seconds']:>7.1f}s "
+              f"({result['rows'] / result['seconds']:>7.0f} rows/s), peak RSS {peak_rss}")
+    print(f"{export.name}: {export.stat().st_size / 2 ** 20:.0f} MiB, databases and export left in {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
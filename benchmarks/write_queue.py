@@ -0,0 +1,95 @@
+"""Sustained add_item load on a few hot lists from many threads, comparing one
+transaction per item with the write-behind queue of lists.write_queue in both
+durability modes. Reports committed items per second and request latency. Each
+mode runs in its own process against a fresh database.
+
+    python -m benchmarks.write_queue --threads 32 --seconds 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from typing import Any
+from benchmarks.common import percentile, setup_django
+
+MODES: dict[str, dict[str, Any]] = {
+    "per-item": {"ENABLED": False},
+    "queue-flush": {"ENABLED": True, "DURABILITY": "flush", "TIMEOUT": 30},
+    "queue-enqueue": {"ENABLED": True, "DURABILITY": "enqueue", "TIMEOUT": 30},
+}
+
+
+def run_mode(mode: str, threads: int, seconds: float, lists: int, max_batch: int, max_delay: float) -> dict[str, Any]:
+    setup_django(ITEM_WRITE_QUEUE={"MAX_BATCH": max_batch, "MAX_DELAY": max_delay, **MODES[mode]})
+
+    from django.db import connection
+    from django.test import Client
+    from lists import write_queue
+    from lists.models import Item, List
+
+    list_ids: list[int] = [List.objects.create().id for _ in range(lists)]
+    connection.close()
+
+    latencies: list[float] = []
+    failures: list[int] = []
+    results_lock = threading.Lock()
+    deadline: float = time.perf_counter() + seconds
+
+    def worker(writer: int) -> None:
+        client = Client()
+        mine: list[float] = []
+        failed: int = 0
+        while time.perf_counter() < deadline:
+            start: float = time.perf_counter()
+            response = client.post(f"/lists/{list_ids[writer % lists]}/add_item", data={"item_text": "Benchmark item"})
+            mine.append(time.perf_counter() - start)
+            failed += response.status_code != 302
+        connection.close()
+        with results_lock:
+            latencies.extend(mine)
+            failures.append(failed)
+
+    start: float = time.perf_counter()
+    workers: list[threading.Thread] = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    # Enqueued items only count once they are committed
+    write_queue.shutdown()
+    elapsed: float = time.perf_counter() - start
+
+    return {"mode": mode, "threads": threads, "requests": len(latencies), "failures": sum(failures),
+            "items_per_sec": Item.objects.count() / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--lists", type=int, default=4, help="Hot lists the writers share")
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-delay", type=float, default=0.005)
+    parser.add_argument("--mode", choices=list(MODES), help="Run one mode and print its result as JSON")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.threads, args.seconds, args.lists, args.max_batch, args.max_delay)))
+        return
+
+    for mode in MODES:
+        output: str = subprocess.run(
+            [sys.executable, "-m", "benchmarks.write_queue", "--mode", mode, "--threads", str(args.threads),
+             "--seconds", str(args.seconds), "--lists", str(args.lists), "--max-batch", str(args.max_batch),
+             "--max-delay", str(args.max_delay)],
+            check=True, capture_output=True, text=True).stdout
+        result: dict[str, Any] = json.loads(output)
+        print(f"{mode:>13}: {result['items_per_sec']:>8.0f} items/s, p50 {result['p50_ms']:>7.2f} ms, "
+              f"p99 {result['p99_ms']:>7.2f} ms, {result['failures']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 import platform
 from selenium import webdriver
+from selenium.webdriver.remote.webdriver import WebDriver
 
 
-def get_browser():
+def get_browser(headless: bool = False) -> WebDriver:
     system: str = platform.system()
 
     if system == "Darwin":
+        # Safari has no headless mode
         return webdriver.Safari()
     elif system == "Windows":
-        return webdriver.Edge()
+        edge_options = webdriver.EdgeOptions()
+        if headless:
+            edge_options.add_argument("--headless=new")
+        return webdriver.Edge(options=edge_options)
     else:
-        return webdriver.Firefox()
+        firefox_options = webdriver.FirefoxOptions()
+        if headless:
+            firefox_options.add_argument("-headless")
+        return webdriver.Firefox(options=firefox_options)
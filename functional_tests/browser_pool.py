@@ -0,0 +1,58 @@
+import os
+from multiprocessing.util import Finalize
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from browser import get_browser
+
+# Set HEADLESS=0 to watch the tests drive a visible browser
+HEADLESS: bool = os.environ.get("HEADLESS", "1") != "0"
+
+
+class BrowserPool:
+    """Keeps browsers open between tests, since starting one costs far more than a test.
+    Each test process (including each --parallel worker) has its own pool, and every
+    browser is quit when the process exits"""
+
+    def __init__(self) -> None:
+        self.idle: list[WebDriver] = []
+        self.started: list[WebDriver] = []
+        # Unlike atexit, runs in --parallel worker processes too when they shut down
+        Finalize(self, self.close_all, exitpriority=10)
+
+    def acquire(self) -> WebDriver:
+        if self.idle:
+            return self.idle.pop()
+        browser: WebDriver = get_browser(headless=HEADLESS)
+        self.started.append(browser)
+        return browser
+
+    def release(self, browser: WebDriver) -> None:
+        """Clears everything the test left behind and returns the browser to the pool.
+        A browser that can't be reset is quit instead of being handed to the next test"""
+        try:
+            browser.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            # Pages like about:blank have no storage to clear
+            pass
+        try:
+            browser.delete_all_cookies()
+            browser.get("about:blank")
+        except WebDriverException:
+            self._quit(browser)
+            return
+        self.idle.append(browser)
+
+    def close_all(self) -> None:
+        for browser in list(self.started):
+            self._quit(browser)
+        self.idle.clear()
+
+    def _quit(self, browser: WebDriver) -> None:
+        self.started.remove(browser)
+        try:
+            browser.quit()
+        except WebDriverException:
+            pass
+
+
+pool = BrowserPool()
@@ -0,0 +1,128 @@
+"""The user journeys of the functional tests, written once against a Visitor and run
+by both tiers: tests.py drives a real browser through Selenium, and
+test_client_tier.py drives Django's test Client and reads the returned HTML."""
+import time
+from typing import TYPE_CHECKING, Protocol
+from unittest import TestCase
+
+# A plain mixin at runtime, so the scenarios are only collected through the tiers
+_ScenarioBase = TestCase if TYPE_CHECKING else object
+
+MAX_WAIT = 5
+# Polling starts fast and backs off, so a page that is already there costs ~10ms
+FIRST_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.5
+
+
+class Visitor(Protocol):
+    # How long to keep retrying while a page may still be loading, and what a
+    # not-yet-loaded page raises besides failed assertions
+    max_wait: float
+    retry_exceptions: tuple[type[Exception], ...]
+
+    def visit(self, url: str) -> None: ...
+    def title(self) -> str: ...
+    def current_url(self) -> str: ...
+    def header_text(self) -> str: ...
+    def new_item_placeholder(self) -> str | None: ...
+    def submit_new_item(self, text: str) -> None: ...
+    def list_rows(self) -> list[str]: ...
+    def page_text(self) -> str: ...
+    def start_new_session(self) -> None: ...
+
+
+class NewVisitorScenarios(_ScenarioBase):
+    """Mixed into a test case that provides visitor and live_server_url"""
+
+    visitor: Visitor
+    live_server_url: str
+
+    def wait_for_row_in_list_table(self, row_text: str, contains: bool = True):
+        """This helper method is case sensitive, write the entire excepted or unexpected string"""
+        start_time: float = time.time()
+        interval: float = FIRST_POLL_INTERVAL
+        while True:
+            try:
+                rows: list[str] = self.visitor.list_rows()
+                if contains:
+                    self.assertIn(row_text, rows,)
+                else:
+                    self.assertNotIn(row_text, rows,)
+                return
+            except (AssertionError, *self.visitor.retry_exceptions):
+                if time.time() - start_time > self.visitor.max_wait:
+                    raise
+                time.sleep(interval)
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    def test_can_start_a_todo_list(self):
+        # Edith has heard about a cool new online to-do app
+        # She goes to check out its homepage
+        self.visitor.visit(self.live_server_url)
+
+        # She notices the page title and header mention to-do lists
+        self.assertIn("To-Do", self.visitor.title())
+        self.assertIn("To-Do", self.visitor.header_text())
+
+        # She is invited to enter a to-do item straight away
+        self.assertEqual(self.visitor.new_item_placeholder(), "Enter a to-do item")
+
+        # She types "Buy peacock feathers" into a text box
+        # (Edith's hobby is fly-fishing lures)
+        # When she hits enter, the page updates, and now the page lists
+        # "1. Buy peacock feathers" as an item in a to-do list table
+        self.visitor.submit_new_item("Buy peacock feathers")
+        self.wait_for_row_in_list_table("1: Buy peacock feathers")
+
+        # There is still a textbox inviting her to add another item
+        # She enters "Use peacock feathers to make a fly"
+        # (Edith is very methodical)
+        self.visitor.submit_new_item("Use peacock feathers to make a fly")
+
+        # The page updates again, and now shows both items on her list
+        self.wait_for_row_in_list_table("1: Buy peacock feathers")
+        self.wait_for_row_in_list_table(
+            "2: Use peacock feathers to make a fly")
+
+        # Satisfied, she goes back to sleep
+
+    def test_multiple_users_can_start_lists_at_different_urls(self):
+        # Edith starts a new to-do list
+        self.visitor.visit(self.live_server_url)
+        self.visitor.submit_new_item("Buy peacock feathers")
+        self.wait_for_row_in_list_table("1: Buy peacock feathers")
+
+        # She notices that her list has a unique URL
+        edith_list_url: str = self.visitor.current_url()
+        self.assertRegex(edith_list_url, "/lists/.+")
+
+        # Now a new user, Francis, comes along to the site
+
+        # We delete all the browser's cookies
+        # as a way of simulating a brand new user session
+        self.visitor.start_new_session()
+
+        # Francis visits the home page.
+        self.visitor.visit(self.live_server_url)
+
+        # Francis starts a new list by entering a new item. He
+        # is less interesting than Edith... There is no sign of
+        # Edith's List
+        self.visitor.submit_new_item("Buy milk")
+        # Technically only need to check for Buy milk because if buy peacock feathers existed, buy milk would be number 2. However, with this error
+        # It lets us know that Buy peacock feathers was saved as number 1, meaning it lets us know that the data was saved after reloading the cookies
+        # And not that the data was corrupted or the browser didn't load properly and the like.
+        self.wait_for_row_in_list_table("1: Buy peacock feathers", False)
+        self.wait_for_row_in_list_table("1: Buy milk")
+
+        # Francis gets his own unique URL
+        francis_list_url: str = self.visitor.current_url()
+        self.assertRegex(francis_list_url, "/lists/.+")
+        self.assertNotEqual(francis_list_url, edith_list_url)
+
+        # Again, there is no trace of Edith's list
+        page_text = self.visitor.page_text()
+        self.assertNotIn("Buy peacock feathers", page_text)
+        self.assertIn("Buy milk", page_text)
+
+        # Satisfied, they both go back to sleep
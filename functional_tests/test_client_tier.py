@@ -0,0 +1,118 @@
+from html.parser import HTMLParser
+from django.test import Client, TestCase
+from django.http import HttpResponse
+from functional_tests.scenarios import NewVisitorScenarios
+
+
+class PageParser(HTMLParser):
+    """Pulls out of a page what the scenarios look at: the title, the h1, the
+    new item form and its inputs, the id_list_table rows and the body text"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.title: str = ""
+        self.header: str = ""
+        self.body: list[str] = []
+        self.rows: list[str] = []
+        self.inputs: list[dict[str, str | None]] = []
+        self.form_action: str | None = None
+        self.open_tags: list[str] = []
+        self.in_list_table: bool = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes: dict[str, str | None] = dict(attrs)
+        if tag == "input":
+            self.inputs.append(attributes)
+            return
+        self.open_tags.append(tag)
+        if tag == "form":
+            self.form_action = attributes.get("action")
+        elif tag == "table" and attributes.get("id") == "id_list_table":
+            self.in_list_table = True
+        elif tag == "tr" and self.in_list_table:
+            self.rows.append("")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.open_tags:
+            while self.open_tags.pop() != tag:
+                pass
+        if tag == "table":
+            self.in_list_table = False
+
+    def handle_data(self, data: str) -> None:
+        if "title" in self.open_tags:
+            self.title += data
+        if "h1" in self.open_tags:
+            self.header += data
+        if "body" in self.open_tags:
+            self.body.append(data)
+        if self.in_list_table and "tr" in self.open_tags:
+            self.rows[-1] += data
+
+
+def _visible(text: str) -> str:
+    """Collapses whitespace the way a browser displays it"""
+    return " ".join(text.split())
+
+
+class ClientVisitor:
+    """Acts out the scenarios with Django's test Client, submitting forms the way a
+    browser would, CSRF token included, and reading the HTML that comes back"""
+
+    max_wait: float = 0
+    retry_exceptions: tuple[type[Exception], ...] = ()
+
+    def __init__(self) -> None:
+        self.client = Client(enforce_csrf_checks=True)
+        self.url: str = ""
+        self.page = PageParser()
+
+    def _load(self, response: HttpResponse, url: str) -> None:
+        assert response.status_code == 200, f"{url} answered {response.status_code}"
+        if response.redirect_chain:  # type: ignore[attr-defined]
+            url = response.redirect_chain[-1][0]  # type: ignore[attr-defined]
+        self.url = f"http://testserver{url}"
+        self.page = PageParser()
+        self.page.feed(response.content.decode())
+
+    def visit(self, url: str) -> None:
+        self._load(self.client.get(url or "/", follow=True), url or "/")
+
+    def title(self) -> str:
+        return _visible(self.page.title)
+
+    def current_url(self) -> str:
+        return self.url
+
+    def header_text(self) -> str:
+        return _visible(self.page.header)
+
+    def _input(self, name: str) -> dict[str, str | None]:
+        return next(field for field in self.page.inputs if field.get("name") == name)
+
+    def new_item_placeholder(self) -> str | None:
+        return self._input("item_text").get("placeholder")
+
+    def submit_new_item(self, text: str) -> None:
+        assert self.page.form_action is not None, "No form on the page"
+        data: dict[str, str] = {"item_text": text,
+                                "csrfmiddlewaretoken": self._input("csrfmiddlewaretoken")["value"] or ""}
+        self._load(self.client.post(self.page.form_action, data, follow=True), self.page.form_action)
+
+    def list_rows(self) -> list[str]:
+        return [_visible(row) for row in self.page.rows]
+
+    def page_text(self) -> str:
+        return _visible(" ".join(self.page.body))
+
+    def start_new_session(self) -> None:
+        self.client.cookies.clear()
+
+
+class NewVisitorClientTest(NewVisitorScenarios, TestCase):
+    """The functional test scenarios without a browser, in-process and in milliseconds"""
+
+    live_server_url = ""
+
+    def setUp(self):
+        self.visitor = ClientVisitor()
@@ -0,0 +1,14 @@
+from django.urls import path
+from lists import async_views
+
+urlpatterns = [
+    path("new", async_views.new_list, name="new_list"),
+    path("search", async_views.search_items, name="search_items"),
+    path("export", async_views.export_lists, name="export_lists"),
+    path("import", async_views.import_lists, name="import_lists"),
+    path("<int:list_id>/", async_views.view_list, name="view_list"),
+    path("<int:list_id>/items.json", async_views.list_items_json, name="list_items_json"),
+    path("<int:list_id>/export", async_views.export_list, name="export_list"),
+    path("<int:list_id>/add_item", async_views.add_item, name="add_item"),
+    path("<int:list_id>/add_items", async_views.add_items, name="add_items"),
+]
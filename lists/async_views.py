@@ -0,0 +1,192 @@
+"""Native async versions of the views in lists.views, for serving under ASGI
+without a thread hop per request. superlists.async_urls routes to them.
+
+Reads use the async ORM directly. Writes that have to be atomic go through the
+managers' async methods, which run the transaction in a worker thread, since
+Django's transactions are not available in async code.
+"""
+from collections.abc import AsyncIterator
+from typing import Any
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpRequest, HttpResponseBadRequest, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.safestring import mark_safe
+from lists import cache, transfer, write_queue
+from lists.models import ImportCheckpoint, Item, List
+from lists.views import (STREAM_CHUNK_SIZE, _bulk_item_texts, _export_format, _export_response, _format_rows,
+                         _import_result, _import_source, _is_paginated, _item_fields, _item_rows, _items_page,
+                         _ndjson_lines, _page_bounds, _page_context, _search_page, _search_params, _still_queued,
+                         _stream_frame, _validators, _with_validators)
+
+
+# Rendering, and any blocking template loading it does, off the event loop
+_arender = sync_to_async(render)
+
+
+async def home_page(request: HttpRequest) -> HttpResponse:
+    return await _arender(request, "home.html",)
+
+
+async def new_list(request: HttpRequest) -> HttpResponse:
+    new_list: List = await List.objects.acreate_with_item(request.POST["item_text"])
+    return redirect(f"/lists/{new_list.id}/")
+
+
+async def _stream_rows(list_id: int) -> AsyncIterator[str]:
+    texts: list[str] = []
+    counter: int = 0
+    async for text in Item.objects.filter(list_id=list_id).order_by(
+            "id").values_list("text", flat=True).aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        texts.append(text)
+        if len(texts) == STREAM_CHUNK_SIZE:
+            yield _format_rows(texts, counter)
+            counter += len(texts)
+            texts = []
+    if texts:
+        yield _format_rows(texts, counter)
+
+
+async def _streamed_page(head: str, list_id: int, tail: str) -> AsyncIterator[str]:
+    yield head
+    async for rows in _stream_rows(list_id):
+        yield rows
+    yield tail
+
+
+async def view_list(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    try:
+        our_list: List = await List.objects.defer("snapshot").aget(id=list_id)
+    except List.DoesNotExist:
+        raise Http404("No such list")
+    etag, last_modified = _validators(our_list)
+    not_modified: HttpResponseBase | None = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    return _with_validators(await _list_page(request, our_list), etag, last_modified)
+
+
+async def _list_page(request: HttpRequest, our_list: List) -> HttpResponseBase:
+    if "stream" in request.GET:
+        head, tail = _stream_frame(request, our_list)
+        return StreamingHttpResponse(_streamed_page(head, our_list.id, tail))
+
+    items = Item.objects.filter(list_id=our_list.id).order_by("id")
+    if _is_paginated(request):
+        try:
+            after, limit = _page_bounds(request, our_list)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        offset: int = await items.filter(id__lte=after).acount() if after else 0
+        shown: list[Item] = [item async for item in items.filter(id__gt=after)[:limit + 1]]
+        return await _arender(request, "list.html", _page_context(our_list, shown, offset, limit))
+
+    rows: str | None = await cache.aget_rows(our_list.id, our_list.revision)
+    if rows is None:
+        texts: list[str] | None = None
+        if our_list.snapshot_is_current:
+            texts = await List.objects.asnapshot_texts(our_list.id, our_list.revision)
+        if texts is not None:
+            rows = _format_rows(texts, 0)
+        else:
+            # Fetched up front, as the template can't run queries from async code
+            rows = await sync_to_async(render_to_string)(
+                "list_rows.html", {"items": [item async for item in items], "offset": 0})
+        await cache.aset_rows(our_list.id, our_list.revision, rows)
+    return await _arender(request, "list.html", {"list": our_list, "rows": mark_safe(rows)})
+
+
+async def _stream_item_json(list_id: int, fields: list[str]) -> AsyncIterator[str]:
+    # Keyset chunks rather than aiterator(), which runs an unflattened values_list
+    # query on the event loop's thread and fails
+    after: int = 0
+    while rows := [row async for row in _item_rows(list_id, fields).filter(id__gt=after)[:STREAM_CHUNK_SIZE]]:
+        yield _ndjson_lines(rows, fields)
+        after = rows[-1][0]
+
+
+async def list_items_json(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    try:
+        our_list: List = await List.objects.defer("snapshot").aget(id=list_id)
+    except List.DoesNotExist:
+        raise Http404("No such list")
+    etag, last_modified = _validators(our_list)
+    not_modified: HttpResponseBase | None = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    try:
+        fields: list[str] = _item_fields(request)
+        after, limit = _page_bounds(request, our_list)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    if "stream" in request.GET:
+        response: HttpResponseBase = StreamingHttpResponse(
+            _stream_item_json(our_list.id, fields), content_type="application/x-ndjson")
+    else:
+        rows: list[tuple[Any, ...]] = [
+            row async for row in _item_rows(our_list.id, fields).filter(id__gt=after)[:limit + 1]]
+        response = _items_page(our_list, rows, fields, limit)
+    return _with_validators(response, etag, last_modified)
+
+
+async def search_items(request: HttpRequest) -> HttpResponse:
+    try:
+        text, list_id, offset, limit = _search_params(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    # Raw queries have no async iteration, so the search runs in a worker thread
+    return _search_page(text, await Item.objects.asearch(text, list_id, limit + 1, offset), offset, limit)
+
+
+async def export_lists(request: HttpRequest) -> HttpResponseBase:
+    try:
+        format: str = _export_format(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return _export_response(transfer.aexport_chunks(None, format), format, "lists")
+
+
+async def export_list(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    if not await List.objects.filter(id=list_id).aexists():
+        raise Http404("No such list")
+    try:
+        format: str = _export_format(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return _export_response(transfer.aexport_chunks(list_id, format), format, f"list-{list_id}")
+
+
+async def import_lists(request: HttpRequest) -> HttpResponse:
+    try:
+        source, format, name = _import_source(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    try:
+        checkpoint: ImportCheckpoint = await transfer.aimport_lists(source, format, name)
+    except ValueError as error:
+        return HttpResponseBadRequest(f"Import {name} stopped: {error}")
+    return _import_result(checkpoint, await checkpoint.importedlist_set.acount())
+
+
+async def add_item(request: HttpRequest, list_id: int) -> HttpResponse:
+    try:
+        if not await write_queue.aadd(list_id, request.POST["item_text"]):
+            raise Http404("No such list")
+    except write_queue.StillQueued as error:
+        return _still_queued(list_id, error)
+    return redirect(f"/lists/{list_id}/")
+
+
+async def add_items(request: HttpRequest, list_id: int) -> HttpResponse:
+    try:
+        await Item.objects.abulk_add(list_id, _bulk_item_texts(request))
+    except List.DoesNotExist:
+        raise Http404("No such list")
+    except (ValueError, UnicodeDecodeError) as error:
+        return HttpResponseBadRequest(str(error))
+    return redirect(f"/lists/{list_id}/")
@@ -0,0 +1,54 @@
+"""Per-list cache of the rendered id_list_table rows.
+
+Fragments are keyed by list id and List.revision, which every write bumps in
+the same transaction, so a write makes the old fragment unreachable instead of
+deleting it. The backend is the "lists" entry in CACHES, which bounds its size
+with MAX_ENTRIES.
+"""
+from threading import Lock
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+_stats_lock = Lock()
+_stats: dict[str, int] = {"hits": 0, "misses": 0}
+
+
+def _cache() -> BaseCache:
+    return caches[settings.LISTS_CACHE_ALIAS]
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_rows(list_id: int, revision: int) -> str | None:
+    rows: str | None = _cache().get(f"list-rows:{list_id}:{revision}")
+    _count("misses" if rows is None else "hits")
+    return rows
+
+
+def set_rows(list_id: int, revision: int, rows: str) -> None:
+    _cache().set(f"list-rows:{list_id}:{revision}", rows, timeout=None)
+
+
+async def aget_rows(list_id: int, revision: int) -> str | None:
+    # The backend's own async methods, which run blocking ones, such as the
+    # file-based cache's, in a worker thread
+    rows: str | None = await _cache().aget(f"list-rows:{list_id}:{revision}")
+    _count("misses" if rows is None else "hits")
+    return rows
+
+
+async def aset_rows(list_id: int, revision: int, rows: str) -> None:
+    await _cache().aset(f"list-rows:{list_id}:{revision}", rows, timeout=None)
+
+
+def stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
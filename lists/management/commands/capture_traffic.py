@@ -0,0 +1,20 @@
+from pathlib import Path
+from typing import Any
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandParser
+
+
+class Command(BaseCommand):
+    help = ("Runs the development server with TrafficCaptureMiddleware appending every request to a "
+            "capture file for replay_traffic. Elsewhere, set TRAFFIC_CAPTURE_FILE in the settings instead")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("output", type=Path, help="JSONL file to append the captured requests to")
+        parser.add_argument("addrport", nargs="?", default="", help="Address and port for runserver")
+
+    def handle(self, *args: Any, output: Path, addrport: str, **options: Any) -> None:
+        settings.TRAFFIC_CAPTURE_FILE = output
+        self.stdout.write(f"Capturing requests to {output}")
+        # The autoreloader would serve from a child process that rereads the settings
+        call_command("runserver", addrport, use_reloader=False)
@@ -0,0 +1,21 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from lists.query_plans import SCANNED_TABLE, QueryPlan, view_query_plans
+
+
+class Command(BaseCommand):
+    help = f"Prints the query plan of every statement the lists views run and fails on a full scan of {SCANNED_TABLE}"
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        plans: list[QueryPlan] = view_query_plans()
+        for plan in plans:
+            self.stdout.write(f"[{plan.view}] {plan.sql[:120]}")
+            for step in plan.plan:
+                style = self.style.ERROR if plan.scans_items else self.style.SUCCESS
+                self.stdout.write(style(f"    {step}"))
+
+        scans: list[QueryPlan] = [plan for plan in plans if plan.scans_items]
+        if scans:
+            raise CommandError(f"{len(scans)} queries scan the whole {SCANNED_TABLE} table: "
+                               + ", ".join(sorted({plan.view for plan in scans})))
+        self.stdout.write(self.style.SUCCESS(f"{len(plans)} queries checked, none scan {SCANNED_TABLE}"))
@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from lists.middleware import merge_stats
+
+
+def _percentile_ms(bounds_ms: list[float], buckets: list[int], fraction: float) -> str:
+    """The upper bound of the bucket holding the given fraction of requests"""
+    wanted: float = fraction * sum(buckets)
+    seen: int = 0
+    for bound, count in zip(bounds_ms + [float("inf")], buckets):
+        seen += count
+        if seen >= wanted:
+            return f"<={bound:g}" if bound != float("inf") else f">{bounds_ms[-1]:g}"
+    return "-"
+
+
+class Command(BaseCommand):
+    help = "Merges the request latency histograms written by PerformanceMiddleware and prints them per URL name"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Print the merged histograms as JSON")
+        parser.add_argument("--reset", action="store_true", help="Delete the histogram files after reading them")
+
+    def handle(self, *args: Any, as_json: bool, reset: bool, **options: Any) -> None:
+        files: list[Path] = sorted(Path(settings.PERF_STATS_DIR).glob("perf-*.json"))
+        bounds_ms: list[float] = []
+        merged: dict[str, dict[str, Any]] = {}
+        for path in files:
+            stats: dict[str, Any] = json.loads(path.read_text())
+            bounds_ms = stats["bounds_ms"]
+            merge_stats(merged, stats["urls"])
+            if reset:
+                path.unlink()
+
+        if as_json:
+            self.stdout.write(json.dumps({"bounds_ms": bounds_ms, "urls": merged}, indent=2))
+            return
+        self.stdout.write(f"{'url name':<20}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for url_name, url_stats in sorted(merged.items()):
+            self.stdout.write(
+                f"{url_name:<20}{url_stats['count']:>8}{url_stats['total_ms'] / url_stats['count']:>10.2f}"
+                + "".join(f"{_percentile_ms(bounds_ms, url_stats['buckets'], fraction):>10}"
+                          for fraction in (0.5, 0.95, 0.99)))
@@ -0,0 +1,37 @@
+import time
+from pathlib import Path
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from lists import transfer
+from lists.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = ("Loads a CSV or NDJSON export into new lists in batched transactions. Run it again "
+            "with the same file after a failure to resume after the last committed batch")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("input", type=Path)
+        parser.add_argument("--format", choices=list(transfer.FORMATS), help="Defaults to the input's extension")
+        parser.add_argument("--name", help="Names the import's checkpoint, by default the input's absolute path")
+        parser.add_argument("--batch-size", type=int, default=transfer.IMPORT_BATCH_SIZE,
+                            help="Rows loaded per transaction")
+
+    def handle(self, *args: Any, input: Path, format: str | None, name: str | None, batch_size: int,
+               **options: Any) -> None:
+        name = name or str(input.resolve())
+        started_at: int = ImportCheckpoint.objects.filter(name=name).values_list("rows", flat=True).first() or 0
+        start: float = time.perf_counter()
+        try:
+            format = format or transfer.format_of(input.name)
+            with input.open("rb") as source:
+                checkpoint: ImportCheckpoint = transfer.import_lists(source, format, name, batch_size)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Import {name} stopped: {error}") from None
+
+        elapsed: float = time.perf_counter() - start
+        loaded: int = checkpoint.rows - started_at
+        resumed: str = f", resuming after row {started_at}" if started_at else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {loaded} rows into {checkpoint.importedlist_set.count()} lists in {elapsed:.1f}s "
+            f"({loaded / elapsed:.0f} rows/s){resumed}, {transfer.peak_rss_report()}"))
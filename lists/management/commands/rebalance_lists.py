@@ -0,0 +1,172 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from lists import sharding
+from lists.models import BULK_BATCH_SIZE, Item, List, ListPlacement
+
+LIST_FIELDS: list[str] = [field.attname for field in List._meta.concrete_fields]
+
+
+class Command(BaseCommand):
+    help = ("Moves lists between the shards of LIST_SHARDS, while they are in use, until each holds about as many "
+            "items. First puts lists missing from the directory of placements in it, and removes copies left on "
+            "the wrong shard by an interrupted move. Moved items get new ids on their new shard, in the same "
+            "order, and their list a new revision. Run one at a time")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--move", nargs=2, action="append", metavar=("LIST", "SHARD"), default=[],
+                            help="Move this list to this shard instead of planning moves; may be repeated")
+        parser.add_argument("--dry-run", action="store_true", help="Only report the moves that would be made")
+        parser.add_argument("--max-moves", type=int, default=100)
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Items copied per transaction before the final one of each move")
+
+    def handle(self, *args: Any, move: list[list[str]], dry_run: bool, max_moves: int, chunk_size: int,
+               **options: Any) -> None:
+        all_shards: list[str] = sharding.shards()
+        moves: list[tuple[int, str]] = []
+        for list_id, shard in move:
+            if shard not in all_shards:
+                raise CommandError(f"{shard} is not one of LIST_SHARDS: {', '.join(all_shards)}")
+            try:
+                moves.append((int(list_id), shard))
+            except ValueError:
+                raise CommandError(f"{list_id} is not a list id") from None
+
+        if not dry_run:
+            for shard in all_shards:
+                placed, removed = self.backfill(shard, chunk_size)
+                if placed or removed:
+                    self.stdout.write(f"{shard}: placed {placed} lists, removed {removed} left over from moves")
+        moves = moves or self.plan(all_shards, max_moves)
+
+        moved: int = 0
+        for list_id, target in moves:
+            source: str = ListPlacement.objects.shard_for(list_id, refresh=True)
+            if source == target:
+                continue
+            if _being_imported(list_id, source):
+                raise CommandError(f"List {list_id} is still being imported into, so can't be moved yet")
+            if dry_run:
+                self.stdout.write(f"Would move list {list_id} from {source} to {target}")
+                continue
+            items: int | None = self.move(list_id, source, target, chunk_size)
+            if items is None:
+                self.stdout.write(f"List {list_id} is not on {source}, skipped")
+                continue
+            moved += 1
+            self.stdout.write(f"Moved list {list_id} ({items} items) from {source} to {target}")
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Moved {moved} lists"))
+
+    def backfill(self, shard: str, chunk_size: int) -> tuple[int, int]:
+        """Puts the lists of a shard missing from the directory on it, and deletes those
+        the directory has on another shard, returning how many of each"""
+        placed: int = 0
+        removed: int = 0
+        last_id: int = 0
+        while ids := list(List.objects.using(shard).filter(id__gt=last_id).order_by("id")
+                          .values_list("id", flat=True)[:chunk_size]):
+            last_id = ids[-1]
+            placements: dict[int, str] = dict(ListPlacement.objects.filter(id__in=ids).values_list("id", "shard"))
+            missing: list[int] = [list_id for list_id in ids if list_id not in placements]
+            # Conflicts are lists created meanwhile, which are placed as they are created
+            ListPlacement.objects.bulk_create([ListPlacement(id=list_id, shard=shard) for list_id in missing],
+                                              batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+            placed += len(missing)
+            elsewhere: list[int] = [list_id for list_id, placement in placements.items() if placement != shard]
+            if elsewhere:
+                with sharding.routed_to(shard), transaction.atomic(using=shard):
+                    List.objects.filter(id__in=elsewhere).delete()
+                removed += len(elsewhere)
+        return placed, removed
+
+    def plan(self, all_shards: list[str], max_moves: int) -> list[tuple[int, str]]:
+        """Moves that even out the items on each shard: the biggest list on the fullest
+        shard that is no more than half its lead over the emptiest, until none is"""
+        loads: dict[str, int] = {
+            shard: List.objects.using(shard).aggregate(items=Sum("item_count"))["items"] or 0 for shard in all_shards}
+        moves: list[tuple[int, str]] = []
+        planned: set[int] = set()
+        while len(moves) < max_moves:
+            fullest: str = max(all_shards, key=loads.__getitem__)
+            emptiest: str = min(all_shards, key=loads.__getitem__)
+            candidate: tuple[int, int] | None = (
+                List.objects.using(fullest)
+                .filter(item_count__gt=0, item_count__lte=(loads[fullest] - loads[emptiest]) // 2)
+                .exclude(id__in=planned).exclude(importedlist__checkpoint__finished=False)
+                .order_by("-item_count").values_list("id", "item_count").first())
+            if candidate is None:
+                break
+            list_id, items = candidate
+            moves.append((list_id, emptiest))
+            planned.add(list_id)
+            loads[fullest] -= items
+            loads[emptiest] += items
+        return moves
+
+    def move(self, list_id: int, source: str, target: str, chunk_size: int) -> int | None:
+        """Copies a list and its items to target while it is written to on source, then
+        swaps it over. Only the final chunk of items is copied holding source's write
+        lock, which also covers updating the directory and deleting the list from
+        source. Returns how many items were moved, or None when the list is not on source"""
+        with sharding.routed_to(target), transaction.atomic(using=target):
+            # A copy left by an interrupted move
+            List.objects.filter(id=list_id).delete()
+            row: dict[str, Any] | None = List.objects.using(source).filter(id=list_id).values(*LIST_FIELDS).first()
+            if row is None:
+                return None
+            List.objects.bulk_create([List(**row)])
+
+        copied: int = 0
+        last_id: int = 0
+        while True:
+            with transaction.atomic(using=target):
+                chunk_copied, last_id = _copy_items(list_id, source, target, last_id, chunk_size)
+            copied += chunk_copied
+            if chunk_copied < chunk_size:
+                break
+
+        # Taking source's write lock first holds up writers to the list until it is gone from source
+        with transaction.atomic(using=source):
+            with transaction.atomic(using=target):
+                row = List.objects.using(source).filter(id=list_id).values(*LIST_FIELDS).first()
+                if row is None:
+                    List.objects.using(target).filter(id=list_id).delete()
+                    return None
+                while True:
+                    chunk_copied, last_id = _copy_items(list_id, source, target, last_id, chunk_size)
+                    copied += chunk_copied
+                    if chunk_copied < chunk_size:
+                        break
+                # The list as it is now, as writes since the first copy changed its counters and
+                # snapshot, moved on to a new revision: its items have new ids, so ETags, cached
+                # rows and page cursors of the old revision mustn't pass for the new one
+                revision: int = row["revision"] + 1
+                if row["snapshot_revision"] == row["revision"]:
+                    row["snapshot_revision"] = revision
+                row.update(revision=revision, moved_revision=revision, updated_at=timezone.now())
+                List.objects.using(target).filter(id=list_id).update(
+                    **{field: value for field, value in row.items() if field != "id"})
+            ListPlacement.objects.filter(id=list_id).update(shard=target)
+            with sharding.routed_to(source):
+                List.objects.filter(id=list_id).delete()
+        sharding.remember_placement(list_id, target)
+        return copied
+
+
+def _copy_items(list_id: int, source: str, target: str, after: int, count: int) -> tuple[int, int]:
+    """Copies up to count items of a list with ids after after from source to target, in
+    id order, returning how many were copied and the source id of the last"""
+    rows: list[tuple[int, str]] = list(Item.objects.using(source).filter(list_id=list_id, id__gt=after)
+                                       .order_by("id").values_list("id", "text")[:count])
+    Item.objects.using(target).bulk_create([Item(text=text, list_id=list_id) for _, text in rows],
+                                           batch_size=BULK_BATCH_SIZE)
+    return len(rows), rows[-1][0] if rows else after
+
+
+def _being_imported(list_id: int, shard: str) -> bool:
+    # Its import records stay on the shard, so a resumed import would start it over
+    return List.objects.using(shard).filter(id=list_id, importedlist__checkpoint__finished=False).exists()
@@ -0,0 +1,62 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, PositiveBigIntegerField, Subquery, When
+from django.db.models.functions import Coalesce
+from lists import sharding
+from lists.models import Item, List
+
+
+class Command(BaseCommand):
+    help = "Recounts List.item_count from the Item table, a chunk of lists at a time on each shard"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--verify", action="store_true",
+                            help="Only report lists whose item_count is wrong, failing if there are any")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args: Any, verify: bool, chunk_size: int, **options: Any) -> None:
+        checked: int = 0
+        wrong: int = 0
+        for shard in sharding.shards():
+            with sharding.routed_to(shard):
+                shard_checked, shard_wrong = self.recount(shard, verify, chunk_size)
+            checked += shard_checked
+            wrong += shard_wrong
+
+        if verify and wrong:
+            raise CommandError(f"{wrong} of {checked} lists have a wrong item_count")
+        action: str = "found" if verify else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} lists, {action} {wrong} wrong item counts"))
+
+    def recount(self, shard: str, verify: bool, chunk_size: int) -> tuple[int, int]:
+        """Checks, and unless verifying fixes, the lists of one shard, returning how
+        many were checked and how many were wrong"""
+        actual_count = Coalesce(Subquery(
+            Item.objects.filter(list_id=OuterRef("id")).order_by().values("list_id")
+            .annotate(count=Count("id")).values("count")), 0)
+        checked: int = 0
+        wrong: int = 0
+        last_id: int = 0
+
+        while ids := list(List.objects.filter(id__gt=last_id).order_by("id")
+                          .values_list("id", flat=True)[:chunk_size]):
+            last_id = ids[-1]
+            checked += len(ids)
+            mismatched: list[tuple[int, int, int]] = list(
+                List.objects.filter(id__gte=ids[0], id__lte=last_id)
+                .annotate(actual=actual_count).exclude(item_count=F("actual"))
+                .values_list("id", "item_count", "actual"))
+            wrong += len(mismatched)
+            for list_id, stored, actual in mismatched:
+                self.stdout.write(f"List {list_id}: item_count is {stored}, {actual} items found")
+            if mismatched and not verify:
+                # Recounted inside the UPDATE itself, so writes since the check are included
+                with transaction.atomic(using=shard):
+                    # The items are untouched, so current snapshots stay current
+                    List.objects.filter(id__in=[row[0] for row in mismatched]).update(
+                        item_count=actual_count, revision=F("revision") + 1,
+                        snapshot_revision=Case(When(snapshot_revision=F("revision"), then=F("revision") + 1),
+                                               default=F("snapshot_revision"),
+                                               output_field=PositiveBigIntegerField()))
+        return checked, wrong
@@ -0,0 +1,78 @@
+import json
+from collections import defaultdict
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from lists import sharding
+from lists.models import SNAPSHOT_MAX_ITEMS, Item, List
+
+
+class Command(BaseCommand):
+    help = ("Rewrites List.snapshot from the Item table for lists without a current snapshot, "
+            "or whose snapshot disagrees with their items, a chunk of lists at a time on each shard. "
+            "Lists with more than SNAPSHOT_MAX_ITEMS items are left without one")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--verify", action="store_true",
+                            help="Only report lists whose current snapshot disagrees with their items, "
+                                 "failing if there are any")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args: Any, verify: bool, chunk_size: int, **options: Any) -> None:
+        checked: int = 0
+        stale: int = 0
+        wrong: int = 0
+        for shard in sharding.shards():
+            with sharding.routed_to(shard):
+                shard_checked, shard_stale, shard_wrong = self.rebuild(shard, verify, chunk_size)
+            checked += shard_checked
+            stale += shard_stale
+            wrong += shard_wrong
+
+        if verify:
+            if wrong:
+                raise CommandError(f"{wrong} of {checked} lists have a snapshot that disagrees with their items")
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {checked} lists, {stale} without a current snapshot, found no wrong snapshots"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} lists, rebuilt {stale} missing or stale and {wrong} wrong snapshots"))
+
+    def rebuild(self, shard: str, verify: bool, chunk_size: int) -> tuple[int, int, int]:
+        """Checks, and unless verifying rebuilds, the snapshots of one shard, returning
+        how many lists were checked, had no current snapshot and had a wrong one"""
+        checked: int = 0
+        stale: int = 0
+        wrong: int = 0
+        last_id: int = 0
+
+        while True:
+            texts: defaultdict[int, list[str]] = defaultdict(list)
+            # One transaction, so no write lands between reading the snapshots and the items
+            with transaction.atomic(using=shard):
+                chunk: list[tuple[int, int, int, int | None, str]] = list(
+                    List.objects.filter(id__gt=last_id).order_by("id")
+                    .values_list("id", "item_count", "revision", "snapshot_revision", "snapshot")[:chunk_size])
+                if not chunk:
+                    break
+                last_id = chunk[-1][0]
+                for list_id, text in (Item.objects.filter(list_id__gte=chunk[0][0], list_id__lte=last_id)
+                                      .order_by("list_id", "id").values_list("list_id", "text")):
+                    texts[list_id].append(text)
+            checked += len(chunk)
+
+            rebuild: list[int] = []
+            for list_id, item_count, revision, snapshot_revision, snapshot in chunk:
+                if snapshot_revision != revision:
+                    if item_count > SNAPSHOT_MAX_ITEMS:
+                        continue
+                    stale += 1
+                    rebuild.append(list_id)
+                elif json.loads(snapshot) != texts[list_id]:
+                    wrong += 1
+                    rebuild.append(list_id)
+                    self.stdout.write(f"List {list_id}: snapshot disagrees with its {len(texts[list_id])} items")
+            if not verify:
+                for list_id in rebuild:
+                    List.objects.rebuild_snapshot(list_id)
+        return checked, stale, wrong
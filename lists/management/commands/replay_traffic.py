@@ -0,0 +1,151 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.urls import Resolver404, resolve, reverse
+from django.utils.crypto import get_random_string
+
+# POSTs whose bodies can be rebuilt from a capture record; other POSTs are skipped
+REPLAYED_POSTS: set[str] = {"new_list", "add_item"}
+
+
+def load_capture(paths: list[Path]) -> list[dict[str, Any]]:
+    """The captured requests of one or more capture files, in the order they started"""
+    records: list[dict[str, Any]] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as capture:
+            records += [json.loads(line) for line in capture if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+class ListIdMap:
+    """Maps the ids of lists created during the capture to the ids of the lists
+    new_list creates in their place during the replay. Lists that already existed
+    when the capture started keep their ids"""
+
+    def __init__(self, records: list[dict[str, Any]], timeout: float) -> None:
+        self.timeout: float = timeout
+        self.created: dict[int, threading.Event] = {
+            record["created"]: threading.Event() for record in records if record.get("created")}
+        self.ids: dict[int, int] = {}
+
+    def get(self, list_id: int) -> int:
+        """The id to use for a captured list id, waiting for the replayed new_list that creates it"""
+        event: threading.Event | None = self.created.get(list_id)
+        if event is None:
+            return list_id
+        event.wait(self.timeout)
+        return self.ids.get(list_id, list_id)
+
+    def set(self, captured_id: int, replayed_id: int | None) -> None:
+        if replayed_id is not None:
+            self.ids[captured_id] = replayed_id
+        self.created[captured_id].set()
+
+
+class Replayer:
+    def __init__(self, target: str, list_ids: ListIdMap) -> None:
+        parts = urlsplit(target)
+        if parts.scheme != "http" or not parts.hostname:
+            raise CommandError(f"Expected an http:// target, got {target!r}")
+        self.host: str = parts.hostname
+        self.port: int = parts.port or 80
+        self.list_ids: ListIdMap = list_ids
+        # A bare CSRF secret is accepted as both the cookie and the header token
+        token: str = get_random_string(CSRF_SECRET_LENGTH, CSRF_ALLOWED_CHARS)
+        self.headers: dict[str, str] = {"Cookie": f"csrftoken={token}", "X-CSRFToken": token}
+
+    def path(self, record: dict[str, Any]) -> str:
+        path: str = record["path"]
+        if record.get("list") is not None:
+            path = reverse(record["url"], kwargs={"list_id": self.list_ids.get(record["list"])})
+        return f"{path}?{record['query']}" if record.get("query") else path
+
+    def send(self, record: dict[str, Any]) -> tuple[int, float]:
+        """Replays one captured request, returning its status (0 when the request
+        failed outright) and latency in milliseconds"""
+        status: int = 0
+        replayed_id: int | None = None
+        start: float = time.perf_counter()
+        try:
+            body: bytes | None = None
+            headers: dict[str, str] = dict(self.headers)
+            if record["method"] == "POST":
+                body = urlencode({"item_text": "x" * record.get("text_bytes", 0)}).encode()
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                connection.request(record["method"], self.path(record), body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if record.get("created") and status == 302:
+                    replayed_id = resolve(urlsplit(response.getheader("Location", "")).path).kwargs.get("list_id")
+            finally:
+                connection.close()
+        except (OSError, http.client.HTTPException, Resolver404):
+            pass
+        finally:
+            # Requests waiting on this list must never wait for nothing
+            if record.get("created"):
+                self.list_ids.set(record["created"], replayed_id)
+        return status, (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = ("Replays requests recorded by TrafficCaptureMiddleware against a running instance, at the "
+            "original pacing or as fast as the workers allow")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("captures", nargs="+", type=Path, help="Capture files, merged in start order")
+        parser.add_argument("--target", default="http://127.0.0.1:8000")
+        parser.add_argument("--pace", choices=["original", "fast"], default="original")
+        parser.add_argument("--speed", type=float, default=1.0,
+                            help="Playback speed for --pace original, e.g. 2 halves every gap")
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--wait", type=float, default=30.0,
+                            help="Seconds to wait for the list a request needs to be created")
+
+    def handle(self, *args: Any, captures: list[Path], target: str, pace: str, speed: float, workers: int,
+               wait: float, **options: Any) -> None:
+        records: list[dict[str, Any]] = load_capture(captures)
+        replayed: list[dict[str, Any]] = [
+            record for record in records if record["method"] != "POST" or record.get("url") in REPLAYED_POSTS]
+        if not replayed:
+            raise CommandError("Nothing to replay")
+        replayer = Replayer(target, ListIdMap(replayed, wait))
+
+        first: float = replayed[0]["ts"]
+        start: float = time.perf_counter()
+        # The pool hands out work in submission order, so a new_list is always running
+        # or done before a later request on its list starts waiting for it
+        with ThreadPoolExecutor(workers) as pool:
+            futures: list[Future[tuple[int, float]]] = []
+            for record in replayed:
+                if pace == "original":
+                    delay: float = (record["ts"] - first) / speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(replayer.send, record))
+            results: list[tuple[int, float]] = [future.result() for future in futures]
+        elapsed: float = time.perf_counter() - start
+
+        by_url: dict[str, list[tuple[int, float]]] = {}
+        for record, result in zip(replayed, results):
+            by_url.setdefault(record.get("url") or "unresolved", []).append(result)
+        self.stdout.write(f"{'url name':<20}{'count':>8}{'failed':>8}{'mean ms':>10}{'p95 ms':>10}")
+        for url_name, url_results in sorted(by_url.items()):
+            latencies: list[float] = sorted(ms for _, ms in url_results)
+            failed: int = sum(1 for status, _ in url_results if not 0 < status < 400)
+            self.stdout.write(
+                f"{url_name:<20}{len(url_results):>8}{failed:>8}{sum(latencies) / len(latencies):>10.2f}"
+                f"{latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]:>10.2f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {len(replayed)} requests ({len(records) - len(replayed)} skipped) in {elapsed:.1f}s, "
+            f"{len(replayed) / elapsed:.0f} req/s, {len(replayer.list_ids.ids)} lists remapped"))
@@ -0,0 +1,51 @@
+import random
+import time
+from collections import Counter
+from typing import Any
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from lists.models import BULK_BATCH_SIZE, Item, List
+
+
+class Command(BaseCommand):
+    help = "Fills the database with generated lists and items, e.g. for query plan checks and benchmarks"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--lists", type=int, default=10_000)
+        parser.add_argument("--items", type=int, default=1_000_000)
+        parser.add_argument("--skewed", action="store_true",
+                            help="Give a few lists most of the items instead of spreading them evenly")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=50_000,
+                            help="Items inserted per transaction")
+        parser.add_argument("--snapshots", action="store_true",
+                            help="Also build each list's snapshot, as lists written through the views have one")
+
+    def handle(self, *args: Any, lists: int, items: int, skewed: bool, seed: int, chunk_size: int,
+               snapshots: bool, **options: Any) -> None:
+        start: float = time.perf_counter()
+        generator = random.Random(seed)
+        # Items are spread over the lists in random order, as if they had been added
+        # over time, so each list's rows are interleaved with everyone else's
+        weights: list[float] | None = [1 / rank for rank in range(1, lists + 1)] if skewed else None
+        owners: list[int] = generator.choices(range(lists), weights=weights, k=items)
+        counts: Counter[int] = Counter(owners)
+
+        with transaction.atomic():
+            new_lists: list[List] = List.objects.bulk_create(
+                [List(item_count=counts[n], revision=1) for n in range(lists)], batch_size=BULK_BATCH_SIZE)
+        list_ids: list[int] = [new_list.id for new_list in new_lists]
+
+        for chunk_start in range(0, items, chunk_size):
+            with transaction.atomic():
+                Item.objects.bulk_create(
+                    [Item(text=f"Seeded item {n}", list_id=list_ids[owners[n]])
+                     for n in range(chunk_start, min(chunk_start + chunk_size, items))],
+                    batch_size=BULK_BATCH_SIZE)
+            self.stdout.write(f"{min(chunk_start + chunk_size, items)} / {items} items")
+        if snapshots:
+            call_command("rebuild_list_snapshots", stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {lists} lists and {items} items in {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,377 @@
+import atexit
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections.abc import AsyncIterator, Callable
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from typing import Any
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.template import base
+from django.urls import resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+from lists import sharding
+from lists.models import ListPlacement
+
+logger = logging.getLogger("lists.performance")
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; the last is unbounded
+HISTOGRAM_BOUNDS_MS: list[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_current: ContextVar["RequestTimings | None"] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.queries: int = 0
+        self.query_seconds: float = 0.0
+        self.template_seconds: dict[str, float] = {}
+
+    def time_query(self, seconds: float) -> None:
+        self.queries += 1
+        self.query_seconds += seconds
+
+    def time_template(self, name: str, seconds: float) -> None:
+        self.template_seconds[name] = self.template_seconds.get(name, 0.0) + seconds
+
+
+def _timed_execute(execute: Callable[..., Any], sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+    timings: RequestTimings | None = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.time_query(time.perf_counter() - start)
+
+
+def _add_query_timer(connection: Any, **kwargs: Any) -> None:
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+def _install_query_timer() -> None:
+    """Leaves an execute wrapper on each database connection, rather than entering
+    one on every connection for every request: on those open in this thread now,
+    and on every one opened from here on. Outside a timed request it only pays for
+    a context variable lookup per query"""
+    for connection in connections.all(initialized_only=True):
+        _add_query_timer(connection)
+    connection_created.connect(_add_query_timer, dispatch_uid="lists.middleware.query_timer")
+
+
+def _install_template_timer() -> None:
+    """Wraps Template.render, once per process, to time templates rendered during a
+    timed request. Outside one it only pays for a context variable lookup"""
+    if getattr(base.Template.render, "timed", False):
+        return
+    render: Callable[..., Any] = base.Template.render
+
+    def timed_render(template: base.Template, context: Any) -> Any:
+        timings: RequestTimings | None = _current.get()
+        if timings is None:
+            return render(template, context)
+        start: float = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            timings.time_template(template.name or "<string>", time.perf_counter() - start)
+
+    timed_render.timed = True  # type: ignore[attr-defined]
+    base.Template.render = timed_render  # type: ignore[method-assign]
+
+
+def _empty_stats(buckets: int) -> dict[str, Any]:
+    return {"count": 0, "total_ms": 0.0, "buckets": [0] * buckets}
+
+
+def merge_stats(into: dict[str, dict[str, Any]], urls: dict[str, dict[str, Any]]) -> None:
+    """Adds the per URL name histograms in urls to those in into"""
+    for url_name, url_stats in urls.items():
+        merged: dict[str, Any] = into.setdefault(url_name, _empty_stats(len(url_stats["buckets"])))
+        merged["count"] += url_stats["count"]
+        merged["total_ms"] += url_stats["total_ms"]
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], url_stats["buckets"])]
+
+
+class Histograms:
+    """Per URL name latency histograms of one process. A flush adds what was
+    recorded since the last one to the process's file, which the dump_perf_stats
+    command merges, so a file it deletes starts again from zero"""
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.pid: int = os.getpid()
+        self.lock = Lock()
+        self.unflushed: int = 0
+        self.stats: dict[str, dict[str, Any]] = {}
+
+    def record(self, url_name: str, milliseconds: float) -> None:
+        with self.lock:
+            stats: dict[str, Any] = self.stats.setdefault(
+                url_name, _empty_stats(len(HISTOGRAM_BOUNDS_MS) + 1))
+            stats["count"] += 1
+            stats["total_ms"] += milliseconds
+            stats["buckets"][bisect_left(HISTOGRAM_BOUNDS_MS, milliseconds)] += 1
+            self.unflushed += 1
+            if self.unflushed >= settings.PERF_FLUSH_EVERY:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        # A child forked with unflushed stats leaves them to its parent
+        if not self.unflushed or os.getpid() != self.pid:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        urls: dict[str, dict[str, Any]] = {}
+        try:
+            urls = json.loads(self.path.read_text())["urls"]
+        except FileNotFoundError:
+            pass
+        merge_stats(urls, self.stats)
+        # Replaced whole, so dump_perf_stats never reads half a file
+        written: Path = self.path.with_suffix(".tmp")
+        written.write_text(json.dumps({"bounds_ms": HISTOGRAM_BOUNDS_MS, "urls": urls}))
+        os.replace(written, self.path)
+        self.stats = {}
+        self.unflushed = 0
+
+
+_histograms: dict[tuple[Path, int], Histograms] = {}
+
+
+def _histograms_for(stats_dir: Path) -> Histograms:
+    """The histograms of this process, flushed to their own file when it exits.
+    Looked up by pid, so workers forked after the middleware loaded each get one"""
+    key: tuple[Path, int] = (stats_dir, os.getpid())
+    if key not in _histograms:
+        _histograms[key] = Histograms(stats_dir / f"perf-{key[1]}.json")
+        atexit.register(_histograms[key].flush)
+    return _histograms[key]
+
+
+class CaptureLog:
+    """Appends one compact JSON line per request to a capture file, shared by
+    every thread of the process"""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = Lock()
+        # Line buffered, so each record reaches the file whole when it is written
+        self.file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, record: dict[str, Any]) -> None:
+        line: str = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+
+_capture_logs: dict[Path, CaptureLog] = {}
+
+
+def _capture_log_for(path: Path) -> CaptureLog:
+    if path not in _capture_logs:
+        _capture_logs[path] = CaptureLog(path)
+        atexit.register(_capture_logs[path].file.close)
+    return _capture_logs[path]
+
+
+class TrafficCaptureMiddleware:
+    """Records the shape of each request for replay_traffic: when it started, the
+    URL name and list id it resolved to, the size of item_text (never the text
+    itself), the status, how long it took and, for new_list, the id of the list it
+    created, so a replay can map it to the list created in its place.
+    Without TRAFFIC_CAPTURE_FILE the middleware removes itself at startup."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponseBase]) -> None:
+        if not settings.TRAFFIC_CAPTURE_FILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log: CaptureLog = _capture_log_for(Path(settings.TRAFFIC_CAPTURE_FILE))
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        started: float = time.time()
+        start: float = time.perf_counter()
+        response: HttpResponseBase = self.get_response(request)
+        elapsed_ms: float = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        record: dict[str, Any] = {
+            "ts": round(started, 6), "method": request.method, "path": request.path,
+            "query": request.META.get("QUERY_STRING", ""), "url": match.url_name if match else None,
+            "list": match.kwargs.get("list_id") if match else None,
+            "bytes": int(request.META.get("CONTENT_LENGTH") or 0),
+            "status": response.status_code, "ms": round(elapsed_ms, 3),
+        }
+        if request.method == "POST" and "item_text" in request.POST:
+            record["text_bytes"] = len(request.POST["item_text"].encode())
+        if record["url"] == "new_list" and response.status_code == 302:
+            record["created"] = resolve(urlsplit(response.headers["Location"]).path).kwargs.get("list_id")
+        self.log.write(record)
+        return response
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values, so that
+    "gzip;q=0" refuses it and "*" accepts it unless gzip is listed"""
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        quality: float = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Gzips responses of at least COMPRESSION_MIN_SIZE bytes, and streamed ones as
+    they are sent, for clients whose Accept-Encoding allows it. gzip is the only
+    widely supported coding the standard library produces. Works as Django's
+    GZipMiddleware does, including its random header padding against BREACH (the
+    pages mix CSRF tokens with user text), but honours q-values."""
+
+    max_random_bytes = 100
+
+    def process_response(self, request: HttpRequest, response: HttpResponseBase) -> HttpResponseBase:
+        if response.has_header("Content-Encoding"):
+            return response
+        accepts_gzip: bool = _accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        etag: str | None = response.get("ETag")
+        if etag:
+            # A strong ETag can't describe compressed bytes; weak ones still match
+            # If-None-Match, which compares weakly. Every response to a client taking
+            # gzip gets the weak one, 304s and bodies left uncompressed included, so
+            # the validators it sees for a representation agree
+            patch_vary_headers(response, ("Accept-Encoding",))
+            if accepts_gzip and etag.startswith('"'):
+                response.headers["ETag"] = "W/" + etag
+        size: int | None = None if response.streaming else len(response.content)  # type: ignore[attr-defined]
+        if size is not None and size < settings.COMPRESSION_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not accepts_gzip:
+            return response
+
+        if response.streaming:
+            streamed: Any = response
+            if streamed.is_async:
+                streamed.streaming_content = _compress_chunks(streamed.streaming_content, self.max_random_bytes)
+            else:
+                # One gzip stream, flushed after every chunk
+                streamed.streaming_content = compress_sequence(
+                    streamed.streaming_content, max_random_bytes=self.max_random_bytes)
+            del response.headers["Content-Length"]
+        else:
+            compressed: bytes = compress_string(
+                response.content, max_random_bytes=self.max_random_bytes)  # type: ignore[attr-defined]
+            if len(compressed) >= size:  # type: ignore[operator]
+                return response
+            response.content = compressed  # type: ignore[attr-defined]
+            response.headers["Content-Length"] = str(len(compressed))
+
+        response.headers["Content-Encoding"] = "gzip"
+        return response
+
+
+async def _compress_chunks(chunks: AsyncIterator[bytes], max_random_bytes: int) -> AsyncIterator[bytes]:
+    """Each chunk of an async stream as its own gzip member, as GZipMiddleware does;
+    clients decode concatenated members as one stream"""
+    async for chunk in chunks:
+        yield compress_string(chunk, max_random_bytes=max_random_bytes)
+
+
+class PerformanceMiddleware:
+    """Times each request: wall time, SQL queries and the time spent in them,
+    template rendering and response size. Reports them in a Server-Timing header
+    and a JSON log line, and adds the wall time to the URL name's histogram.
+    With PERF_INSTRUMENTATION off the middleware removes itself at startup."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponseBase]) -> None:
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.stats_dir: Path = Path(settings.PERF_STATS_DIR)
+        _install_query_timer()
+        _install_template_timer()
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start: float = time.perf_counter()
+        try:
+            response: HttpResponseBase = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms: float = (time.perf_counter() - start) * 1000
+
+        url_name: str = request.resolver_match.url_name if request.resolver_match else "unresolved"
+        size: int | None = None if response.streaming else len(response.content)  # type: ignore[attr-defined]
+        metrics: list[str] = [
+            f"total;dur={total_ms:.2f}",
+            f'db;dur={timings.query_seconds * 1000:.2f};desc="{timings.queries} queries"',
+        ] + [f"tpl-{name.replace('/', '-')};dur={seconds * 1000:.2f}"
+             for name, seconds in timings.template_seconds.items()]
+        response.headers["Server-Timing"] = ", ".join(metrics)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "method": request.method, "path": request.path, "url_name": url_name,
+                "status": response.status_code, "total_ms": round(total_ms, 3), "queries": timings.queries,
+                "query_ms": round(timings.query_seconds * 1000, 3), "bytes": size,
+                "templates_ms": {name: round(seconds * 1000, 3) for name, seconds in timings.template_seconds.items()},
+            }))
+        _histograms_for(self.stats_dir).record(url_name, total_ms)
+        return response
+
+
+class ListShardMiddleware:
+    """Routes each request for a list to the shard the list is on, see
+    lists/sharding.py. A process remembers placements, which go stale when
+    rebalance_lists moves a list; the list's old shard then answers 404, and the
+    request is run again on the shard the directory has now. A 404 wrote nothing,
+    so running it again is safe. Without LIST_SHARDS naming several databases the
+    middleware removes itself at startup."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponseBase]) -> None:
+        if not sharding.is_sharded():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase:
+        # Left routed after the response, as a streamed one reads from the shard as
+        # it is sent; request_finished routes back to default, see lists.sharding
+        sharding.route_to(None)
+        response: HttpResponseBase = self.get_response(request)
+        list_id: int | None = request.resolver_match.kwargs.get("list_id") if request.resolver_match else None
+        if response.status_code == 404 and list_id is not None:
+            shard: str = ListPlacement.objects.shard_for(list_id, refresh=True)
+            if shard != sharding.current():
+                response = self.get_response(request)
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable[..., Any], view_args: tuple[Any, ...],
+                     view_kwargs: dict[str, Any]) -> None:
+        if "list_id" in view_kwargs:
+            sharding.route_to(ListPlacement.objects.shard_for(view_kwargs["list_id"]))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0004_item_list"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="list",
+            name="updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="list",
+            name="id",
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_items(apps, schema_editor):
+    List = apps.get_model("lists", "List")
+    Item = apps.get_model("lists", "Item")
+    counts = (
+        Item.objects.filter(list_id=OuterRef("id"))
+        .order_by()
+        .values("list_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    List.objects.update(item_count=Coalesce(Subquery(counts), 0), revision=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0005_list_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="list",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="list",
+            name="revision",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0006_list_item_count_revision"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="item",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["list", "id"], name="lists_item_list_id_id_idx"),
+        ),
+        migrations.AlterField(
+            model_name="item",
+            name="list",
+            field=models.ForeignKey(
+                db_index=False,
+                default=None,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="lists.list",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0007_item_list_id_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="list",
+            name="snapshot",
+            field=models.TextField(default="[]"),
+        ),
+        migrations.AddField(
+            model_name="list",
+            name="snapshot_revision",
+            field=models.PositiveBigIntegerField(default=None, null=True),
+        ),
+    ]
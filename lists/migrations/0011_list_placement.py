@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0010_import_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListPlacement",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("shard", models.CharField(max_length=64)),
+            ],
+        ),
+    ]
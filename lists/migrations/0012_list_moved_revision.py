@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("lists", "0011_list_placement"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="list",
+            name="moved_revision",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,11 +1,290 @@
-from django.db import models
+import json
+import re
+from collections.abc import Iterable
+from itertools import islice
+from typing import Any
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Case, F, Func, Value, When
+from django.utils import timezone
+from lists import sharding
+
+# Objects per bulk_create call when writing in bulk. Django already splits each to
+# fit SQLite's bound parameter limit, so this only bounds the objects held at once
+BULK_BATCH_SIZE = 400
+
+# The FTS5 index over item texts that migration 0009 creates and keeps in step
+SEARCH_TABLE = "lists_item_fts"
+SEARCH_WORD = re.compile(r"(\w+)(\*?)")
+# Texts appended to a snapshot per json_insert call, see _appended_snapshot
+SNAPSHOT_APPENDS_PER_CALL = 63
+# Lists with more items keep no snapshot. Appending rewrites the whole snapshot, so
+# this bounds the cost of each write; larger lists render from the items' index
+SNAPSHOT_MAX_ITEMS = 1000
+
+
+def dump_snapshot(texts: list[str]) -> str:
+    return json.dumps(texts, ensure_ascii=False, separators=(",", ":"))
+
+
+def search_query(text: str) -> str:
+    """text as an FTS5 query for items holding every word of it. Each word is quoted,
+    so FTS5 syntax typed into a search box is taken literally, and a word ending
+    in * matches as a prefix. Empty when text has no words"""
+    return " ".join(f'"{word}"{star}' for word, star in SEARCH_WORD.findall(text))
+
+
+def _if_snapshot_kept(added: int, then: Any, otherwise: Any,
+                      output_field: models.Field) -> Case:  # type: ignore[type-arg]
+    """then for lists whose snapshot is up to date with their revision and, with added
+    more items, stays within SNAPSHOT_MAX_ITEMS, otherwise otherwise. In an UPDATE
+    both sides see the row as it was before the update"""
+    return Case(When(snapshot_revision=F("revision"), item_count__lte=SNAPSHOT_MAX_ITEMS - added, then=then),
+                default=otherwise, output_field=output_field)
+
+
+def _appended_snapshot(texts: list[str]) -> Func | F:
+    """The snapshot with texts added to the end, done by SQLite's json_insert. Calls
+    are nested, as SQLite caps a function at 127 arguments and each text takes two"""
+    snapshot: Func | F = F("snapshot")
+    for start in range(0, len(texts), SNAPSHOT_APPENDS_PER_CALL):
+        appends: list[Value] = []
+        for text in texts[start:start + SNAPSHOT_APPENDS_PER_CALL]:
+            appends += [Value("$[#]"), Value(text)]
+        snapshot = Func(snapshot, *appends, function="json_insert", output_field=models.TextField())
+    return snapshot
+
+
+class ItemManager(models.Manager["Item"]):
+    def add(self, list_id: int, text: str) -> bool:
+        """Insert an item straight into the list by id, without loading the list.
+        Returns False, having inserted nothing, when the list does not exist"""
+        with transaction.atomic(using=sharding.current()):
+            if not List.objects.record_write(list_id, added=1, texts=[text]):
+                return False
+            self.create(text=text, list_id=list_id)
+        return True
+
+    async def aadd(self, list_id: int, text: str) -> bool:
+        return await sync_to_async(self.add)(list_id, text)
+
+    def bulk_add(self, list_id: int, texts: Iterable[str], batch_size: int = BULK_BATCH_SIZE) -> int:
+        """Insert every text into the list in one transaction, in iteration order.
+        Rows get ascending ids, so they render in the same order they were given.
+        Raises List.DoesNotExist, having inserted nothing, when the list does not exist.
+        Adding no items leaves the list as it was"""
+        texts = iter(texts)
+        added: int = 0
+        # For the snapshot, until there are more than it can hold
+        appended: list[str] | None = []
+        with transaction.atomic(using=sharding.current()):
+            # Checked before any batch is inserted; the transaction holds the write lock
+            # from here, so the list can't be deleted before the items are in
+            if not List.objects.filter(id=list_id).exists():
+                raise List.DoesNotExist(f"List {list_id} does not exist")
+            while batch := [self.model(text=text, list_id=list_id) for text in islice(texts, batch_size)]:
+                self.bulk_create(batch)
+                added += len(batch)
+                if appended is not None and added <= SNAPSHOT_MAX_ITEMS:
+                    appended += [item.text for item in batch]
+                else:
+                    appended = None
+            if added and not List.objects.record_write(list_id, added, texts=appended):
+                raise List.DoesNotExist(f"List {list_id} does not exist")
+        return added
+
+    async def abulk_add(self, list_id: int, texts: Iterable[str], batch_size: int = BULK_BATCH_SIZE) -> int:
+        return await sync_to_async(self.bulk_add)(list_id, texts, batch_size)
+
+    def search(self, text: str, list_id: int | None = None, limit: int = 20, offset: int = 0) -> list["Item"]:
+        """Items matching every word of text, best match first by FTS5's bm25 rank,
+        which each item carries as .rank (lower is better). Only searches the given
+        list when list_id is set. The index is read through a join on the primary key,
+        so lists_item is never scanned. Sharded, a search of every list takes the first
+        offset + limit matches of each shard and merges them by rank, which FTS5 works
+        out from each shard's own word frequencies"""
+        query: str = search_query(text)
+        if not query:
+            return []
+        if not sharding.is_sharded():
+            return self._search(DEFAULT_DB_ALIAS, query, list_id, limit, offset)
+        if list_id is not None:
+            return self._search(ListPlacement.objects.shard_for(list_id), query, list_id, limit, offset)
+        found: list[Item] = [item for shard in sharding.shards()
+                             for item in self._search(shard, query, None, offset + limit, 0)]
+        return sorted(found, key=lambda item: (item.rank, item.id))[offset:offset + limit]
+
+    def _search(self, using: str, query: str, list_id: int | None, limit: int, offset: int) -> list["Item"]:
+        in_list: str = "AND lists_item.list_id = %s" if list_id is not None else ""
+        params: list[Any] = [query, *([list_id] if list_id is not None else []), limit, offset]
+        return list(self.db_manager(using).raw(
+            f"SELECT lists_item.id, lists_item.text, lists_item.list_id, {SEARCH_TABLE}.rank AS rank "
+            f"FROM {SEARCH_TABLE} JOIN lists_item ON lists_item.id = {SEARCH_TABLE}.rowid "
+            f"WHERE {SEARCH_TABLE} MATCH %s {in_list} "
+            # By rank alone, which FTS5 hands back already sorted; with any other term
+            # SQLite sorts the joined rows again in a temp B-tree. Ties come out in the
+            # order FTS5 scans the index, the same on every run over the same rows
+            f"ORDER BY {SEARCH_TABLE}.rank LIMIT %s OFFSET %s", params))
+
+    async def asearch(self, text: str, list_id: int | None = None, limit: int = 20, offset: int = 0) -> list["Item"]:
+        return await sync_to_async(self.search)(text, list_id, limit, offset)
+
+
+class ListManager(models.Manager["List"]):
+    def create_with_item(self, text: str) -> "List":
+        """Create a list holding its first item, both or neither. Sharded, the list
+        goes to the next shard in turn, its id taken from the directory before the
+        shard's write lock, so no transaction waits on one lock while holding another"""
+        shard: str = sharding.shard_for_new_list()
+        new_list: List = self.model(item_count=1, revision=1, snapshot=dump_snapshot([text]), snapshot_revision=1)
+        _allocate_ids([new_list], shard)
+        with sharding.routed_to(shard), transaction.atomic(using=shard):
+            new_list.save(force_insert=True, using=shard)
+            Item.objects.create(text=text, list_id=new_list.id)
+        return new_list
+
+    async def acreate_with_item(self, text: str) -> "List":
+        return await sync_to_async(self.create_with_item)(text)
+
+    def record_write(self, list_id: int, added: int, texts: list[str] | None = None) -> bool:
+        """Count the added items and move the list on to its next revision, in one
+        UPDATE evaluated by the database so concurrent writers can't lose updates.
+        When texts are given, the snapshot was up to date and the list stays within
+        SNAPSHOT_MAX_ITEMS, they are appended to it in the same UPDATE; otherwise the
+        snapshot falls behind the revision until rebuilt. Returns False when the list
+        does not exist"""
+        snapshot_updates: dict[str, Any] = {}
+        if texts is not None:
+            snapshot_updates = {
+                "snapshot": _if_snapshot_kept(added, _appended_snapshot(texts), F("snapshot"), models.TextField()),
+                "snapshot_revision": _if_snapshot_kept(
+                    added, F("revision") + 1, F("snapshot_revision"), models.PositiveBigIntegerField()),
+            }
+        return self.filter(id=list_id).update(
+            item_count=F("item_count") + added,
+            revision=F("revision") + 1,
+            updated_at=timezone.now(),
+            **snapshot_updates,) == 1
+
+    def rebuild_snapshot(self, list_id: int) -> None:
+        """Rewrite a list's snapshot from its items. The transaction takes SQLite's
+        write lock as it begins, so no item can be added between the read and the write"""
+        with transaction.atomic(using=sharding.current(), savepoint=False):
+            texts: list[str] = list(
+                Item.objects.filter(list_id=list_id).order_by("id").values_list("text", flat=True))
+            self.filter(id=list_id).update(snapshot=dump_snapshot(texts), snapshot_revision=F("revision"))
+
+    def snapshot_texts(self, list_id: int, revision: int) -> list[str] | None:
+        """The item texts of a list from its snapshot, in one row read, or None when
+        the snapshot isn't of the given revision"""
+        snapshots: list[str] = list(
+            self.filter(id=list_id, snapshot_revision=revision).values_list("snapshot", flat=True)[:1])
+        return json.loads(snapshots[0]) if snapshots else None
+
+    async def asnapshot_texts(self, list_id: int, revision: int) -> list[str] | None:
+        snapshots: list[str] = [snapshot async for snapshot in self.filter(
+            id=list_id, snapshot_revision=revision).values_list("snapshot", flat=True)[:1]]
+        return json.loads(snapshots[0]) if snapshots else None
+
+    def bulk_create(self, objs: Iterable["List"], *args: Any, **kwargs: Any) -> list["List"]:
+        objs = list(objs)
+        _allocate_ids(objs, self._db or sharding.current())
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+def _allocate_ids(lists: list["List"], shard: str) -> None:
+    """Sharded, gives lists without an id one from the directory, placing them on
+    shard. Each shard would otherwise count ids from 1"""
+    new_lists: list[List] = [new_list for new_list in lists if new_list.id is None]
+    if new_lists and sharding.is_sharded():
+        for new_list, list_id in zip(new_lists, ListPlacement.objects.allocate(len(new_lists), shard)):
+            new_list.id = list_id
 
 
 class List(models.Model):
     id = models.AutoField(primary_key=True)
-    pass
+    updated_at = models.DateTimeField(default=timezone.now)
+    # Denormalised from Item and bumped on every write, see ListManager.record_write
+    item_count = models.PositiveIntegerField(default=0)
+    revision = models.PositiveBigIntegerField(default=0)
+    # The item texts as a JSON array, for rendering the list from one row. Only
+    # current while snapshot_revision equals revision, see ListManager.record_write.
+    # Lists start without one, as items written around the managers don't reach it
+    snapshot = models.TextField(default="[]")
+    snapshot_revision = models.PositiveBigIntegerField(null=True, default=None)
+    # The revision rebalance_lists last moved the list to another shard at, which gave
+    # its items new ids, so page cursors from before it no longer point into the list
+    moved_revision = models.PositiveBigIntegerField(default=0)
+
+    objects = ListManager()
+
+    @property
+    def snapshot_is_current(self) -> bool:
+        return self.snapshot_revision == self.revision
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        if self.id is None and sharding.is_sharded():
+            _allocate_ids([self], kwargs.get("using") or sharding.current())
+            kwargs["force_insert"] = True
+        super().save(*args, **kwargs)
 
 
 class Item(models.Model):
     text = models.TextField(default="")
-    list = models.ForeignKey(List, default=None, on_delete=models.CASCADE)
+    # Indexed by the composite index below, which also serves lookups on list_id alone
+    list = models.ForeignKey(List, default=None, on_delete=models.CASCADE, db_index=False)
+
+    objects = ItemManager()
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["list", "id"], name="lists_item_list_id_id_idx")]
+
+
+class ImportCheckpoint(models.Model):
+    """How far an import of an export file has got, see lists.transfer.import_lists"""
+    name = models.CharField(max_length=255, unique=True)
+    format = models.CharField(max_length=8)
+    # Bytes of the file read up to the end of the last committed batch
+    position = models.PositiveBigIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+
+class ImportedList(models.Model):
+    """The list an import created for one of the list ids in its file"""
+    # Indexed by the unique constraint below, which leads with it
+    checkpoint = models.ForeignKey(ImportCheckpoint, on_delete=models.CASCADE, db_index=False)
+    source_id = models.PositiveBigIntegerField()
+    list = models.ForeignKey(List, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["checkpoint", "source_id"],
+                                               name="lists_importedlist_checkpoint_source_uniq")]
+
+
+class ListPlacementManager(models.Manager["ListPlacement"]):
+    def allocate(self, count: int, shard: str) -> list[int]:
+        """Ids for count new lists on shard, in the order they were handed out"""
+        placements: list[ListPlacement] = self.bulk_create(
+            [self.model(shard=shard) for _ in range(count)], batch_size=BULK_BATCH_SIZE)
+        return [placement.id for placement in placements]
+
+    def shard_for(self, list_id: int, refresh: bool = False) -> str:
+        """The shard a list is on, remembered by the process until refresh. Lists
+        from before sharding, which aren't in the directory, are on default"""
+        shard: str | None = None if refresh else sharding.cached_placement(list_id)
+        if shard is None:
+            shard = self.filter(id=list_id).values_list("shard", flat=True).first() or DEFAULT_DB_ALIAS
+            sharding.remember_placement(list_id, shard)
+        return shard
+
+
+class ListPlacement(models.Model):
+    """Which shard each list is on, kept on default, see lists/sharding.py. Its ids
+    are the list ids, so every list has one across all the shards"""
+    id = models.AutoField(primary_key=True)
+    shard = models.CharField(max_length=64)
+
+    objects = ListPlacementManager()
@@ -0,0 +1,80 @@
+"""Runs every lists view against a throwaway list and asks SQLite how it would
+execute each statement, so a missing index shows up as a full scan of lists_item.
+Everything happens inside a transaction that is rolled back afterwards."""
+import json
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+from django.db import connection, transaction
+from django.http import HttpRequest
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from lists.models import Item, List
+
+SCANNED_TABLE = "lists_item"
+NO_CACHE: dict[str, dict[str, str]] = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    "lists": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+@dataclass
+class QueryPlan:
+    view: str
+    sql: str
+    plan: list[str] = field(default_factory=list)
+
+    @property
+    def scans_items(self) -> bool:
+        # Not the FTS5 index over it, lists_item_fts, whose scans are index lookups
+        return any(step.split()[:2] == ["SCAN", SCANNED_TABLE] for step in self.plan)
+
+
+def _requests(list_id: int, item_id: int) -> list[tuple[str, HttpRequest]]:
+    factory = RequestFactory()
+    return [
+        ("home_page", factory.get("/")),
+        ("new_list", factory.post("/lists/new", {"item_text": "A new list item"})),
+        ("view_list", factory.get(f"/lists/{list_id}/")),
+        ("view_list paginated", factory.get(f"/lists/{list_id}/", {"after": item_id, "limit": 10})),
+        ("view_list streamed", factory.get(f"/lists/{list_id}/", {"stream": ""})),
+        ("list_items_json", factory.get(f"/lists/{list_id}/items.json", {"after": item_id, "limit": 10})),
+        ("list_items_json streamed", factory.get(f"/lists/{list_id}/items.json", {"stream": ""})),
+        ("search_items", factory.get("/lists/search", {"q": "seeded item*"})),
+        ("search_items in a list", factory.get("/lists/search", {"q": "seeded item*", "list": list_id})),
+        ("export_list", factory.get(f"/lists/{list_id}/export")),
+        ("export_lists", factory.get("/lists/export")),
+        ("add_item", factory.post(f"/lists/{list_id}/add_item", {"item_text": "An item"})),
+        ("add_items", factory.post(f"/lists/{list_id}/add_items", json.dumps(["One", "Two"]),
+                                   content_type="application/json")),
+    ]
+
+
+def _explain(sql: str, params: Any) -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def view_query_plans() -> list[QueryPlan]:
+    plans: list[QueryPlan] = []
+    current_view: str = ""
+
+    def record(execute: Callable[..., Any], sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+        if not sql.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK", "EXPLAIN")):
+            plans.append(QueryPlan(current_view, sql, _explain(sql, params)))
+        return execute(sql, params, many, context)
+
+    with override_settings(CACHES=NO_CACHE), transaction.atomic():
+        my_list: List = List.objects.create()
+        Item.objects.bulk_add(my_list.id, [f"Seeded item {n}" for n in range(20)])
+        first_item_id: int = Item.objects.filter(list=my_list).values_list("id", flat=True)[0]
+
+        with connection.execute_wrapper(record):
+            for current_view, request in _requests(my_list.id, first_item_id):
+                match = resolve(request.path)
+                response = match.func(request, *match.args, **match.kwargs)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+        transaction.set_rollback(True)
+    return plans
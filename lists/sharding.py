@@ -0,0 +1,100 @@
+"""Horizontal partitioning of lists over several SQLite databases, so writes to
+lists on different shards don't queue for the same write lock.
+
+settings.LIST_SHARDS names the databases lists are spread over; with only
+"default" in it nothing is routed. With more, the default database also holds
+the directory, ListPlacement, of which shard each list is on. The directory
+hands out list ids, so they stay unique across the shards. A list's items, and
+the import records that created it, are always on the list's shard.
+
+The ORM reads and writes lists and items on the current shard of the context.
+ListShardMiddleware sets it for each request from the list id in the URL;
+elsewhere routed_to() sets it. rebalance_lists moves lists between shards
+while they are in use.
+"""
+import itertools
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from django.conf import settings
+from django.core.signals import request_finished, setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Model
+from django.dispatch import receiver
+
+SHARDED_MODELS: frozenset[str] = frozenset({"list", "item", "importcheckpoint", "importedlist"})
+# Placements remembered per process before the cache starts over
+PLACEMENT_CACHE_SIZE = 100_000
+
+_current: ContextVar[str | None] = ContextVar("list_shard", default=None)
+_placements: dict[int, str] = {}
+_new_list_shards: Iterator[int] = itertools.count()
+
+
+def shards() -> list[str]:
+    return list(settings.LIST_SHARDS)
+
+
+def is_sharded() -> bool:
+    return len(settings.LIST_SHARDS) > 1
+
+
+def current() -> str:
+    """The database lists and items are read from and written to in this context"""
+    return _current.get() or DEFAULT_DB_ALIAS
+
+
+def route_to(shard: str | None) -> None:
+    """Make shard current for the rest of this context, or default with None"""
+    _current.set(shard)
+
+
+@contextmanager
+def routed_to(shard: str) -> Iterator[str]:
+    token = _current.set(shard)
+    try:
+        yield shard
+    finally:
+        _current.reset(token)
+
+
+def shard_for_new_list() -> str:
+    """Shards take new lists in turn; rebalance_lists evens out what that leaves"""
+    all_shards: list[str] = shards()
+    return all_shards[next(_new_list_shards) % len(all_shards)]
+
+
+def cached_placement(list_id: int) -> str | None:
+    return _placements.get(list_id)
+
+
+def remember_placement(list_id: int, shard: str) -> None:
+    if len(_placements) >= PLACEMENT_CACHE_SIZE:
+        _placements.clear()
+    _placements[list_id] = shard
+
+
+@receiver(request_finished)
+def _route_to_default(**kwargs: Any) -> None:
+    # Once a response is sent, so the next request on the thread starts on default
+    route_to(None)
+
+
+@receiver(setting_changed)
+def _forget_placements(setting: str, **kwargs: Any) -> None:
+    if setting == "LIST_SHARDS":
+        _placements.clear()
+
+
+class ListShardRouter:
+    """Sends lists, items and imports to the current shard and everything else to
+    default. Every database gets every table, so any of them can be a shard"""
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str | None:
+        if model._meta.app_label == "lists" and model._meta.model_name in SHARDED_MODELS:
+            return current()
+        return None
+
+    def db_for_write(self, model: type[Model], **hints: Any) -> str | None:
+        return self.db_for_read(model, **hints)
@@ -1,16 +1,69 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from typing import Any
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
 from django.db.models.manager import BaseManager
-from django.test import TestCase
+from django.test import Client, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.http import HttpResponse
-from lists.models import Item, List
+from django.template import engines
+from lists import cache, sharding, transfer, write_queue
+from lists.models import SNAPSHOT_MAX_ITEMS, ImportCheckpoint, Item, List, ListPlacement, search_query
+from lists.query_plans import QueryPlan, view_query_plans
+from superlists import settings_lean, startup
 
 
-class HomePageTest(TestCase):
+def csrf_token_in(response: HttpResponse) -> str:
+    """The token of the CSRF hidden input on a page"""
+    match: re.Match[str] | None = re.search(r'name="csrfmiddlewaretoken" value="(\w+)"', response.content.decode())
+    assert match is not None, "No CSRF token on the page"
+    return match[1]
+
+
+class ListsTestCase(TestCase):
+    """Starts every test with an empty list cache. List ids are reused once a test's
+    transaction rolls back, so fragments cached by one test would leak into the next"""
+
+    def setUp(self):
+        caches["lists"].clear()
+        cache.reset_stats()
+
+
+class HomePageTest(ListsTestCase):
     def test_uses_home_template(self):
         response: HttpResponse = self.client.get("/")
         self.assertTemplateUsed(response, "home.html")
 
+    def test_gives_each_response_a_working_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        first: HttpResponse = client.get("/")
+        second: HttpResponse = client.get("/")
+        token: str = csrf_token_in(first)
+        self.assertNotEqual(first.content, second.content)
+        response: HttpResponse = client.post("/lists/new", data={"item_text": "A new item",
+                                                                 "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+
 
-class ListViewTest(TestCase):
+class ListViewTest(ListsTestCase):
     def test_uses_list_template(self):
         my_list: List = List.objects.create()
         response: HttpResponse = self.client.get(
@@ -40,6 +93,499 @@ class ListViewTest(TestCase):
         self.assertEqual(response.context["list"], correct_list)
 
 
+class ListPaginationTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.my_list: List = List.objects.create()
+        Item.objects.bulk_add(self.my_list.id, [f"itemey {n}" for n in range(1, 6)])
+        self.item_ids: list[int] = list(
+            Item.objects.filter(list=self.my_list).order_by("id").values_list("id", flat=True))
+
+    def test_first_page_links_to_the_next(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.my_list.id}/?limit=2")
+
+        self.assertContains(response, "1: itemey 1")
+        self.assertContains(response, "2: itemey 2")
+        self.assertNotContains(response, "itemey 3")
+        revision: int = List.objects.get(id=self.my_list.id).revision
+        self.assertContains(response, f"?after={revision}-{self.item_ids[1]}&amp;limit=2")
+
+    def test_numbering_carries_on_across_pages(self):
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.my_list.id}/?after={self.item_ids[1]}&limit=2")
+
+        self.assertNotContains(response, "itemey 2")
+        self.assertContains(response, "3: itemey 3")
+        self.assertContains(response, "4: itemey 4")
+
+    def test_last_page_has_no_next_link(self):
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.my_list.id}/?after={self.item_ids[3]}&limit=2")
+
+        self.assertContains(response, "5: itemey 5")
+        self.assertNotContains(response, "id_next_page")
+
+    def test_rejects_a_bad_cursor(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.my_list.id}/?after=x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_streams_every_item_in_order(self):
+        Item.objects.create(text="<b>bold</b>", list=self.my_list)
+        response = self.client.get(f"/lists/{self.my_list.id}/?stream")
+        content: str = b"".join(response.streaming_content).decode()
+
+        self.assertIn('<table id = "id_list_table">', content)
+        self.assertIn("1: itemey 1", content)
+        self.assertIn("5: itemey 5", content)
+        self.assertIn("6: &lt;b&gt;bold&lt;/b&gt;", content)
+        self.assertLess(content.index("itemey 1"), content.index("itemey 5"))
+        self.assertTrue(content.rstrip().endswith("</html>"))
+
+    def test_returns_404_for_a_missing_list(self):
+        response: HttpResponse = self.client.get("/lists/999/")
+        self.assertEqual(response.status_code, 404)
+
+
+class ListCacheTest(ListsTestCase):
+    def test_second_view_is_served_from_the_cache(self):
+        my_list: List = List.objects.create()
+        Item.objects.create(text="itemey 1", list=my_list)
+        self.client.get(f"/lists/{my_list.id}/")
+
+        # Only the List row is read, not the items
+        with self.assertNumQueries(1):
+            response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+        self.assertContains(response, "1: itemey 1")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_adding_an_item_invalidates_the_cached_rows(self):
+        my_list: List = List.objects.create()
+        Item.objects.create(text="itemey 1", list=my_list)
+        self.client.get(f"/lists/{my_list.id}/")
+
+        self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "itemey 2"})
+
+        response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+        self.assertContains(response, "2: itemey 2")
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 2})
+
+    def test_lists_are_cached_separately(self):
+        first_list: List = List.objects.create()
+        Item.objects.create(text="first list item", list=first_list)
+        second_list: List = List.objects.create()
+        Item.objects.create(text="second list item", list=second_list)
+        self.client.get(f"/lists/{first_list.id}/")
+
+        response: HttpResponse = self.client.get(f"/lists/{second_list.id}/")
+        self.assertContains(response, "second list item")
+        self.assertNotContains(response, "first list item")
+
+    def test_works_with_a_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            file_cache: dict[str, dict[str, object]] = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "lists": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir},
+            }
+            with override_settings(CACHES=file_cache):
+                my_list: List = List.objects.create()
+                Item.objects.create(text="itemey 1", list=my_list)
+                self.client.get(f"/lists/{my_list.id}/")
+                response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+
+        self.assertContains(response, "1: itemey 1")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+
+class ConditionalListViewTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.my_list: List = List.objects.create()
+        Item.objects.create(text="itemey 1", list=self.my_list)
+
+    def test_sends_validators(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.my_list.id}/")
+        self.assertTrue(response.headers["ETag"].startswith(f'"{self.my_list.id}-'))
+        self.assertIn("Last-Modified", response.headers)
+
+    def test_matching_etag_gets_a_304_without_rendering(self):
+        etag: str = self.client.get(f"/lists/{self.my_list.id}/").headers["ETag"]
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.my_list.id}/", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.content, b"")
+        self.assertTemplateNotUsed(response, "list.html")
+
+    def test_unmodified_since_gets_a_304(self):
+        last_modified: str = self.client.get(f"/lists/{self.my_list.id}/").headers["Last-Modified"]
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.my_list.id}/", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_adding_an_item_changes_the_etag(self):
+        etag: str = self.client.get(f"/lists/{self.my_list.id}/").headers["ETag"]
+        self.client.post(f"/lists/{self.my_list.id}/add_item", data={"item_text": "itemey 2"})
+
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.my_list.id}/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+class ResponseSizeTest(ListsTestCase):
+    # Byte budgets for a page of 10,000 short items, plain and gzipped
+    PAGE_BUDGET = 360_000
+    GZIPPED_PAGE_BUDGET = 60_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.list: List = List.objects.create()
+        Item.objects.bulk_add(cls.list.id, [f"itemey {n}" for n in range(1, 10_001)])
+
+    def test_a_10k_item_page_stays_within_budget(self):
+        plain: HttpResponse = self.client.get(f"/lists/{self.list.id}/")
+        gzipped: HttpResponse = self.client.get(f"/lists/{self.list.id}/", headers={"Accept-Encoding": "gzip"})
+
+        self.assertLess(len(plain.content), self.PAGE_BUDGET)
+        self.assertEqual(gzipped.headers["Content-Encoding"], "gzip")
+        self.assertLess(len(gzipped.content), self.GZIPPED_PAGE_BUDGET)
+        self.assertIn("10000: itemey 10000", gzip.decompress(gzipped.content).decode())
+
+    def test_rows_render_without_padding(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/")
+        self.assertContains(response, "<tr><td>1: itemey 1</td></tr><tr><td>2: itemey 2</td></tr>")
+
+    def test_streamed_pages_are_compressed_as_they_go(self):
+        response: HttpResponse = self.client.get(
+            f"/lists/{self.list.id}/?stream", headers={"Accept-Encoding": "gzip"})
+        chunks: list[bytes] = list(response.streaming_content)  # type: ignore[arg-type]
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertGreater(len(chunks), 2)
+        self.assertLess(sum(map(len, chunks)), self.GZIPPED_PAGE_BUDGET)
+        self.assertIn("10000: itemey 10000", gzip.decompress(b"".join(chunks)).decode())
+
+    def test_honours_accept_encoding_quality(self):
+        for accept_encoding, compressed in [("gzip;q=0", False), ("br, deflate", False), ("*", True),
+                                            ("*, gzip;q=0", False), ("deflate, gzip;q=0.5", True)]:
+            with self.subTest(accept_encoding):
+                response: HttpResponse = self.client.get(
+                    f"/lists/{self.list.id}/", headers={"Accept-Encoding": accept_encoding})
+                self.assertEqual(response.headers.get("Content-Encoding") == "gzip", compressed)
+                self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+    @override_settings(COMPRESSION_MIN_SIZE=1_000_000)
+    def test_leaves_small_responses_alone(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_conditional_requests_match_the_weakened_etag(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/", headers={"Accept-Encoding": "gzip"})
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+        not_modified: HttpResponse = self.client.get(
+            f"/lists/{self.list.id}/", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["ETag"], response.headers["ETag"])
+        self.assertIn("Accept-Encoding", not_modified.headers["Vary"])
+
+    @override_settings(COMPRESSION_MIN_SIZE=1_000_000)
+    def test_etag_is_weak_for_gzip_clients_even_when_left_uncompressed(self):
+        plain: HttpResponse = self.client.get(f"/lists/{self.list.id}/")
+        gzip_client: HttpResponse = self.client.get(f"/lists/{self.list.id}/", headers={"Accept-Encoding": "gzip"})
+        self.assertTrue(plain.headers["ETag"].startswith('"'))
+        self.assertEqual(gzip_client.headers["ETag"], "W/" + plain.headers["ETag"])
+
+
+class ListItemsJsonTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.list: List = List.objects.create()
+        Item.objects.bulk_add(self.list.id, [f"itemey {n}" for n in range(1, 6)])
+        self.list.refresh_from_db()
+        self.ids: list[int] = list(Item.objects.values_list("id", flat=True))
+
+    def test_returns_a_page_of_items(self):
+        other_list: List = List.objects.create_with_item("other list item")
+        with self.assertNumQueries(2):
+            response: HttpResponse = self.client.get(f"/lists/{self.list.id}/items.json")
+
+        self.assertEqual(response.headers["Content-Type"], "application/json")
+        self.assertNotIn(b", ", response.content)
+        self.assertEqual(response.json(), {
+            "list": self.list.id, "revision": self.list.revision, "item_count": 5,
+            "items": [{"id": item_id, "text": f"itemey {n}"} for n, item_id in enumerate(self.ids, 1)],
+            "next": None,
+        })
+        self.assertNotIn("other list item", response.content.decode())
+        self.assertNotEqual(other_list.id, self.list.id)
+
+    def test_pages_with_a_keyset_cursor(self):
+        first: dict[str, object] = self.client.get(f"/lists/{self.list.id}/items.json?limit=2").json()
+        self.assertEqual([item["text"] for item in first["items"]], ["itemey 1", "itemey 2"])  # type: ignore[attr-defined]
+        self.assertEqual(first["next"], f"{self.list.revision}-{self.ids[1]}")
+
+        last: dict[str, object] = self.client.get(
+            f"/lists/{self.list.id}/items.json?after={self.ids[3]}&limit=2").json()
+        self.assertEqual([item["text"] for item in last["items"]], ["itemey 5"])  # type: ignore[attr-defined]
+        self.assertIsNone(last["next"])
+
+    def test_selects_fields(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/items.json?fields=text&limit=1")
+        self.assertEqual(response.json()["items"], [{"text": "itemey 1"}])
+        response = self.client.get(f"/lists/{self.list.id}/items.json?fields=id&limit=1")
+        self.assertEqual(response.json()["items"], [{"id": self.ids[0]}])
+
+    def test_rejects_bad_parameters(self):
+        for query in ["fields=colour", "fields=", "limit=0", "after=first"]:
+            with self.subTest(query):
+                response: HttpResponse = self.client.get(f"/lists/{self.list.id}/items.json?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_streams_newline_delimited_json(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/items.json?stream&fields=text")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+        lines: list[str] = b"".join(response.streaming_content).decode().splitlines()  # type: ignore[attr-defined]
+        self.assertEqual([json.loads(line) for line in lines], [{"text": f"itemey {n}"} for n in range(1, 6)])
+
+    def test_answers_conditional_requests(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.list.id}/items.json")
+        with self.assertNumQueries(1):
+            not_modified: HttpResponse = self.client.get(
+                f"/lists/{self.list.id}/items.json", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+        Item.objects.add(self.list.id, "itemey 6")
+        changed: HttpResponse = self.client.get(
+            f"/lists/{self.list.id}/items.json", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["item_count"], 6)
+
+    def test_missing_list_is_not_found(self):
+        self.assertEqual(self.client.get("/lists/999/items.json").status_code, 404)
+
+
+class ItemSearchTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shopping: List = List.objects.create()
+        Item.objects.bulk_add(self.shopping.id, ["Buy peacock feathers", "Buy milk", "Make a fly from the feathers"])
+        self.other: List = List.objects.create()
+        Item.objects.bulk_add(self.other.id, ["Peacock", "Feed the peacocks"])
+
+    def search(self, **params: Any) -> HttpResponse:
+        return self.client.get("/lists/search", params)
+
+    def test_finds_items_holding_every_word_best_match_first(self):
+        found: list[Item] = Item.objects.search("peacock")
+        self.assertEqual([item.text for item in found], ["Peacock", "Buy peacock feathers"])
+        self.assertLess(found[0].rank, found[1].rank)
+        self.assertEqual([item.text for item in Item.objects.search("buy feathers")], ["Buy peacock feathers"])
+
+    def test_words_ending_in_a_star_match_as_prefixes(self):
+        self.assertEqual([item.text for item in Item.objects.search("buy pea*")], ["Buy peacock feathers"])
+        self.assertEqual(len(Item.objects.search("peac*")), 3)
+
+    def test_search_can_be_kept_to_one_list(self):
+        found: list[Item] = Item.objects.search("feathers", list_id=self.shopping.id)
+        self.assertEqual({item.list_id for item in found}, {self.shopping.id})
+        self.assertEqual(len(found), 2)
+
+    def test_search_syntax_in_the_query_is_taken_literally(self):
+        self.assertEqual(search_query('milk" OR NOT (feathers'), '"milk" "OR" "NOT" "feathers"')
+        self.assertEqual(Item.objects.search("milk OR feathers"), [])
+        self.assertEqual(Item.objects.search("!?"), [])
+
+    def test_index_follows_item_updates_and_deletes(self):
+        Item.objects.filter(text="Buy milk").update(text="Buy oat milk")
+        self.assertEqual([item.text for item in Item.objects.search("oat")], ["Buy oat milk"])
+        self.other.delete()
+        self.assertEqual([item.text for item in Item.objects.search("peacock")], ["Buy peacock feathers"])
+        call_command("rebuild_search_index", "--verify", stdout=StringIO())
+
+    def test_endpoint_pages_through_the_results(self):
+        first: HttpResponse = self.search(q="feathers", limit=1)
+        self.assertEqual(first.json()["items"], [
+            {"id": Item.objects.get(text="Buy peacock feathers").id, "list": self.shopping.id,
+             "text": "Buy peacock feathers"}])
+        self.assertEqual(first.json()["next"], 1)
+
+        self.assertEqual([item["text"] for item in self.search(q="peacock*", offset=1, limit=10).json()["items"]],
+                         [item.text for item in Item.objects.search("peacock*", offset=1)])
+        self.assertIsNone(self.search(q="peacock*", offset=1, limit=10).json()["next"])
+        self.assertEqual(len(self.search(q="feathers", list=self.other.id).json()["items"]), 0)
+
+    def test_endpoint_rejects_unusable_parameters(self):
+        for params in [{}, {"q": "  "}, {"q": "milk", "limit": "0"}, {"q": "milk", "list": "x"},
+                       {"q": "milk", "offset": "-1"}]:
+            with self.subTest(params):
+                self.assertEqual(self.search(**params).status_code, 400)
+
+    def test_rebuild_reindexes_every_item_in_chunks(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO lists_item_fts(lists_item_fts) VALUES ('delete-all')")
+        self.assertEqual(Item.objects.search("peacock"), [])
+        with self.assertRaises(CommandError):
+            call_command("rebuild_search_index", "--verify", stdout=StringIO())
+
+        call_command("rebuild_search_index", "--chunk-size", "2", stdout=StringIO())
+        self.assertEqual(len(Item.objects.search("peacock")), 2)
+        call_command("rebuild_search_index", "--verify", stdout=StringIO())
+
+    def test_rebuild_fails_when_items_are_deleted_meanwhile(self):
+        other_list_id: int = self.other.id
+
+        class DeletesAfterFirstChunk(StringIO):
+            def write(self, text: str) -> int:
+                if List.objects.filter(id=other_list_id).exists():
+                    List.objects.filter(id=other_list_id).delete()
+                return super().write(text)
+
+        with self.assertRaisesMessage(CommandError, "Items were deleted during the rebuild"):
+            call_command("rebuild_search_index", "--chunk-size", "2", stdout=DeletesAfterFirstChunk())
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual([item.text for item in Item.objects.search("peacock")], ["Buy peacock feathers"])
+
+
+class CrashingFile(io.BytesIO):
+    """Fails to read past crash_at bytes, as if the import's process died there"""
+
+    def __init__(self, data: bytes, crash_at: int):
+        super().__init__(data)
+        self.crash_at = crash_at
+
+    def readline(self, size: int | None = -1) -> bytes:
+        if self.tell() >= self.crash_at:
+            raise OSError("Simulated crash")
+        return super().readline(size)
+
+
+class ListTransferTest(ListsTestCase):
+    TEXTS: list[str] = ["Buy milk", 'Say "hello", then leave', "Two\nlines", "Café ☕"]
+
+    def setUp(self):
+        super().setUp()
+        self.first: List = List.objects.create_with_item(self.TEXTS[0])
+        Item.objects.bulk_add(self.first.id, self.TEXTS[1:])
+        self.second: List = List.objects.create_with_item("Other list item")
+
+    def export(self, list_id: int | None, format: str) -> bytes:
+        return "".join(transfer.export_chunks(list_id, format)).encode()
+
+    def imported_lists(self, checkpoint: ImportCheckpoint) -> list[list[str]]:
+        return [list(Item.objects.filter(list=imported.list).values_list("text", flat=True))
+                for imported in checkpoint.importedlist_set.order_by("source_id")]
+
+    def test_exports_one_list_or_all_of_them_in_either_format(self):
+        self.assertEqual(self.export(self.second.id, "csv"), f"list,text\n{self.second.id},Other list item\n".encode())
+        self.assertEqual(self.export(self.second.id, "ndjson"),
+                         f'{{"list":{self.second.id},"text":"Other list item"}}\n'.encode())
+        rows: list[list[str]] = list(csv.reader(io.StringIO(self.export(None, "csv").decode())))
+        self.assertEqual(rows, [["list", "text"], *([str(self.first.id), text] for text in self.TEXTS),
+                                [str(self.second.id), "Other list item"]])
+
+    def test_import_recreates_each_list_in_order(self):
+        exports: dict[str, bytes] = {format: self.export(None, format) for format in transfer.FORMATS}
+        for format, export in exports.items():
+            with self.subTest(format):
+                checkpoint: ImportCheckpoint = transfer.import_lists(
+                    io.BytesIO(export), format, f"round trip {format}", batch_size=2)
+                self.assertEqual((checkpoint.rows, checkpoint.finished), (5, True))
+                self.assertEqual(self.imported_lists(checkpoint), [self.TEXTS, ["Other list item"]])
+        # Counters and the search index followed the batches, snapshots are left to rebuild_list_snapshots
+        for command in ["rebuild_list_counters", "rebuild_search_index"]:
+            call_command(command, "--verify", stdout=StringIO())
+        self.assertFalse(List.objects.filter(importedlist__isnull=False, snapshot_revision__isnull=False).exists())
+
+    def test_import_resumes_after_its_last_committed_batch(self):
+        export: bytes = self.export(None, "csv")
+        crash_at: int = export.index(b"Two")
+        with self.assertRaises(OSError):
+            transfer.import_lists(CrashingFile(export, crash_at), "csv", "crashed", batch_size=2)
+        checkpoint: ImportCheckpoint = ImportCheckpoint.objects.get(name="crashed")
+        self.assertEqual((checkpoint.rows, checkpoint.finished), (2, False))
+        self.assertEqual(checkpoint.position, export.index(f'{self.first.id},"Two'.encode()))
+
+        checkpoint = transfer.import_lists(io.BytesIO(export), "csv", "crashed", batch_size=2)
+        self.assertEqual((checkpoint.rows, checkpoint.finished), (5, True))
+        self.assertEqual(self.imported_lists(checkpoint), [self.TEXTS, ["Other list item"]])
+        # A finished import loads nothing more
+        transfer.import_lists(io.BytesIO(export), "csv", "crashed")
+        self.assertEqual(Item.objects.count(), 10)
+
+    def test_exports_in_chunks_that_cross_lists(self):
+        expected: bytes = self.export(None, "csv")
+        self.addCleanup(setattr, transfer, "EXPORT_CHUNK_SIZE", transfer.EXPORT_CHUNK_SIZE)
+        transfer.EXPORT_CHUNK_SIZE = 3
+
+        async def aexport() -> bytes:
+            return "".join([chunk async for chunk in transfer.aexport_chunks(None, "csv")]).encode()
+
+        self.assertEqual(self.export(None, "csv"), expected)
+        self.assertEqual(async_to_sync(aexport)(), expected)
+
+    def test_a_second_run_of_an_import_stops_the_first(self):
+        export: bytes = self.export(None, "csv")
+
+        class RacedFile(io.BytesIO):
+            raced: bool = False
+
+            def readline(self, size: int | None = -1) -> bytes:
+                # Once the first batch is in, the same import runs to the end elsewhere
+                if not self.raced and ImportCheckpoint.objects.filter(name="raced", rows__gt=0).exists():
+                    self.raced = True
+                    transfer.import_lists(io.BytesIO(export), "csv", "raced", batch_size=2)
+                return super().readline(size)
+
+        with self.assertRaisesRegex(ValueError, "Another run of this import"):
+            transfer.import_lists(RacedFile(export), "csv", "raced", batch_size=2)
+        checkpoint: ImportCheckpoint = ImportCheckpoint.objects.get(name="raced")
+        self.assertEqual((checkpoint.rows, checkpoint.finished), (5, True))
+        self.assertEqual(self.imported_lists(checkpoint), [self.TEXTS, ["Other list item"]])
+
+    def test_import_stops_at_an_unusable_row_keeping_the_batches_before_it(self):
+        source = io.BytesIO(b'{"list":1,"text":"one"}\n{"list":1,"text":"two"}\n{"list":"x"}\n')
+        with self.assertRaisesRegex(ValueError, "Line 3"):
+            transfer.import_lists(source, "ndjson", "broken", batch_size=2)
+        self.assertEqual(ImportCheckpoint.objects.get(name="broken").rows, 2)
+        with self.assertRaisesRegex(ValueError, "header"):
+            transfer.import_lists(io.BytesIO(b"id,item\n1,one\n"), "csv", "no header")
+
+    def test_commands_round_trip_through_a_file(self):
+        export_dir: Path = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, export_dir)
+        path: Path = export_dir / "lists.ndjson"
+        report = StringIO()
+        call_command("export_lists", str(path), stdout=StringIO(), stderr=report)
+        self.assertIn("Exported 5 rows", report.getvalue())
+
+        output = StringIO()
+        call_command("import_lists", str(path), "--batch-size", "3", stdout=output)
+        self.assertIn("Imported 5 rows into 2 lists", output.getvalue())
+        self.assertIn("peak RSS", output.getvalue())
+        with self.assertRaisesRegex(CommandError, "format"):
+            call_command("import_lists", str(export_dir / "lists.txt"), stdout=StringIO())
+
+    def test_export_endpoints_stream_attachments(self):
+        response: HttpResponse = self.client.get(f"/lists/{self.second.id}/export", {"format": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="list-{self.second.id}.ndjson"')
+        self.assertEqual(b"".join(response.streaming_content), self.export(self.second.id, "ndjson"))
+        self.assertEqual(b"".join(self.client.get("/lists/export").streaming_content), self.export(None, "csv"))
+        self.assertEqual(self.client.get("/lists/999/export").status_code, 404)
+        self.assertEqual(self.client.get("/lists/export", {"format": "xml"}).status_code, 400)
+
+    def test_import_endpoint_loads_an_upload(self):
+        upload = SimpleUploadedFile("lists.csv", self.export(None, "csv"))
+        response: HttpResponse = self.client.post("/lists/import", {"lists_file": upload, "import": "upload"})
+        self.assertEqual(response.json(), {"import": "upload", "rows": 5, "finished": True, "lists": 2})
+
+        upload = SimpleUploadedFile("lists.csv", b"list,text\nx,y\n")
+        self.assertContains(self.client.post("/lists/import", {"lists_file": upload}), "Line 2", status_code=400)
+        self.assertEqual(self.client.post("/lists/import").status_code, 400)
+
+
 class NewListTest(TestCase):
     def test_can_save_a_POST_request(self):
         self.client.post("/lists/new", data={"item_text": "A new list item"})
@@ -79,6 +625,940 @@ class NewItemTest(TestCase):
 
         self.assertRedirects(response, f"/lists/{correct_list.id}/")
 
+    def test_returns_404_for_a_missing_list(self):
+        response: HttpResponse = self.client.post(
+            "/lists/999/add_item", data={"item_text": "A new item for a missing list"},)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Item.objects.count(), 0)
+
+
+class NewItemsTest(ListsTestCase):
+    def test_can_save_newline_separated_items(self):
+        correct_list: List = List.objects.create()
+        self.client.post(f"/lists/{correct_list.id}/add_items",
+                         data={"items_text": "first\r\n\nsecond\nthird"},)
+
+        self.assertEqual(
+            [item.text for item in Item.objects.filter(list=correct_list).order_by("id")],
+            ["first", "second", "third"],)
+
+    def test_can_save_a_JSON_array_of_items(self):
+        correct_list: List = List.objects.create()
+        self.client.post(f"/lists/{correct_list.id}/add_items",
+                         data=json.dumps(["one", "two"]), content_type="application/json",)
+
+        self.assertEqual(Item.objects.filter(list=correct_list).count(), 2)
+
+    def test_can_save_an_uploaded_file_of_items(self):
+        correct_list: List = List.objects.create()
+        upload = SimpleUploadedFile("items.txt", b"uploaded 1\nuploaded 2\n")
+        self.client.post(f"/lists/{correct_list.id}/add_items",
+                         data={"items_file": upload},)
+
+        self.assertEqual(Item.objects.filter(list=correct_list).count(), 2)
+
+    def test_items_are_displayed_in_the_order_given(self):
+        correct_list: List = List.objects.create()
+        texts: list[str] = [f"item {n}" for n in range(1200)]
+        self.client.post(f"/lists/{correct_list.id}/add_items",
+                         data=json.dumps(texts), content_type="application/json",)
+
+        response: HttpResponse = self.client.get(f"/lists/{correct_list.id}/")
+        self.assertContains(response, "1: item 0<")
+        self.assertContains(response, "1200: item 1199<")
+
+    def test_redirects_to_list_view(self):
+        correct_list: List = List.objects.create()
+        response: HttpResponse = self.client.post(
+            f"/lists/{correct_list.id}/add_items", data={"items_text": "an item"},)
+
+        self.assertRedirects(response, f"/lists/{correct_list.id}/")
+
+    def test_returns_404_for_a_missing_list(self):
+        response: HttpResponse = self.client.post(
+            "/lists/999/add_items", data={"items_text": "an item"},)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Item.objects.count(), 0)
+
+    def test_adding_no_items_leaves_the_list_as_it_was(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        self.client.post(f"/lists/{my_list.id}/add_items", data={"items_text": "\n\n"})
+        self.assertEqual(List.objects.get(id=my_list.id).revision, my_list.revision)
+
+    def test_rejects_a_JSON_body_that_is_not_a_list_of_strings(self):
+        correct_list: List = List.objects.create()
+        response: HttpResponse = self.client.post(
+            f"/lists/{correct_list.id}/add_items", data=json.dumps({"text": "x"}), content_type="application/json",)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Item.objects.count(), 0)
+
+
+class ListCountersTest(TestCase):
+    def test_new_list_starts_at_one_item(self):
+        self.client.post("/lists/new", data={"item_text": "A new list item"})
+        new_list: List = List.objects.get()
+        self.assertEqual((new_list.item_count, new_list.revision), (1, 1))
+
+    def test_each_write_counts_items_and_bumps_the_revision(self):
+        my_list: List = List.objects.create()
+        self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "itemey 1"})
+        self.client.post(f"/lists/{my_list.id}/add_items", data={"items_text": "itemey 2\nitemey 3"})
+
+        my_list.refresh_from_db()
+        self.assertEqual((my_list.item_count, my_list.revision), (3, 2))
+
+    def test_rebuild_fixes_wrong_counts(self):
+        my_list: List = List.objects.create(item_count=5, revision=3)
+        Item.objects.create(text="itemey 1", list=my_list)
+        empty_list: List = List.objects.create()
+
+        call_command("rebuild_list_counters", stdout=StringIO())
+
+        my_list.refresh_from_db()
+        empty_list.refresh_from_db()
+        self.assertEqual((my_list.item_count, my_list.revision), (1, 4))
+        self.assertEqual((empty_list.item_count, empty_list.revision), (0, 0))
+
+    def test_verify_fails_on_wrong_counts_without_fixing_them(self):
+        my_list: List = List.objects.create(item_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_list_counters", "--verify", stdout=StringIO())
+        my_list.refresh_from_db()
+        self.assertEqual(my_list.item_count, 5)
+
+    def test_verify_passes_on_correct_counts(self):
+        Item.objects.bulk_add(List.objects.create().id, ["itemey 1", "itemey 2"])
+        call_command("rebuild_list_counters", "--verify", "--chunk-size", "1", stdout=StringIO())
+
+
+class ListSnapshotTest(ListsTestCase):
+    def assertSnapshotCurrent(self, my_list: List, texts: list[str]):
+        my_list.refresh_from_db()
+        self.assertTrue(my_list.snapshot_is_current)
+        self.assertEqual(json.loads(my_list.snapshot), texts)
+
+    def test_writes_through_the_views_keep_the_snapshot_current(self):
+        self.client.post("/lists/new", data={"item_text": "itemey 1"})
+        my_list: List = List.objects.get()
+        self.assertSnapshotCurrent(my_list, ["itemey 1"])
+
+        self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "itemey 2"})
+        self.client.post(f"/lists/{my_list.id}/add_items", data={"items_text": "itemey 3\nitemey 4"})
+        self.assertSnapshotCurrent(my_list, ["itemey 1", "itemey 2", "itemey 3", "itemey 4"])
+
+    def test_large_batches_are_appended_to_the_snapshot(self):
+        my_list: List = List.objects.create_with_item("itemey 0")
+        texts: list[str] = [f"itemey {n}" for n in range(1, 501)]
+        self.assertTrue(List.objects.record_write(my_list.id, len(texts), texts=texts))
+        self.assertSnapshotCurrent(my_list, ["itemey 0", *texts])
+
+    def test_bulk_adds_append_without_reading_the_items(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        with CaptureQueriesContext(connection) as queries:
+            Item.objects.bulk_add(my_list.id, ["itemey 2", "itemey 3"], batch_size=1)
+        self.assertSnapshotCurrent(my_list, ["itemey 1", "itemey 2", "itemey 3"])
+        self.assertEqual([query["sql"] for query in queries.captured_queries
+                          if query["sql"].startswith("SELECT") and "lists_item" in query["sql"]], [])
+
+    def test_lists_over_the_limit_keep_no_snapshot(self):
+        my_list: List = List.objects.create_with_item("itemey 0")
+        Item.objects.bulk_add(my_list.id, [f"itemey {n}" for n in range(1, SNAPSHOT_MAX_ITEMS)])
+        self.assertSnapshotCurrent(my_list, [f"itemey {n}" for n in range(SNAPSHOT_MAX_ITEMS)])
+
+        Item.objects.add(my_list.id, "one too many")
+        call_command("rebuild_list_snapshots", stdout=StringIO())
+        my_list.refresh_from_db()
+        self.assertFalse(my_list.snapshot_is_current)
+        self.assertContains(self.client.get(f"/lists/{my_list.id}/"), f"{SNAPSHOT_MAX_ITEMS + 1}: one too many")
+
+    def test_lists_start_without_a_snapshot(self):
+        my_list: List = List.objects.create()
+        Item.objects.add(my_list.id, "itemey 1")
+        my_list.refresh_from_db()
+        self.assertFalse(my_list.snapshot_is_current)
+
+    def test_whole_list_is_rendered_without_reading_the_items(self):
+        my_list: List = List.objects.create_with_item("itemey <1>")
+        with CaptureQueriesContext(connection) as queries:
+            response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+        self.assertContains(response, "1: itemey &lt;1&gt;")
+        self.assertNotIn("lists_item", " ".join(query["sql"] for query in queries.captured_queries))
+
+    def test_stale_snapshot_falls_back_to_the_items(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        Item.objects.create(text="itemey 2", list=my_list)
+        List.objects.filter(id=my_list.id).update(revision=F("revision") + 1)
+
+        response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+        self.assertContains(response, "2: itemey 2")
+        self.assertTemplateUsed(response, "list_rows.html")
+
+    def test_rebuild_backfills_missing_and_stale_snapshots(self):
+        without_snapshot: List = List.objects.create(item_count=1, revision=1)
+        Item.objects.create(text="itemey 1", list=without_snapshot)
+        stale: List = List.objects.create_with_item("itemey 2")
+        Item.objects.create(text="itemey 3", list=stale)
+        List.objects.filter(id=stale.id).update(revision=F("revision") + 1)
+
+        call_command("rebuild_list_snapshots", "--chunk-size", "1", stdout=StringIO())
+
+        self.assertSnapshotCurrent(without_snapshot, ["itemey 1"])
+        self.assertSnapshotCurrent(stale, ["itemey 2", "itemey 3"])
+        call_command("rebuild_list_snapshots", "--verify", stdout=StringIO())
+
+    def test_verify_fails_on_a_wrong_snapshot_and_rebuild_fixes_it(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        List.objects.filter(id=my_list.id).update(snapshot='["something else"]')
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_list_snapshots", "--verify", stdout=StringIO())
+        call_command("rebuild_list_snapshots", stdout=StringIO())
+        self.assertSnapshotCurrent(my_list, ["itemey 1"])
+
+    def test_recounting_keeps_current_snapshots_current(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        List.objects.filter(id=my_list.id).update(item_count=5)
+
+        call_command("rebuild_list_counters", stdout=StringIO())
+        self.assertSnapshotCurrent(my_list, ["itemey 1"])
+
+
+class ConcurrentAddItemTest(TransactionTestCase):
+    def test_concurrent_writers_keep_the_counters_right(self):
+        my_list: List = List.objects.create()
+        threads, per_thread = 4, 10
+        errors: list[Exception] = []
+
+        def add_items() -> None:
+            client = Client()
+            try:
+                for n in range(per_thread):
+                    client.post(f"/lists/{my_list.id}/add_item", data={"item_text": f"item {n}"})
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers: list[threading.Thread] = [threading.Thread(target=add_items) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        my_list.refresh_from_db()
+        self.assertEqual(Item.objects.filter(list=my_list).count(), threads * per_thread)
+        self.assertEqual(my_list.item_count, threads * per_thread)
+        self.assertEqual(my_list.revision, threads * per_thread)
+
+
+def write_queue_settings(**config: object) -> dict[str, object]:
+    return {"ENABLED": True, "MAX_BATCH": 500, "MAX_DELAY": 0.05, "DURABILITY": "flush", "TIMEOUT": 5, **config}
+
+
+class WriteQueueTest(TransactionTestCase):
+    def test_commits_concurrent_adds_in_batches_in_each_writers_order(self):
+        my_list: List = List.objects.create()
+        threads, per_thread = 4, 10
+        errors: list[Exception] = []
+
+        def add_items(writer: int) -> None:
+            client = Client()
+            try:
+                for n in range(per_thread):
+                    response: HttpResponse = client.post(
+                        f"/lists/{my_list.id}/add_item", data={"item_text": f"{writer}-{n}"})
+                    self.assertEqual(response.status_code, 302)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        with override_settings(ITEM_WRITE_QUEUE=write_queue_settings()):
+            workers: list[threading.Thread] = [
+                threading.Thread(target=add_items, args=(writer,)) for writer in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            batches: int = write_queue.get_queue().batches
+
+        self.assertEqual(errors, [])
+        my_list.refresh_from_db()
+        self.assertEqual(my_list.item_count, threads * per_thread)
+        self.assertEqual(my_list.revision, batches)
+        self.assertLess(batches, threads * per_thread)
+        texts: list[str] = list(Item.objects.filter(list=my_list).values_list("text", flat=True))
+        for writer in range(threads):
+            self.assertEqual([text for text in texts if text.startswith(f"{writer}-")],
+                             [f"{writer}-{n}" for n in range(per_thread)])
+
+    def test_enqueue_durability_answers_before_the_write(self):
+        my_list: List = List.objects.create()
+        with override_settings(ITEM_WRITE_QUEUE=write_queue_settings(DURABILITY="enqueue", MAX_DELAY=60)):
+            response: HttpResponse = self.client.post(
+                f"/lists/{my_list.id}/add_item", data={"item_text": "Queued item"})
+            self.assertRedirects(response, f"/lists/{my_list.id}/")
+            self.assertEqual(Item.objects.count(), 0)
+            # Shutting down flushes the queued item instead of waiting out MAX_DELAY
+            write_queue.shutdown()
+        self.assertEqual(Item.objects.get().text, "Queued item")
+
+    def test_batches_append_to_the_snapshot(self):
+        my_list: List = List.objects.create_with_item("itemey 1")
+        with override_settings(ITEM_WRITE_QUEUE=write_queue_settings(DURABILITY="enqueue", MAX_DELAY=60)):
+            for text in ["itemey 2", "itemey 3"]:
+                self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": text})
+            write_queue.shutdown()
+        my_list.refresh_from_db()
+        self.assertTrue(my_list.snapshot_is_current)
+        self.assertEqual(json.loads(my_list.snapshot), ["itemey 1", "itemey 2", "itemey 3"])
+
+    def test_missing_lists_are_not_found_in_either_mode(self):
+        for durability in write_queue.DURABILITY_MODES:
+            with self.subTest(durability), override_settings(
+                    ITEM_WRITE_QUEUE=write_queue_settings(DURABILITY=durability)):
+                response: HttpResponse = self.client.post("/lists/999/add_item", data={"item_text": "Lost"})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(Item.objects.count(), 0)
+
+    def test_a_flush_that_outlasts_the_timeout_is_accepted_and_still_added(self):
+        my_list: List = List.objects.create()
+        with override_settings(ITEM_WRITE_QUEUE=write_queue_settings(MAX_DELAY=60, TIMEOUT=0.05)):
+            response: HttpResponse = self.client.post(
+                f"/lists/{my_list.id}/add_item", data={"item_text": "Slow item"})
+            self.assertEqual(response.status_code, 202)
+            write_queue.shutdown()
+        self.assertEqual(Item.objects.get().text, "Slow item")
+
+    @override_settings(ITEM_WRITE_QUEUE=write_queue_settings(MAX_DELAY=60, TIMEOUT=0.05))
+    async def test_an_async_add_that_outlasts_the_timeout_is_still_queued(self):
+        my_list: List = await List.objects.acreate()
+        with self.assertRaises(write_queue.StillQueued):
+            await write_queue.aadd(my_list.id, "Slow item")
+        await sync_to_async(write_queue.shutdown)()
+        self.assertEqual((await Item.objects.aget()).text, "Slow item")
+
+    def test_a_missing_list_does_not_fail_its_batch(self):
+        my_list: List = List.objects.create()
+        queue = write_queue.WriteQueue(max_delay=0.05)
+        missing = queue.submit(999, "Lost")
+        found = queue.submit(my_list.id, "Kept")
+        queue.close()
+        self.assertEqual((missing.result(), found.result()), (False, True))
+        self.assertEqual(list(Item.objects.values_list("text", flat=True)), ["Kept"])
+
+    def test_closed_queue_refuses_items(self):
+        queue = write_queue.WriteQueue()
+        queue.close()
+        with self.assertRaises(RuntimeError):
+            queue.submit(1, "Too late")
+
+    def test_rejects_unknown_durability(self):
+        my_list: List = List.objects.create()
+        with override_settings(ITEM_WRITE_QUEUE=write_queue_settings(DURABILITY="eventually")):
+            with self.assertRaises(ImproperlyConfigured):
+                write_queue.add(my_list.id, "An item")
+
+    @override_settings(ROOT_URLCONF="superlists.async_urls", ITEM_WRITE_QUEUE=write_queue_settings())
+    async def test_async_add_item_waits_for_the_flush(self):
+        my_list: List = await List.objects.acreate()
+        response: HttpResponse = await self.async_client.post(
+            f"/lists/{my_list.id}/add_item", data={"item_text": "Async item"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual((await Item.objects.aget()).text, "Async item")
+
+    @override_settings(ITEM_WRITE_QUEUE=write_queue_settings(MAX_DELAY=0.2))
+    async def test_cancelling_an_async_add_mid_batch_leaves_the_queue_working(self):
+        my_list: List = await List.objects.acreate()
+        cancelled = asyncio.create_task(write_queue.aadd(my_list.id, "Cancelled"))
+        # Queued, with its batch still filling
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        self.assertTrue(await write_queue.aadd(my_list.id, "Async"))
+        self.assertTrue(await sync_to_async(write_queue.add)(my_list.id, "Sync"))
+        texts: list[str] = [text async for text in Item.objects.order_by("id").values_list("text", flat=True)]
+        self.assertEqual(texts, ["Cancelled", "Async", "Sync"])
+
+    def test_worker_carries_on_after_a_batch_fails(self):
+        class FailsFirstBatch(write_queue.WriteQueue):
+            failed: bool = False
+
+            def _write(self, shard: str, batch: list[write_queue.PendingItem]) -> list[write_queue.PendingItem]:
+                if not self.failed:
+                    self.failed = True
+                    raise RuntimeError("Disk full")
+                return super()._write(shard, batch)
+
+        my_list: List = List.objects.create()
+        queue = FailsFirstBatch(max_delay=0.05)
+        dropped = queue.submit(my_list.id, "Cancelled")
+        dropped.cancel()
+        with self.assertLogs("lists.write_queue", "ERROR"), self.assertRaisesMessage(RuntimeError, "Disk full"):
+            queue.submit(my_list.id, "Failed").result(timeout=5)
+        self.assertTrue(queue.submit(my_list.id, "Kept").result(timeout=5))
+        queue.close()
+        self.assertEqual(list(Item.objects.values_list("text", flat=True)), ["Kept"])
+
+
+SHARDS: list[str] = ["default", "lists_1"]
+
+
+class ListShardingTest(ListsTestCase):
+    databases = set(SHARDS)
+
+    def setUp(self):
+        super().setUp()
+        # Entered per test, so each starts with no placements remembered
+        self.enterContext(override_settings(LIST_SHARDS=SHARDS))
+
+    def list_on(self, shard: str, *texts: str) -> List:
+        with sharding.routed_to(shard):
+            # With its empty snapshot current, which adding items keeps current
+            new_list: List = List.objects.create(snapshot_revision=0)
+            if texts:
+                Item.objects.bulk_add(new_list.id, texts)
+        return new_list
+
+    def texts_on(self, shard: str, list_id: int) -> list[str]:
+        return list(Item.objects.using(shard).filter(list_id=list_id).values_list("text", flat=True))
+
+    def test_new_lists_take_the_shards_in_turn_with_ids_from_the_directory(self):
+        for text in ["First list", "Second list"]:
+            self.client.post("/lists/new", data={"item_text": text})
+        placements: dict[int, str] = dict(ListPlacement.objects.values_list("id", "shard"))
+        self.assertEqual(sorted(placements.values()), SHARDS)
+        for list_id, shard in placements.items():
+            self.assertEqual(List.objects.using(shard).get(id=list_id).item_count, 1)
+            self.assertEqual(len(self.texts_on(shard, list_id)), 1)
+
+    def test_requests_are_routed_to_the_shard_of_their_list(self):
+        my_list: List = self.list_on("lists_1", "itemey 1")
+        response: HttpResponse = self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "itemey 2"})
+        self.assertRedirects(response, f"/lists/{my_list.id}/", fetch_redirect_response=False)
+        self.assertContains(self.client.get(f"/lists/{my_list.id}/"), "itemey 2")
+        self.assertEqual(self.texts_on("lists_1", my_list.id), ["itemey 1", "itemey 2"])
+        self.assertFalse(Item.objects.using("default").exists())
+        self.assertEqual(self.client.get("/lists/999/").status_code, 404)
+
+    def test_pages_from_before_a_move_are_not_taken_for_pages_after_it(self):
+        my_list: List = self.list_on("default", "a", "b", "c", "d")
+        url: str = f"/lists/{my_list.id}/items.json"
+        before: HttpResponse = self.client.get(url, {"limit": 2})
+        call_command("rebalance_lists", "--move", str(my_list.id), "lists_1", stdout=StringIO())
+
+        response: HttpResponse = self.client.get(url, {"limit": 2}, headers={"If-None-Match": before.headers["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], before.headers["ETag"])
+        self.assertGreater(response.json()["revision"], before.json()["revision"])
+        texts: list[str] = [item["text"] for item in response.json()["items"]]
+        while (cursor := response.json()["next"]) is not None:
+            response = self.client.get(url, {"limit": 2, "after": cursor})
+            texts += [item["text"] for item in response.json()["items"]]
+        self.assertEqual(texts, ["a", "b", "c", "d"])
+
+    def test_cursors_from_before_a_move_are_refused(self):
+        my_list: List = self.list_on("default", "a", "b", "c", "d")
+        cursor: str = self.client.get(f"/lists/{my_list.id}/items.json", {"limit": 2}).json()["next"]
+        bare_id: str = cursor.split("-")[1]
+        call_command("rebalance_lists", "--move", str(my_list.id), "lists_1", stdout=StringIO())
+
+        for url in [f"/lists/{my_list.id}/items.json", f"/lists/{my_list.id}/"]:
+            for after in [cursor, bare_id]:
+                with self.subTest(url=url, after=after):
+                    response: HttpResponse = self.client.get(url, {"after": after, "limit": 2})
+                    self.assertContains(response, "The list has moved", status_code=400)
+        self.assertEqual(self.client.get(f"/lists/{my_list.id}/items.json", {"after": 0}).status_code, 200)
+
+    def test_rebalance_moves_a_list_with_its_items(self):
+        my_list: List = self.list_on("default", "Buy peacock feathers", "Buy milk")
+        out = StringIO()
+        call_command("rebalance_lists", "--move", str(my_list.id), "lists_1", "--chunk-size", "1", stdout=out)
+
+        self.assertIn(f"Moved list {my_list.id} (2 items) from default to lists_1", out.getvalue())
+        self.assertFalse(List.objects.using("default").filter(id=my_list.id).exists())
+        self.assertFalse(Item.objects.using("default").exists())
+        moved: List = List.objects.using("lists_1").get(id=my_list.id)
+        # bulk_add's revision, and the move's
+        self.assertEqual((moved.item_count, moved.revision), (2, my_list.revision + 2))
+        self.assertTrue(moved.snapshot_is_current)
+        self.assertEqual(self.texts_on("lists_1", my_list.id), ["Buy peacock feathers", "Buy milk"])
+        self.assertEqual(ListPlacement.objects.shard_for(my_list.id, refresh=True), "lists_1")
+        self.assertEqual([item.text for item in Item.objects.search("milk", list_id=my_list.id)], ["Buy milk"])
+
+    def test_a_stale_placement_is_retried_on_the_lists_new_shard(self):
+        my_list: List = self.list_on("default", "itemey 1")
+        call_command("rebalance_lists", "--move", str(my_list.id), "lists_1", stdout=StringIO())
+        # As another process that served the list before the move would remember it
+        sharding.remember_placement(my_list.id, "default")
+
+        self.assertContains(self.client.get(f"/lists/{my_list.id}/"), "itemey 1")
+        self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "itemey 2"})
+        self.assertEqual(self.texts_on("lists_1", my_list.id), ["itemey 1", "itemey 2"])
+
+    def test_rebalance_plans_moves_that_even_out_the_items(self):
+        big: List = self.list_on("default", *["itemey"] * 6)
+        small: List = self.list_on("default", "itemey", "itemey")
+        out = StringIO()
+        call_command("rebalance_lists", "--dry-run", stdout=out)
+        self.assertEqual(out.getvalue(), f"Would move list {small.id} from default to lists_1\n")
+        self.assertEqual(List.objects.using("default").filter(id__in=[big.id, small.id]).count(), 2)
+
+    def test_rebalance_fills_in_the_directory_and_removes_leftover_copies(self):
+        # A list from before sharding, and one whose move stopped before leaving default
+        unplaced: List = List.objects.using("lists_1").bulk_create([List(id=500)])[0]
+        moved: List = self.list_on("lists_1", "itemey 1")
+        List.objects.using("default").bulk_create([List(id=moved.id)])
+        out = StringIO()
+        call_command("rebalance_lists", "--max-moves", "0", stdout=out)
+
+        self.assertIn("default: placed 0 lists, removed 1 left over from moves", out.getvalue())
+        self.assertIn("lists_1: placed 1 lists, removed 0 left over from moves", out.getvalue())
+        self.assertEqual(ListPlacement.objects.get(id=unplaced.id).shard, "lists_1")
+        self.assertFalse(List.objects.using("default").exists())
+        self.assertEqual(self.texts_on("lists_1", moved.id), ["itemey 1"])
+
+    def test_search_export_and_maintenance_commands_cover_every_shard(self):
+        peacocks: List = self.list_on("default", "Peacock")
+        feathers: List = self.list_on("lists_1", "Peacock feathers")
+        self.assertEqual([item.text for item in Item.objects.search("peacock")], ["Peacock", "Peacock feathers"])
+        self.assertEqual([item.list_id for item in Item.objects.search("peacock", list_id=feathers.id)],
+                         [feathers.id])
+        rows: list[list[str]] = list(csv.reader("".join(transfer.export_chunks(None, "csv")).splitlines()))
+        self.assertEqual(rows[1:], [[str(peacocks.id), "Peacock"], [str(feathers.id), "Peacock feathers"]])
+
+        List.objects.using("lists_1").filter(id=feathers.id).update(item_count=5)
+        call_command("rebuild_list_counters", stdout=StringIO())
+        self.assertEqual(List.objects.using("lists_1").get(id=feathers.id).item_count, 1)
+        call_command("rebuild_search_index", "--verify", stdout=StringIO())
+
+
+class ShardedWriteQueueTest(TransactionTestCase):
+    databases = set(SHARDS)
+
+    @override_settings(LIST_SHARDS=SHARDS)
+    def test_writes_each_shards_items_in_its_own_transaction(self):
+        queue = write_queue.WriteQueue(max_delay=0.05)
+        submitted: list[Any] = []
+        for shard in SHARDS:
+            with sharding.routed_to(shard):
+                list_id: int = List.objects.create().id
+                submitted.append((shard, list_id, queue.submit(list_id, f"Item on {shard}")))
+        queue.close()
+        for shard, list_id, done in submitted:
+            self.assertTrue(done.result())
+            self.assertEqual(list(Item.objects.using(shard).values_list("list_id", "text")),
+                             [(list_id, f"Item on {shard}")])
+            self.assertEqual(List.objects.using(shard).get(id=list_id).revision, 1)
+
+    @override_settings(LIST_SHARDS=SHARDS)
+    def test_items_follow_a_list_moved_while_they_were_queued(self):
+        with sharding.routed_to("default"):
+            list_id: int = List.objects.create().id
+            queue = write_queue.WriteQueue(max_delay=60)
+            done = queue.submit(list_id, "Queued before the move")
+        call_command("rebalance_lists", "--move", str(list_id), "lists_1", stdout=StringIO())
+        queue.close()
+        self.assertTrue(done.result())
+        self.assertEqual(list(Item.objects.using("lists_1").values_list("list_id", "text")),
+                         [(list_id, "Queued before the move")])
+        self.assertEqual(List.objects.using("lists_1").get(id=list_id).item_count, 1)
+
+
+class QueryPlanTest(TestCase):
+    def test_no_view_query_scans_the_item_table(self):
+        call_command("seed_lists", "--lists", "20", "--items", "500", stdout=StringIO())
+        plans: list[QueryPlan] = view_query_plans()
+
+        self.assertIn("view_list", {plan.view for plan in plans})
+        self.assertEqual([plan.sql for plan in plans if plan.scans_items], [])
+
+    def test_search_takes_its_order_from_the_index(self):
+        call_command("seed_lists", "--lists", "20", "--items", "500", stdout=StringIO())
+        plans: list[QueryPlan] = [plan for plan in view_query_plans() if plan.view.startswith("search_items")]
+
+        self.assertEqual(len(plans), 2)
+        self.assertEqual([plan.sql for plan in plans if any("TEMP B-TREE" in step for step in plan.plan)], [])
+
+    def test_check_command_passes(self):
+        output = StringIO()
+        call_command("check_query_plans", stdout=output)
+        self.assertIn("none scan lists_item", output.getvalue())
+
+    def test_seeded_lists_have_correct_counters(self):
+        call_command("seed_lists", "--lists", "10", "--items", "200", "--skewed", stdout=StringIO())
+
+        self.assertEqual(Item.objects.count(), 200)
+        call_command("rebuild_list_counters", "--verify", stdout=StringIO())
+
+
+class QueryCountTest(ListsTestCase):
+    """Pins the number of SQL statements each endpoint runs. Savepoint statements
+    count too, since the test transaction turns every atomic block into a savepoint"""
+
+    def test_home_page(self):
+        with self.assertNumQueries(0):
+            self.client.get("/")
+
+    def test_new_list(self):
+        # SAVEPOINT, INSERT list, INSERT item, RELEASE SAVEPOINT
+        with self.assertNumQueries(4):
+            self.client.post("/lists/new", data={"item_text": "A new list item"})
+
+    def test_view_list(self):
+        my_list: List = List.objects.create()
+        Item.objects.create(text="itemey 1", list=my_list)
+        Item.objects.create(text="itemey 2", list=my_list)
+        with self.assertNumQueries(2):
+            self.client.get(f"/lists/{my_list.id}/")
+
+    def test_view_list_page(self):
+        my_list: List = List.objects.create()
+        first_item: Item = Item.objects.create(text="itemey 1", list=my_list)
+        Item.objects.create(text="itemey 2", list=my_list)
+        # List, count of the items before the cursor, one page of items
+        with self.assertNumQueries(3):
+            self.client.get(f"/lists/{my_list.id}/?after={first_item.id}&limit=1")
+
+    def test_view_list_not_modified(self):
+        my_list: List = List.objects.create()
+        Item.objects.create(text="itemey 1", list=my_list)
+        etag: str = self.client.get(f"/lists/{my_list.id}/").headers["ETag"]
+        with self.assertNumQueries(1):
+            self.client.get(f"/lists/{my_list.id}/", headers={"If-None-Match": etag})
+
+    def test_add_item(self):
+        my_list: List = List.objects.create()
+        # SAVEPOINT, UPDATE list, INSERT item, RELEASE SAVEPOINT
+        with self.assertNumQueries(4):
+            self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "An item"})
+
+    def test_add_item_to_a_missing_list(self):
+        # SAVEPOINT, UPDATE list matching no row, RELEASE SAVEPOINT
+        with self.assertNumQueries(3):
+            self.client.post("/lists/999/add_item", data={"item_text": "An item"})
+
+    def test_add_items(self):
+        my_list: List = List.objects.create()
+        texts: str = "\n".join(f"item {n}" for n in range(1000))
+        # SAVEPOINT, SELECT the list, three batched INSERTs, UPDATE list and its snapshot,
+        # RELEASE SAVEPOINT
+        with self.assertNumQueries(7):
+            self.client.post(f"/lists/{my_list.id}/add_items", data={"items_text": texts})
+
+    def test_add_items_to_a_missing_list(self):
+        # SAVEPOINT, SELECT the list, ROLLBACK TO and RELEASE SAVEPOINT, inserting nothing
+        with self.assertNumQueries(4):
+            self.client.post("/lists/999/add_items", data={"items_text": "an item"})
+
+
+@override_settings(ROOT_URLCONF="superlists.async_urls")
+class AsyncViewsTest(ListsTestCase):
+    async def test_home_page_uses_home_template(self):
+        response: HttpResponse = await self.async_client.get("/")
+        self.assertTemplateUsed(response, "home.html")
+
+    async def test_search_items(self):
+        my_list: List = await List.objects.acreate()
+        await Item.objects.abulk_add(my_list.id, ["Buy peacock feathers", "Buy milk"])
+        response: HttpResponse = await self.async_client.get("/lists/search", {"q": "pea*", "list": my_list.id})
+        self.assertEqual([item["text"] for item in response.json()["items"]], ["Buy peacock feathers"])
+
+    async def test_export_and_import(self):
+        my_list: List = await List.objects.acreate_with_item("itemey 1")
+        response: HttpResponse = await self.async_client.get(f"/lists/{my_list.id}/export")
+        export: bytes = b"".join([chunk async for chunk in response.streaming_content])  # type: ignore[attr-defined]
+        self.assertEqual(export, f"list,text\n{my_list.id},itemey 1\n".encode())
+
+        upload = SimpleUploadedFile("lists.csv", export)
+        imported: HttpResponse = await self.async_client.post("/lists/import", {"lists_file": upload})
+        self.assertEqual((imported.json()["rows"], imported.json()["lists"]), (1, 1))
+
+    async def test_list_items_json_pages_and_streams(self):
+        my_list: List = await List.objects.acreate()
+        await Item.objects.abulk_add(my_list.id, ["itemey 1", "itemey 2", "itemey 3"])
+
+        page: HttpResponse = await self.async_client.get(f"/lists/{my_list.id}/items.json?limit=2&fields=text")
+        self.assertEqual(page.json()["items"], [{"text": "itemey 1"}, {"text": "itemey 2"}])
+        self.assertIsNotNone(page.json()["next"])
+
+        stream: HttpResponse = await self.async_client.get(f"/lists/{my_list.id}/items.json?stream&fields=text")
+        body: bytes = b"".join([chunk async for chunk in stream.streaming_content])  # type: ignore[attr-defined]
+        self.assertEqual(body.decode().splitlines(), [f'{{"text":"itemey {n}"}}' for n in range(1, 4)])
+
+    async def test_streamed_list_is_compressed(self):
+        my_list: List = await List.objects.acreate()
+        await Item.objects.abulk_add(my_list.id, [f"itemey {n}" for n in range(1, 3001)])
+
+        response: HttpResponse = await self.async_client.get(
+            f"/lists/{my_list.id}/?stream", headers={"Accept-Encoding": "gzip"})
+        body: bytes = b"".join([chunk async for chunk in response.streaming_content])  # type: ignore[attr-defined]
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("3000: itemey 3000", gzip.decompress(body).decode())
+
+    async def test_new_list_saves_and_redirects(self):
+        response: HttpResponse = await self.async_client.post("/lists/new", data={"item_text": "A new list item"})
+
+        new_list: List = await List.objects.aget()
+        self.assertRedirects(response, f"/lists/{new_list.id}/", fetch_redirect_response=False)
+        self.assertEqual((await Item.objects.aget()).text, "A new list item")
+
+    async def test_view_list_displays_only_its_items(self):
+        correct_list: List = await List.objects.acreate()
+        await Item.objects.abulk_add(correct_list.id, ["itemey 1", "itemey 2"])
+        other_list: List = await List.objects.acreate()
+        await Item.objects.aadd(other_list.id, "other list item")
+
+        response: HttpResponse = await self.async_client.get(f"/lists/{correct_list.id}/")
+        self.assertContains(response, "1: itemey 1")
+        self.assertContains(response, "2: itemey 2")
+        self.assertNotContains(response, "other list item")
+
+    async def test_view_list_paginates_and_streams(self):
+        my_list: List = await List.objects.acreate()
+        await Item.objects.abulk_add(my_list.id, ["itemey 1", "itemey 2", "itemey 3"])
+        first_id: int = (await Item.objects.afirst()).id
+
+        page: HttpResponse = await self.async_client.get(f"/lists/{my_list.id}/?after={first_id}&limit=1")
+        self.assertContains(page, "2: itemey 2")
+        self.assertNotContains(page, "itemey 3")
+
+        streamed = await self.async_client.get(f"/lists/{my_list.id}/?stream")
+        content: str = b"".join([chunk async for chunk in streamed.streaming_content]).decode()
+        self.assertIn("3: itemey 3", content)
+
+    async def test_view_list_answers_conditional_requests(self):
+        my_list: List = await List.objects.acreate()
+        etag: str = (await self.async_client.get(f"/lists/{my_list.id}/")).headers["ETag"]
+
+        response: HttpResponse = await self.async_client.get(
+            f"/lists/{my_list.id}/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_add_item_saves_and_redirects(self):
+        my_list: List = await List.objects.acreate()
+        response: HttpResponse = await self.async_client.post(
+            f"/lists/{my_list.id}/add_item", data={"item_text": "A new item"})
+
+        self.assertRedirects(response, f"/lists/{my_list.id}/", fetch_redirect_response=False)
+        self.assertEqual(await Item.objects.filter(list=my_list).acount(), 1)
+
+    async def test_add_items_saves_them_all(self):
+        my_list: List = await List.objects.acreate()
+        await self.async_client.post(f"/lists/{my_list.id}/add_items", data={"items_text": "one\ntwo"})
+        self.assertEqual(await Item.objects.filter(list=my_list).acount(), 2)
+
+    async def test_writes_to_a_missing_list_get_a_404(self):
+        add_item: HttpResponse = await self.async_client.post("/lists/999/add_item", data={"item_text": "x"})
+        add_items: HttpResponse = await self.async_client.post("/lists/999/add_items", data={"items_text": "x"})
+        view_list: HttpResponse = await self.async_client.get("/lists/999/")
+        self.assertEqual([add_item.status_code, add_items.status_code, view_list.status_code], [404, 404, 404])
+
+
+class PerformanceMiddlewareTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        stats_dir: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, stats_dir)
+        # Flushing after every request leaves nothing to write into stats_dir at exit
+        self.enterContext(self.settings(PERF_STATS_DIR=stats_dir, PERF_FLUSH_EVERY=1))
+
+    def test_disabled_by_default(self):
+        response: HttpResponse = self.client.get("/")
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_reports_queries_and_templates_in_server_timing(self):
+        my_list: List = List.objects.create()
+        with override_settings(PERF_INSTRUMENTATION=True), self.assertLogs("lists.performance"):
+            response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+
+        server_timing: str = response.headers["Server-Timing"]
+        self.assertIn("total;dur=", server_timing)
+        self.assertIn('desc="2 queries"', server_timing)
+        self.assertIn("tpl-list.html;dur=", server_timing)
+        self.assertIn("tpl-list_rows.html;dur=", server_timing)
+
+    def test_logs_a_structured_line_per_request(self):
+        with override_settings(PERF_INSTRUMENTATION=True):
+            with self.assertLogs("lists.performance") as logs:
+                response: HttpResponse = self.client.get("/")
+
+        record: dict[str, object] = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "home")
+        self.assertEqual(record["queries"], 0)
+        self.assertEqual(record["bytes"], len(response.content))
+        self.assertIn("home.html", record["templates_ms"])  # type: ignore[operator]
+
+    def test_histograms_can_be_dumped_per_url_name(self):
+        my_list: List = List.objects.create()
+        with override_settings(PERF_INSTRUMENTATION=True), self.assertLogs("lists.performance"):
+            self.client.get(f"/lists/{my_list.id}/")
+            self.client.post(f"/lists/{my_list.id}/add_item", data={"item_text": "An item"})
+            self.client.get(f"/lists/{my_list.id}/")
+
+            output = StringIO()
+            call_command("dump_perf_stats", "--json", stdout=output)
+
+        urls: dict[str, dict[str, object]] = json.loads(output.getvalue())["urls"]
+        self.assertEqual(urls["view_list"]["count"], 2)
+        self.assertEqual(urls["add_item"]["count"], 1)
+
+    def test_requests_after_a_reset_are_counted_from_zero(self):
+        my_list: List = List.objects.create()
+        with override_settings(PERF_INSTRUMENTATION=True), self.assertLogs("lists.performance"):
+            self.client.get(f"/lists/{my_list.id}/")
+            call_command("dump_perf_stats", "--reset", stdout=StringIO())
+            self.client.get(f"/lists/{my_list.id}/")
+
+            output = StringIO()
+            call_command("dump_perf_stats", "--json", stdout=output)
+
+        urls: dict[str, dict[str, object]] = json.loads(output.getvalue())["urls"]
+        self.assertEqual(urls["view_list"]["count"], 1)
+
+
+class TrafficCaptureTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        capture_dir: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, capture_dir)
+        self.capture_file: Path = Path(capture_dir) / "capture.jsonl"
+
+    def captured(self) -> list[dict[str, object]]:
+        return [json.loads(line) for line in self.capture_file.read_text().splitlines()]
+
+    def test_disabled_by_default(self):
+        self.client.get("/")
+        self.assertFalse(self.capture_file.exists())
+
+    def test_records_the_shape_of_each_request(self):
+        with override_settings(TRAFFIC_CAPTURE_FILE=self.capture_file):
+            self.client.post("/lists/new", data={"item_text": "A secret item"})
+            new_list: List = List.objects.get()
+            self.client.post(f"/lists/{new_list.id}/add_item", data={"item_text": "Another"})
+            self.client.get(f"/lists/{new_list.id}/", {"limit": "10"})
+
+        created, added, viewed = self.captured()
+        self.assertEqual(created["url"], "new_list")
+        self.assertEqual(created["created"], new_list.id)
+        self.assertEqual(created["text_bytes"], len("A secret item"))
+        self.assertNotIn("A secret item", self.capture_file.read_text())
+        self.assertEqual((added["url"], added["list"], added["status"]), ("add_item", new_list.id, 302))
+        self.assertEqual((viewed["method"], viewed["query"]), ("GET", "limit=10"))
+        self.assertLessEqual(created["ts"], added["ts"])  # type: ignore[operator]
+
+
+class TrafficReplayTest(LiveServerTestCase):
+    def setUp(self):
+        capture_dir: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, capture_dir)
+        self.capture_file: Path = Path(capture_dir) / "capture.jsonl"
+
+    def write_capture(self, records: list[dict[str, object]]) -> None:
+        self.capture_file.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    def test_adds_items_to_the_lists_created_during_the_replay(self):
+        existing: List = List.objects.create_with_item("Existing item")
+        records: list[dict[str, object]] = [
+            {"ts": 1.0, "method": "POST", "path": "/lists/new", "url": "new_list", "list": None,
+             "text_bytes": 3, "created": 900},
+            {"ts": 1.1, "method": "GET", "path": "/lists/900/", "url": "view_list", "list": 900},
+            {"ts": 1.2, "method": "GET", "path": "/", "url": "home", "list": None},
+        ] + [{"ts": 1.3 + n / 100, "method": "POST", "path": "/lists/900/add_item", "url": "add_item",
+              "list": 900, "text_bytes": 5} for n in range(10)] + [
+            {"ts": 1.5, "method": "POST", "path": f"/lists/{existing.id}/add_item", "url": "add_item",
+             "list": existing.id, "text_bytes": 4},
+            {"ts": 1.6, "method": "POST", "path": f"/lists/{existing.id}/add_items", "url": "add_items",
+             "list": existing.id},
+        ]
+        self.write_capture(records)
+
+        output = StringIO()
+        call_command("replay_traffic", str(self.capture_file), "--target", self.live_server_url,
+                     "--pace", "fast", "--workers", "8", stdout=output)
+
+        replayed: List = List.objects.exclude(id=existing.id).get()
+        self.assertEqual(Item.objects.filter(list=replayed).count(), 11)
+        self.assertEqual(Item.objects.filter(list=existing).count(), 2)
+        self.assertIn("1 skipped", output.getvalue())
+        self.assertIn("1 lists remapped", output.getvalue())
+
+    def test_keeps_the_original_pacing(self):
+        self.write_capture([{"ts": 10.0 + n / 10, "method": "GET", "path": "/", "url": "home", "list": None}
+                            for n in range(3)])
+        start: float = time.perf_counter()
+        call_command("replay_traffic", str(self.capture_file), "--target", self.live_server_url,
+                     stdout=StringIO())
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+
+
+@override_settings(INSTALLED_APPS=settings_lean.INSTALLED_APPS, MIDDLEWARE=settings_lean.MIDDLEWARE,
+                   TEMPLATES=settings_lean.TEMPLATES)
+class LeanProfileTest(ListsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def csrf_token(self) -> str:
+        response: HttpResponse = self.client.get("/")
+        return csrf_token_in(response)
+
+    def test_home_page_is_unchanged(self):
+        response: HttpResponse = self.client.get("/")
+        self.assertTemplateUsed(response, "home.html")
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+        self.assertIn("csrftoken", response.cookies)
+        self.assertNotIn("sessionid", response.cookies)
+        self.assertEqual(response.headers["X-Frame-Options"], "DENY")
+
+    def test_new_list_and_add_item_are_unchanged(self):
+        token: str = self.csrf_token()
+        with self.assertNumQueries(4):
+            response: HttpResponse = self.client.post(
+                "/lists/new", data={"item_text": "A new item", "csrfmiddlewaretoken": token})
+        new_list: List = List.objects.get()
+        self.assertRedirects(response, f"/lists/{new_list.id}/")
+
+        response = self.client.post(f"/lists/{new_list.id}/add_item",
+                                    data={"item_text": "Another item", "csrfmiddlewaretoken": token})
+        self.assertRedirects(response, f"/lists/{new_list.id}/")
+        self.assertEqual([item.text for item in Item.objects.all()], ["A new item", "Another item"])
+
+    def test_view_list_is_unchanged(self):
+        my_list: List = List.objects.create_with_item("Listed item")
+        with self.assertNumQueries(2):
+            response: HttpResponse = self.client.get(f"/lists/{my_list.id}/")
+        self.assertTemplateUsed(response, "list.html")
+        self.assertContains(response, "1: Listed item")
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+    def test_keeps_csrf_protection(self):
+        my_list: List = List.objects.create_with_item("Listed item")
+        self.assertEqual(self.client.post("/lists/new", data={"item_text": "Forged"}).status_code, 403)
+        self.assertEqual(self.client.post(
+            f"/lists/{my_list.id}/add_item", data={"item_text": "Forged"}).status_code, 403)
+        self.assertEqual(Item.objects.count(), 1)
+
+
+class StartupPreloadTest(TestCase):
+    def test_compiles_every_template_into_the_cached_loader(self):
+        loader: Any = engines["django"].engine.template_loaders[0]
+        loader.reset()
+        templates: list[str] = ["home.html", "list.html", "list_rows.html"]
+        self.assertEqual(startup.preload_templates(), templates)
+        self.assertEqual(sorted(loader.get_template_cache), templates)
+
+    def test_only_the_lean_profile_preloads(self):
+        self.assertFalse(settings.PRELOAD_ON_STARTUP)
+        self.assertTrue(settings_lean.PRELOAD_ON_STARTUP)
+        self.assertNotIn("django.contrib.staticfiles", settings_lean.INSTALLED_APPS)
+
 
 class ListAndItemModelsTest(TestCase):
     def test_saving_and_retrieving_items(self):
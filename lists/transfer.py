@@ -0,0 +1,232 @@
+"""Streaming export and import of lists as CSV or newline-delimited JSON, shared by
+the export_lists / import_lists commands and the export and import views.
+
+An export has one row per item, carrying the id of its list and its text, list by
+list, each list's items in the order they were added; sharded, a shard at a time.
+Lists without items have no rows, so they aren't carried over. Rows are read and
+written a chunk at a time, each chunk a keyset query of its own, so memory stays
+flat however many items there are.
+
+An import creates a new list for every list id in the file. It loads the rows in
+batches, one transaction each, and commits its ImportCheckpoint with every batch:
+the bytes of the file read so far and which new list each list id became. Run
+again under the same name after a crash, it carries on after the last committed
+batch; of two runs at once, the one that falls behind stops. Imported lists start
+without a snapshot, as appending each batch to the snapshot of a large list
+rewrites all of it, so run rebuild_list_snapshots after. Sharded, an import loads
+into the current shard, and rebalance_lists spreads its lists out after.
+"""
+import csv
+import io
+import json
+import sys
+from collections import Counter
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import datetime
+from itertools import islice
+from typing import IO, Any
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from lists import sharding
+from lists.models import BULK_BATCH_SIZE, ImportCheckpoint, ImportedList, Item, List
+
+FORMATS: dict[str, str] = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CSV_HEADER: list[str] = ["list", "text"]
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 2000
+
+
+def peak_rss_mib() -> float | None:
+    """The most memory this process has held at once, for the commands' reports, or
+    None on Windows, which has no resource module. ru_maxrss is in bytes on macOS
+    and KiB elsewhere"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def peak_rss_report() -> str:
+    peak: float | None = peak_rss_mib()
+    return f"peak RSS {peak:.0f} MiB" if peak is not None else "peak RSS unknown"
+
+
+def format_of(filename: str) -> str:
+    """The export format a file name's extension stands for, raising ValueError for others"""
+    extension: str = filename.rsplit(".", 1)[-1].lower()
+    extension = "ndjson" if extension == "jsonl" else extension
+    if extension not in FORMATS:
+        raise ValueError(f"Can't tell the format of {filename}, expected one of {', '.join(FORMATS)}")
+    return extension
+
+
+def _export_rows(list_id: int | None) -> QuerySet[Item, tuple[Any, ...]]:
+    # In the order of the list_id, id index, which also keeps an import's batches
+    # to one or two lists each
+    items: QuerySet[Item, tuple[Any, ...]] = Item.objects.order_by("list_id", "id").values_list("list_id", "text")
+    return items if list_id is None else items.filter(list_id=list_id)
+
+
+def format_rows(rows: Iterable[tuple[int, str]], format: str) -> str:
+    if format == "ndjson":
+        return "".join(json.dumps({"list": list_id, "text": text}, ensure_ascii=False, separators=(",", ":")) + "\n"
+                       for list_id, text in rows)
+    chunk = io.StringIO()
+    csv.writer(chunk, lineterminator="\n").writerows(rows)
+    return chunk.getvalue()
+
+
+def header(format: str) -> str:
+    return ",".join(CSV_HEADER) + "\n" if format == "csv" else ""
+
+
+def _export_shards(list_id: int | None) -> list[str]:
+    # One list is read from the current shard, which the caller routed to
+    return [sharding.current()] if list_id is not None else sharding.shards()
+
+
+def _export_chunk(list_id: int | None, shard: str,
+                  after: tuple[int, int]) -> QuerySet[Item, tuple[Any, ...]]:
+    """The next chunk of rows, with their item ids, after the (list id, item id) of
+    the last row of the previous chunk. Across lists, list_id is also bounded on its
+    own, so SQLite seeks the list_id, id index to it rather than reading the index
+    from the start for every chunk"""
+    rows: QuerySet[Item, tuple[Any, ...]] = _export_rows(list_id).using(shard).values_list("list_id", "text", "id")
+    if list_id is not None:
+        return rows.filter(id__gt=after[1])[:EXPORT_CHUNK_SIZE]
+    return rows.filter(Q(list_id__gte=after[0]), Q(list_id__gt=after[0]) | Q(id__gt=after[1]))[:EXPORT_CHUNK_SIZE]
+
+
+def export_row_chunks(list_id: int | None) -> Iterator[list[tuple[int, str]]]:
+    """Yields the rows of one list, or of every list when list_id is None, a chunk
+    at a time, each chunk a query of its own"""
+    for shard in _export_shards(list_id):
+        after: tuple[int, int] = (0, 0)
+        while chunk := list(_export_chunk(list_id, shard, after)):
+            yield [row[:2] for row in chunk]
+            after = (chunk[-1][0], chunk[-1][2])
+
+
+def export_chunks(list_id: int | None, format: str) -> Iterator[str]:
+    yield header(format)
+    for chunk in export_row_chunks(list_id):
+        yield format_rows(chunk, format)
+
+
+async def aexport_chunks(list_id: int | None, format: str) -> AsyncIterator[str]:
+    yield header(format)
+    # Keyset chunks rather than aiterator(), which runs an unflattened values_list
+    # query on the event loop's thread and fails
+    for shard in _export_shards(list_id):
+        after: tuple[int, int] = (0, 0)
+        while chunk := [row async for row in _export_chunk(list_id, shard, after)]:
+            yield format_rows((row[:2] for row in chunk), format)
+            after = (chunk[-1][0], chunk[-1][2])
+
+
+def _records(source: IO[bytes], format: str, position: int) -> Iterator[tuple[int, str, int]]:
+    """Yields the (list id, text) rows of an export read from position on, each with
+    the position just after it. Raises ValueError for rows that aren't usable"""
+    if position:
+        source.seek(position)
+
+    def lines() -> Iterator[str]:
+        nonlocal position
+        # readline, as iterating over an uploaded file seeks back to its start
+        for line in iter(source.readline, b""):
+            position += len(line)
+            yield line.decode("utf-8")
+
+    if format == "ndjson":
+        for number, line in enumerate(lines(), 1):
+            if not line.strip():
+                continue
+            try:
+                record: Any = json.loads(line)
+                list_id, text = int(record["list"]), record["text"]
+            except (ValueError, TypeError, KeyError):
+                raise ValueError(f"Line {number} is not a {{\"list\": id, \"text\": text}} object") from None
+            if not isinstance(text, str):
+                raise ValueError(f"Line {number} has a text that isn't a string")
+            yield list_id, text, position
+        return
+
+    # csv reads just as many lines as each row spans, so position stays exact
+    reader = csv.reader(lines())
+    try:
+        if not position and next(reader, CSV_HEADER) != CSV_HEADER:
+            raise ValueError(f"Expected a header row of {','.join(CSV_HEADER)}")
+        for row in reader:
+            try:
+                list_id, text = int(row[0]), row[1]
+            except (ValueError, IndexError):
+                raise ValueError(f"Line {reader.line_num} is not a list id followed by a text") from None
+            yield list_id, text, position
+    except csv.Error as error:
+        raise ValueError(f"Line {reader.line_num}: {error}") from None
+
+
+def _target_lists(checkpoint: ImportCheckpoint, source_ids: list[int]) -> dict[int, int]:
+    """The list each source list id of a batch loads into, creating lists for ids the
+    import hasn't met yet"""
+    targets: dict[int, int] = dict(ImportedList.objects.filter(
+        checkpoint=checkpoint, source_id__in=source_ids).values_list("source_id", "list_id"))
+    new_ids: list[int] = [source_id for source_id in source_ids if source_id not in targets]
+    if new_ids:
+        new_lists: list[List] = List.objects.bulk_create(
+            [List() for _ in new_ids], batch_size=BULK_BATCH_SIZE)
+        ImportedList.objects.bulk_create(
+            [ImportedList(checkpoint=checkpoint, source_id=source_id, list_id=new_list.id)
+             for source_id, new_list in zip(new_ids, new_lists)], batch_size=BULK_BATCH_SIZE)
+        targets.update((source_id, new_list.id) for source_id, new_list in zip(new_ids, new_lists))
+    return targets
+
+
+def _load_batch(checkpoint: ImportCheckpoint, batch: list[tuple[int, str, int]]) -> None:
+    added: Counter[int] = Counter(source_id for source_id, _, _ in batch)
+    targets: dict[int, int] = _target_lists(checkpoint, list(added))
+    Item.objects.bulk_create([Item(text=text, list_id=targets[source_id]) for source_id, text, _ in batch],
+                             batch_size=BULK_BATCH_SIZE)
+    for source_id, count in added.items():
+        List.objects.record_write(targets[source_id], count)
+
+
+def import_lists(source: IO[bytes], format: str, name: str,
+                 batch_size: int = IMPORT_BATCH_SIZE) -> ImportCheckpoint:
+    """Loads an export read from source into new lists, a batch of rows per
+    transaction, recording progress in the ImportCheckpoint called name. An import
+    that already has a checkpoint resumes after its last committed batch, seeking
+    source past the rows it loaded, and one that finished loads nothing more"""
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=name, defaults={"format": format})
+    if checkpoint.format != format:
+        raise ValueError(f"Import {name} was started from {checkpoint.format}, not {format}")
+    if checkpoint.finished:
+        return checkpoint
+
+    records: Iterator[tuple[int, str, int]] = _records(source, format, checkpoint.position)
+    while batch := list(islice(records, batch_size)):
+        updated_at: datetime = timezone.now()
+        with transaction.atomic(using=sharding.current()):
+            # Moves the checkpoint on only from where this run read the batch, so two
+            # runs of an import under the same name can't both load it
+            if not ImportCheckpoint.objects.filter(id=checkpoint.id, position=checkpoint.position).update(
+                    position=batch[-1][2], rows=F("rows") + len(batch), updated_at=updated_at):
+                raise ValueError("Another run of this import has loaded rows since this one started; "
+                                 "send it again to resume from there")
+            _load_batch(checkpoint, batch)
+        checkpoint.position = batch[-1][2]
+        checkpoint.rows += len(batch)
+        checkpoint.updated_at = updated_at
+    checkpoint.finished = True
+    checkpoint.updated_at = timezone.now()
+    checkpoint.save(update_fields=["finished", "updated_at"])
+    return checkpoint
+
+
+async def aimport_lists(source: IO[bytes], format: str, name: str,
+                        batch_size: int = IMPORT_BATCH_SIZE) -> ImportCheckpoint:
+    return await sync_to_async(import_lists)(source, format, name, batch_size)
@@ -19,6 +19,12 @@ from lists import views
 
 urlpatterns = [
     path("new", views.new_list, name="new_list"),
+    path("search", views.search_items, name="search_items"),
+    path("export", views.export_lists, name="export_lists"),
+    path("import", views.import_lists, name="import_lists"),
     path("<int:list_id>/", views.view_list, name="view_list"),
+    path("<int:list_id>/items.json", views.list_items_json, name="list_items_json"),
+    path("<int:list_id>/export", views.export_list, name="export_list"),
     path("<int:list_id>/add_item", views.add_item, name="add_item"),
+    path("<int:list_id>/add_items", views.add_items, name="add_items"),
 ]
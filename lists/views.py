@@ -1,7 +1,28 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpRequest
-from lists.models import Item, List
-from django.db.models import AutoField
+import json
+import uuid
+from collections.abc import AsyncIterator, Iterable, Iterator
+from itertools import chain, islice
+from typing import Any
+from django.core.files.uploadedfile import UploadedFile
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import (Http404, HttpResponse, HttpRequest, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
+from django.http.response import HttpResponseBase
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.html import escape
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from lists import cache, transfer, write_queue
+from lists.models import ImportCheckpoint, Item, List, search_query
+from django.db.models import QuerySet
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+STREAM_ROWS_MARKER = mark_safe("<!-- id_list_table rows -->")
+ITEM_JSON_FIELDS: tuple[str, ...] = ("id", "text")
+JSON_SEPARATORS: tuple[str, str] = (",", ":")
 
 
 def home_page(request: HttpRequest) -> HttpResponse:
@@ -9,17 +30,329 @@ def home_page(request: HttpRequest) -> HttpResponse:
 
 
 def new_list(request: HttpRequest) -> HttpResponse:
-    new_list: List = List.objects.create()
-    Item.objects.create(text=request.POST["item_text"], list=new_list)
+    new_list: List = List.objects.create_with_item(request.POST["item_text"])
     return redirect(f"/lists/{new_list.id}/")
 
 
-def view_list(request: HttpRequest, list_id: AutoField) -> HttpResponse:
-    our_list: List = List.objects.get(id=list_id)
-    return render(request, "list.html", {"list": our_list},)
+def _format_rows(texts: list[str], start: int) -> str:
+    """The id_list_table rows for texts numbered from start + 1, as list_rows.html renders them"""
+    return "".join(f"<tr><td>{start + n}: {escape(text)}</td></tr>" for n, text in enumerate(texts, 1))
+
+
+def _stream_rows(list_id: int) -> Iterator[str]:
+    """Yields the table rows of a list in chunks, reading only the item texts
+    through a server-side cursor so memory stays flat however long the list is"""
+    texts: Iterator[str] = Item.objects.filter(list_id=list_id).order_by(
+        "id").values_list("text", flat=True).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    counter: int = 0
+    while chunk := list(islice(texts, STREAM_CHUNK_SIZE)):
+        yield _format_rows(chunk, counter)
+        counter += len(chunk)
+
+
+def _stream_frame(request: HttpRequest, our_list: List) -> tuple[str, str]:
+    """The page before and after the table rows of a streamed list"""
+    page: str = render_to_string(
+        "list.html", {"list": our_list, "rows": STREAM_ROWS_MARKER}, request)
+    head, tail = page.split(STREAM_ROWS_MARKER)
+    return head, tail
+
+
+def _validators(our_list: List) -> tuple[str, int]:
+    """The ETag and Last-Modified timestamp of a list page. Every write bumps the
+    revision, so it identifies the version of the list's contents"""
+    return f'"{our_list.id}-{our_list.revision}"', int(our_list.updated_at.timestamp())
+
+
+def _with_validators(response: HttpResponseBase, etag: str, last_modified: int) -> HttpResponseBase:
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _page_cursor(our_list: List, item_id: int) -> str:
+    """The keyset cursor for the page after item_id: the list's revision, then the id"""
+    return f"{our_list.revision}-{item_id}"
+
+
+def _page_bounds(request: HttpRequest, our_list: List) -> tuple[int, int]:
+    """The id of the last item on the previous page, from the keyset cursor, and the
+    page size asked for, raising ValueError when they aren't usable. A cursor from
+    before the list last moved shard is refused, as its items have had new ids since;
+    bare ids, as cursors used to be, are only taken for lists that never moved"""
+    revision, _, after_id = request.GET.get("after", "0").rpartition("-")
+    try:
+        after: int = int(after_id)
+        cursor_revision: int = int(revision) if revision else 0
+        limit: int = min(int(request.GET.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("after must be a page cursor and limit an integer") from None
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    if after and cursor_revision < our_list.moved_revision:
+        raise ValueError("The list has moved since that page; start again from its first page")
+    return after, limit
+
+
+def _is_paginated(request: HttpRequest) -> bool:
+    return "after" in request.GET or "limit" in request.GET
+
+
+def _page_context(our_list: List, shown: list[Item], offset: int, limit: int) -> dict[str, Any]:
+    """Context for one page of a list, given up to limit + 1 items after the cursor"""
+    context: dict[str, Any] = {"list": our_list}
+    if len(shown) > limit:
+        shown = shown[:limit]
+        context.update(next_page=_page_cursor(our_list, shown[-1].id), limit=limit)
+    context["rows"] = render_to_string("list_rows.html", {"items": shown, "offset": offset})
+    return context
+
+
+def view_list(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    our_list: List = get_object_or_404(List.objects.defer("snapshot"), id=list_id)
+    etag, last_modified = _validators(our_list)
+    # Answers If-None-Match / If-Modified-Since with a 304 before any item is read
+    not_modified: HttpResponseBase | None = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    return _with_validators(_list_page(request, our_list), etag, last_modified)
+
+
+def _list_page(request: HttpRequest, our_list: List) -> HttpResponseBase:
+    if "stream" in request.GET:
+        head, tail = _stream_frame(request, our_list)
+        return StreamingHttpResponse(chain([head], _stream_rows(our_list.id), [tail]))
+
+    items: QuerySet[Item] = Item.objects.filter(list_id=our_list.id).order_by("id")
+    if _is_paginated(request):
+        try:
+            after, limit = _page_bounds(request, our_list)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        # Numbering carries on from the items before the cursor
+        offset: int = items.filter(id__lte=after).count() if after else 0
+        shown: list[Item] = list(items.filter(id__gt=after)[:limit + 1])
+        return render(request, "list.html", _page_context(our_list, shown, offset, limit),)
+
+    # Whole lists are served from the fragment cache until the next write, and
+    # otherwise from the list's snapshot when it is current, falling back to the items
+    rows: str | None = cache.get_rows(our_list.id, our_list.revision)
+    if rows is None:
+        texts: list[str] | None = None
+        if our_list.snapshot_is_current:
+            texts = List.objects.snapshot_texts(our_list.id, our_list.revision)
+        if texts is not None:
+            rows = _format_rows(texts, 0)
+        else:
+            rows = render_to_string("list_rows.html", {"items": items, "offset": 0})
+        cache.set_rows(our_list.id, our_list.revision, rows)
+    return render(request, "list.html", {"list": our_list, "rows": mark_safe(rows)},)
+
+
+def _item_fields(request: HttpRequest) -> list[str]:
+    """The item fields asked for with ?fields=, raising ValueError for unknown ones"""
+    fields: list[str] = [field for field in request.GET.get("fields", ",".join(ITEM_JSON_FIELDS)).split(",") if field]
+    if not fields or not set(fields) <= set(ITEM_JSON_FIELDS):
+        raise ValueError(f"fields must be a comma separated subset of {','.join(ITEM_JSON_FIELDS)}")
+    return fields
+
+
+def _item_rows(list_id: int, fields: list[str]) -> QuerySet[Item, tuple[Any, ...]]:
+    """A list's items as bare tuples, id first whether or not it was asked for,
+    since it is the pagination cursor"""
+    return Item.objects.filter(list_id=list_id).order_by("id").values_list(
+        "id", *(field for field in fields if field != "id"))
+
+
+def _item_objects(rows: Iterable[tuple[Any, ...]], fields: list[str]) -> list[dict[str, Any]]:
+    columns: list[str] = ["id", *(field for field in fields if field != "id")]
+    positions: list[tuple[str, int]] = [(field, columns.index(field)) for field in fields]
+    return [{field: row[position] for field, position in positions} for row in rows]
+
+
+def _ndjson_lines(rows: list[tuple[Any, ...]], fields: list[str]) -> str:
+    return "".join(json.dumps(item, separators=JSON_SEPARATORS) + "\n" for item in _item_objects(rows, fields))
+
+
+def _stream_item_json(list_id: int, fields: list[str]) -> Iterator[str]:
+    rows: Iterator[tuple[Any, ...]] = _item_rows(list_id, fields).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    while chunk := list(islice(rows, STREAM_CHUNK_SIZE)):
+        yield _ndjson_lines(chunk, fields)
+
+
+def _items_page(our_list: List, rows: list[tuple[Any, ...]], fields: list[str], limit: int) -> JsonResponse:
+    """One page of a list's items, given up to limit + 1 rows after the cursor"""
+    next_page: str | None = _page_cursor(our_list, rows[limit - 1][0]) if len(rows) > limit else None
+    return JsonResponse({
+        "list": our_list.id, "revision": our_list.revision, "item_count": our_list.item_count,
+        "items": _item_objects(rows[:limit], fields), "next": next_page,
+    }, json_dumps_params={"separators": JSON_SEPARATORS})
+
+
+def list_items_json(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    """The items of a list as JSON: pages of up to ?limit= items after the ?after=
+    cursor, or the whole list as newline-delimited JSON with ?stream. ?fields= picks
+    which of id and text each item carries"""
+    our_list: List = get_object_or_404(List.objects.defer("snapshot"), id=list_id)
+    etag, last_modified = _validators(our_list)
+    not_modified: HttpResponseBase | None = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    try:
+        fields: list[str] = _item_fields(request)
+        after, limit = _page_bounds(request, our_list)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    if "stream" in request.GET:
+        response: HttpResponseBase = StreamingHttpResponse(
+            _stream_item_json(our_list.id, fields), content_type="application/x-ndjson")
+    else:
+        response = _items_page(our_list, list(_item_rows(our_list.id, fields).filter(id__gt=after)[:limit + 1]),
+                               fields, limit)
+    return _with_validators(response, etag, last_modified)
+
+
+def _search_params(request: HttpRequest) -> tuple[str, int | None, int, int]:
+    """The ?q= words, ?list= scope and ?offset= / ?limit= page of a search,
+    raising ValueError when they aren't usable"""
+    text: str = request.GET.get("q", "")
+    if not search_query(text):
+        raise ValueError("q must contain at least one word")
+    try:
+        list_id: int | None = int(request.GET["list"]) if "list" in request.GET else None
+        offset: int = int(request.GET.get("offset", 0))
+        limit: int = min(int(request.GET.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("list, offset and limit must be integers") from None
+    if offset < 0 or limit < 1:
+        raise ValueError("offset can't be negative and limit must be positive")
+    return text, list_id, offset, limit
+
+
+def _search_page(text: str, found: list[Item], offset: int, limit: int) -> JsonResponse:
+    """One page of search results, given up to limit + 1 matches from offset on"""
+    return JsonResponse({
+        "q": text,
+        "items": [{"id": item.id, "list": item.list_id, "text": item.text} for item in found[:limit]],
+        "next": offset + limit if len(found) > limit else None,
+    }, json_dumps_params={"separators": JSON_SEPARATORS})
+
+
+def search_items(request: HttpRequest) -> HttpResponse:
+    """Items holding every word of ?q=, best match first, from every list or just
+    the one given as ?list=. Words ending in * match as prefixes. Paginated by
+    ?offset= and ?limit=, with "next" the offset of the following page"""
+    try:
+        text, list_id, offset, limit = _search_params(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return _search_page(text, Item.objects.search(text, list_id, limit + 1, offset), offset, limit)
+
+
+def _export_format(request: HttpRequest) -> str:
+    format: str = request.GET.get("format", "csv")
+    if format not in transfer.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(transfer.FORMATS)}")
+    return format
+
+
+def _export_response(chunks: Iterator[str] | AsyncIterator[str], format: str, filename: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(chunks, content_type=transfer.FORMATS[format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    return response
+
+
+def export_lists(request: HttpRequest) -> HttpResponseBase:
+    """Every list's items, streamed as ?format=csv (the default) or ndjson"""
+    try:
+        format: str = _export_format(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return _export_response(transfer.export_chunks(None, format), format, "lists")
+
+
+def export_list(request: HttpRequest, list_id: int) -> HttpResponseBase:
+    our_list: List = get_object_or_404(List.objects.only("id"), id=list_id)
+    try:
+        format: str = _export_format(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return _export_response(transfer.export_chunks(our_list.id, format), format, f"list-{our_list.id}")
+
+
+def _import_source(request: HttpRequest) -> tuple[UploadedFile, str, str]:
+    """The uploaded "lists_file" of an import, its format (from the "format" field
+    or the file name) and the import's name, raising ValueError when any is missing"""
+    if "lists_file" not in request.FILES:
+        raise ValueError("Upload an export as lists_file")
+    source: UploadedFile = request.FILES["lists_file"]
+    format: str = request.POST.get("format") or transfer.format_of(source.name or "")
+    if format not in transfer.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(transfer.FORMATS)}")
+    # Sending the same name again after a failure resumes that import
+    return source, format, request.POST.get("import") or str(uuid.uuid4())
+
+
+def _import_result(checkpoint: ImportCheckpoint, lists: int) -> JsonResponse:
+    return JsonResponse({"import": checkpoint.name, "rows": checkpoint.rows, "finished": checkpoint.finished,
+                         "lists": lists})
+
+
+def import_lists(request: HttpRequest) -> HttpResponse:
+    """Loads an uploaded export into new lists, see lists.transfer.import_lists"""
+    try:
+        source, format, name = _import_source(request)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    try:
+        checkpoint: ImportCheckpoint = transfer.import_lists(source, format, name)
+    except ValueError as error:
+        return HttpResponseBadRequest(f"Import {name} stopped: {error}")
+    return _import_result(checkpoint, checkpoint.importedlist_set.count())
+
+
+def _still_queued(list_id: int, error: write_queue.StillQueued) -> HttpResponse:
+    """Accepted rather than an error, as the item is still queued and is most
+    likely added shortly"""
+    return HttpResponse(f"{error}. It is still queued, see /lists/{list_id}/ shortly", status=202)
+
+
+def add_item(request: HttpRequest, list_id: int) -> HttpResponse:
+    try:
+        if not write_queue.add(list_id, request.POST["item_text"]):
+            raise Http404("No such list")
+    except write_queue.StillQueued as error:
+        return _still_queued(list_id, error)
+    return redirect(f"/lists/{list_id}/")
+
+
+def _bulk_item_texts(request: HttpRequest) -> Iterator[str]:
+    """Yields the non-blank item texts of a bulk request, from a JSON array body,
+    an uploaded "items_file" (read line by line) or a newline-separated "items_text" field"""
+    if request.content_type == "application/json":
+        texts = json.loads(request.body)
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError("Expected a JSON array of strings")
+        lines: Iterator[str] = iter(texts)
+    elif "items_file" in request.FILES:
+        lines = (line.decode("utf-8") for line in request.FILES["items_file"])
+    else:
+        lines = iter(request.POST.get("items_text", "").splitlines())
+
+    for line in lines:
+        text: str = line.rstrip("\r\n")
+        if text.strip():
+            yield text
 
 
-def add_item(request: HttpRequest, list_id: AutoField) -> HttpResponse:
-    our_list: List = List.objects.get(id=list_id)
-    Item.objects.create(text=request.POST["item_text"], list=our_list)
-    return redirect(f"/lists/{our_list.id}/")
+def add_items(request: HttpRequest, list_id: int) -> HttpResponse:
+    try:
+        Item.objects.bulk_add(list_id, _bulk_item_texts(request))
+    except List.DoesNotExist:
+        raise Http404("No such list")
+    except (ValueError, UnicodeDecodeError) as error:
+        return HttpResponseBadRequest(str(error))
+    return redirect(f"/lists/{list_id}/")
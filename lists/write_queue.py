@@ -0,0 +1,240 @@
+"""Write-behind batching for add_item. Instead of a transaction per item, requests
+hand their item to a queue that one background thread per process commits in
+batches, one transaction per batch, so concurrent writers stop queueing for
+SQLite's write lock. Batches are cut at MAX_BATCH items or MAX_DELAY seconds after
+their first item, whichever comes first, and are written in arrival order, so each
+list's items keep the order they were added in. Sharded, each batch is written as
+one transaction per shard it touches, and items for a list rebalance_lists moved
+off their shard while they were queued follow it to the one it is on now.
+
+Configured by settings.ITEM_WRITE_QUEUE; with it disabled add() is Item.objects.add.
+A batch that fails is logged and its items' futures given the error, and the worker
+carries on with the next; should the worker die anyway, the next submit starts another.
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from lists import sharding
+from lists.models import Item, List, ListPlacement
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES: tuple[str, ...] = ("flush", "enqueue")
+
+
+class StillQueued(Exception):
+    """The item's batch wasn't committed within TIMEOUT. It stays queued, so is
+    most likely added after all"""
+
+
+@dataclass
+class PendingItem:
+    list_id: int
+    text: str
+    # The shard current when the item was submitted, as the worker thread has none;
+    # should the list move off it before the item is written, the one it moved to
+    shard: str = field(default_factory=sharding.current)
+    # Resolves to True once committed, or False when the list does not exist. Cancelled
+    # before its batch is written, the item is dropped
+    done: Future[bool] = field(default_factory=Future)
+
+
+class WriteQueue:
+    def __init__(self, max_batch: int = 500, max_delay: float = 0.005) -> None:
+        self.max_batch: int = max_batch
+        self.max_delay: float = max_delay
+        self.pending: queue.SimpleQueue[PendingItem | None] = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.worker: threading.Thread | None = None
+        self.closed: bool = False
+        self.batches: int = 0
+        self.items: int = 0
+
+    def submit(self, list_id: int, text: str) -> Future[bool]:
+        item = PendingItem(list_id, text)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The write queue is closed")
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="item-write-queue", daemon=True)
+                self.worker.start()
+            self.pending.put(item)
+        return item.done
+
+    def close(self) -> None:
+        """Stop taking items, commit everything already queued and stop the worker"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            worker: threading.Thread | None = self.worker
+            if worker is None:
+                return
+            self.pending.put(None)
+        worker.join()
+
+    def _batches(self) -> Iterator[list[PendingItem]]:
+        while True:
+            first: PendingItem | None = self.pending.get()
+            if first is None:
+                return
+            batch: list[PendingItem] = [first]
+            deadline: float = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item: PendingItem | None = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    yield batch
+                    return
+                batch.append(item)
+            yield batch
+
+    def _run(self) -> None:
+        try:
+            for batch in self._batches():
+                try:
+                    self._flush(batch)
+                except Exception as error:
+                    logger.exception("Failed to flush a batch of %d items", len(batch))
+                    for item in batch:
+                        if not item.done.done():
+                            item.done.set_exception(error)
+        finally:
+            connections.close_all()
+            with self.lock:
+                if self.worker is threading.current_thread():
+                    self.worker = None
+
+    def _flush(self, batch: list[PendingItem]) -> None:
+        by_shard: dict[str, list[PendingItem]] = {}
+        for item in batch:
+            # Running futures can't be cancelled, so each is resolved exactly once
+            if not item.done.set_running_or_notify_cancel():
+                continue
+            by_shard.setdefault(item.shard, []).append(item)
+        while by_shard:
+            moved: dict[str, list[PendingItem]] = {}
+            for shard, items in by_shard.items():
+                for item in self._write(shard, items):
+                    moved.setdefault(item.shard, []).append(item)
+            by_shard = moved
+        self.batches += 1
+
+    def _write(self, shard: str, batch: list[PendingItem]) -> list[PendingItem]:
+        """Writes the items of batch whose list is on shard, and returns those whose
+        list has moved to another shard since they were submitted, routed to it"""
+        by_list: dict[int, list[PendingItem]] = {}
+        for item in batch:
+            by_list.setdefault(item.list_id, []).append(item)
+        added: set[int] = set()
+        try:
+            with sharding.routed_to(shard), transaction.atomic(using=shard):
+                for list_id, items in by_list.items():
+                    if List.objects.record_write(list_id, len(items), texts=[item.text for item in items]):
+                        added.add(list_id)
+                # In arrival order, so ids ascend in the order items were added
+                Item.objects.bulk_create(
+                    [Item(text=item.text, list_id=item.list_id) for item in batch if item.list_id in added])
+        except Exception as error:
+            logger.exception("Failed to write a batch of %d items", len(batch))
+            for item in batch:
+                item.done.set_exception(error)
+            return []
+        moved: list[PendingItem] = []
+        for list_id in by_list.keys() - added:
+            # A move deletes the list from its old shard under that shard's write lock,
+            # after copying the items committed there, so these were never written
+            placement: str = ListPlacement.objects.shard_for(list_id, refresh=True) if sharding.is_sharded() else shard
+            if placement != shard:
+                for item in by_list[list_id]:
+                    item.shard = placement
+                moved += by_list[list_id]
+        self.items += sum(len(by_list[list_id]) for list_id in added)
+        for item in batch:
+            if item.shard == shard:
+                item.done.set_result(item.list_id in added)
+        return moved
+
+
+_queue: WriteQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> WriteQueue:
+    """The process's write queue, flushed when the process exits"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            config: dict[str, Any] = settings.ITEM_WRITE_QUEUE
+            if config["DURABILITY"] not in DURABILITY_MODES:
+                raise ImproperlyConfigured(f"ITEM_WRITE_QUEUE DURABILITY must be one of {DURABILITY_MODES}")
+            _queue = WriteQueue(config["MAX_BATCH"], config["MAX_DELAY"])
+            atexit.register(_queue.close)
+        return _queue
+
+
+def shutdown() -> None:
+    """Flush and stop the write queue; the next add starts a new one"""
+    global _queue
+    with _queue_lock:
+        closing, _queue = _queue, None
+    if closing is not None:
+        closing.close()
+        atexit.unregister(closing.close)
+
+
+def _reset_on_change(setting: str, **kwargs: Any) -> None:
+    if setting == "ITEM_WRITE_QUEUE":
+        shutdown()
+
+
+setting_changed.connect(_reset_on_change)
+
+
+def add(list_id: int, text: str) -> bool:
+    """Add an item to a list through the write queue when it is enabled, or in its
+    own transaction when not. Returns False when the list does not exist"""
+    config: dict[str, Any] = settings.ITEM_WRITE_QUEUE
+    if not config["ENABLED"]:
+        return Item.objects.add(list_id, text)
+    if config["DURABILITY"] == "enqueue":
+        # Answered before the write, so check the list now rather than at flush time
+        if not List.objects.filter(id=list_id).exists():
+            return False
+        get_queue().submit(list_id, text)
+        return True
+    try:
+        return get_queue().submit(list_id, text).result(timeout=config["TIMEOUT"])
+    except TimeoutError:
+        raise StillQueued(f"The item was not added within {config['TIMEOUT']} seconds") from None
+
+
+async def aadd(list_id: int, text: str) -> bool:
+    config: dict[str, Any] = settings.ITEM_WRITE_QUEUE
+    if not config["ENABLED"]:
+        return await Item.objects.aadd(list_id, text)
+    if config["DURABILITY"] == "enqueue":
+        if not await List.objects.filter(id=list_id).aexists():
+            return False
+        get_queue().submit(list_id, text)
+        return True
+    # Awaiting the future keeps the event loop free while the batch fills. Shielded, as
+    # the item is queued either way and a cancelled request mustn't cancel its future
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(get_queue().submit(list_id, text))), config["TIMEOUT"])
+    except TimeoutError:
+        raise StillQueued(f"The item was not added within {config['TIMEOUT']} seconds") from None
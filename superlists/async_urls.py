@@ -0,0 +1,12 @@
+"""
+URL configuration serving the async views of the lists app, for running under
+superlists.asgi. Select it with ROOT_URLCONF = "superlists.async_urls"; the URLs
+and responses are the same as superlists.urls.
+"""
+from django.urls import include, path, URLPattern, URLResolver
+from lists import async_views as list_views
+
+urlpatterns: list[URLPattern | URLResolver] = [
+    path("", list_views.home_page, name="home"),
+    path("lists/", include("lists.async_urls")),
+]
@@ -42,6 +42,10 @@ INSTALLED_APPS: list[str] = [
 ]
 
 MIDDLEWARE: list[str] = [
+    "lists.middleware.PerformanceMiddleware",
+    "lists.middleware.TrafficCaptureMiddleware",
+    "lists.middleware.CompressionMiddleware",
+    "lists.middleware.ListShardMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,6 +55,26 @@ MIDDLEWARE: list[str] = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request timing from lists.middleware.PerformanceMiddleware, which takes itself
+# out of the middleware chain when this is off. Latency histograms are written to
+# PERF_STATS_DIR every PERF_FLUSH_EVERY requests and at exit; see dump_perf_stats.
+PERF_INSTRUMENTATION = False
+PERF_STATS_DIR: Path = BASE_DIR / "perf_stats"
+PERF_FLUSH_EVERY = 100
+
+# lists.middleware.CompressionMiddleware gzips responses of at least this many bytes,
+# and every streamed response, for clients that accept gzip
+COMPRESSION_MIN_SIZE = 1024
+
+# When set, lists.middleware.TrafficCaptureMiddleware appends a JSON line per request
+# to this file for the replay_traffic command; capture_traffic sets it for runserver.
+TRAFFIC_CAPTURE_FILE: Path | None = None
+
+# Have superlists.wsgi and superlists.asgi import the URLconf and views and compile
+# the templates as they load, rather than leave it to the first request; see
+# superlists/startup.py. Off here so runserver's reloads stay quick
+PRELOAD_ON_STARTUP = False
+
 ROOT_URLCONF = "superlists.urls"
 
 TEMPLATES: list[dict[str, Any]] = [
@@ -75,11 +99,107 @@ WSGI_APPLICATION = "superlists.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets readers carry on while a write is
+# in progress, and synchronous=NORMAL is durable in WAL mode except on power loss.
+SQLITE_PRAGMAS: dict[str, str | int] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative sizes are in KiB
+    "cache_size": -64 * 1024,
+}
+
 DATABASES: dict[str, dict[str, Any]] = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+            # Seconds a writer waits for the lock before failing with "database is locked"
+            "timeout": 20,
+            # Take the write lock when a transaction starts, so two transactions that
+            # read before writing can't deadlock and fail without waiting
+            "transaction_mode": "IMMEDIATE",
+        },
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        # A file rather than the default shared in-memory database, which fails
+        # concurrent writers straight away instead of letting them wait their turn
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    }
+}
+
+# Further databases that lists can be sharded over, each its own SQLite file with
+# its own write lock. They are only used once listed in LIST_SHARDS below
+DATABASES.update({
+    f"lists_{number}": {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / f"db_lists_{number}.sqlite3",
+        "TEST": {"NAME": BASE_DIR / f"test_db_lists_{number}.sqlite3"},
     }
+    for number in range(1, 4)
+})
+
+# The databases lists and their items are spread over, see lists/sharding.py. With
+# just "default" nothing is routed. To shard, migrate each database with
+# "migrate --database <alias>", run rebalance_lists so every existing list is in
+# the directory of placements, then list the aliases here. Keep "default" among
+# them, as lists missing from the directory are looked for there
+LIST_SHARDS: list[str] = ["default"]
+
+DATABASE_ROUTERS: list[str] = ["lists.sharding.ListShardRouter"]
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# "lists" holds the rendered item table of each list (see lists/cache.py).
+# LocMemCache evicts the least recently used fragments past MAX_ENTRIES; to share
+# the cache between worker processes swap in a file based backend, e.g.
+#     "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#     "LOCATION": BASE_DIR / "cache" / "lists",
+CACHES: dict[str, dict[str, Any]] = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "lists": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "lists",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# Write-behind batching of add_item, see lists/write_queue.py. A background thread per
+# process commits queued items in one transaction per batch, cut at MAX_BATCH items or
+# MAX_DELAY seconds after its first. DURABILITY "flush" answers a request once its item
+# is committed; "enqueue" answers once it is queued, so a crash can lose the last batch
+# and a redirect straight back to the list may not show the item yet. With "flush" a
+# request gives up waiting for its batch after TIMEOUT seconds and answers 202 Accepted,
+# the item still queued.
+ITEM_WRITE_QUEUE: dict[str, Any] = {
+    "ENABLED": False,
+    "MAX_BATCH": 500,
+    "MAX_DELAY": 0.005,
+    "DURABILITY": "flush",
+    "TIMEOUT": 30,
+}
+
+LISTS_CACHE_ALIAS = "lists"
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+
+LOGGING: dict[str, Any] = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "lists.performance": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
 }
 
 
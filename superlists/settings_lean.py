@@ -0,0 +1,40 @@
+"""
+Lean deployment profile for the lists endpoints.
+
+The lists app has no use for sessions, users, messages, the admin or static files,
+so this profile drops their apps, middleware and context processors. Nothing then
+loads a session or user per request, and workers start without importing them.
+CSRF protection stays: CsrfViewMiddleware keeps its secret in the csrftoken cookie,
+not the session. Static files are left to the web server. The URLconf, views and
+templates are loaded as the entry point is imported, before the first request;
+benchmarks/startup.py measures the difference. Select it with
+    DJANGO_SETTINGS_MODULE=superlists.settings_lean
+"""
+
+from superlists.settings import *  # noqa: F401,F403
+from superlists.settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+UNUSED_APPS: list[str] = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+]
+
+UNUSED_MIDDLEWARE: list[str] = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in UNUSED_MIDDLEWARE]
+
+# The templates only need the CSRF token, which Django's built-in csrf context
+# processor supplies whatever is listed here
+TEMPLATES = [{**TEMPLATES[0], "OPTIONS": {**TEMPLATES[0]["OPTIONS"], "context_processors": []}}]
+
+PRELOAD_ON_STARTUP = True
@@ -0,0 +1,33 @@
+"""Work Django leaves to the first request, done as a worker starts instead, so a
+freshly scaled-out worker answers its first request as fast as its hundredth.
+superlists.wsgi and superlists.asgi run it when settings.PRELOAD_ON_STARTUP is on.
+Nothing here opens a database connection, so workers forked after it don't share one.
+"""
+from pathlib import Path
+from django.conf import settings
+from django.template.autoreload import get_template_directories
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+
+def preload_urls() -> None:
+    """Imports the URLconf, and with it every view module, and compiles the patterns'
+    regexes, which building the reverse lookups does for the whole tree"""
+    get_resolver().reverse_dict
+
+
+def preload_templates() -> list[str]:
+    """Compiles every template of the project and its apps into the cached loader,
+    returning their names. Django's own templates, such as its error pages, aren't included"""
+    names: list[str] = sorted({
+        path.relative_to(directory).as_posix()
+        for directory in get_template_directories() for path in Path(directory).rglob("*") if path.is_file()})
+    for name in names:
+        get_template(name)
+    return names
+
+
+def preload_if_configured() -> None:
+    if settings.PRELOAD_ON_STARTUP:
+        preload_urls()
+        preload_templates()